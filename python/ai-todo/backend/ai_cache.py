@@ -0,0 +1,198 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from database import async_ai_responses_collection, MONGO_AVAILABLE
+from scheduler import parse_due_date
+from single_flight import SingleFlight
+
+# Suggestions are reused for requests whose "now" falls in the same bucket
+AI_CACHE_BUCKET_SECONDS = int(os.getenv("AI_CACHE_BUCKET_SECONDS", "900"))
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", "900"))
+# In-process tier budget (approximate JSON size of cached responses)
+AI_CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Share cached responses between workers through Mongo
+AI_CACHE_SHARED = os.getenv("AI_CACHE_SHARED", "false").lower() in ("1", "true", "yes")
+
+# Fields written back by the AI itself; they must not change the key, or every
+# suggestion would invalidate the next one
+AI_OUTPUT_FIELDS = {"category", "priority", "last_ai_score", "scheduled_start", "scheduled_end", "updated_at"}
+
+def time_bucket(now, bucket_seconds=AI_CACHE_BUCKET_SECONDS):
+    """Start of the time bucket containing the ISO timestamp now"""
+    try:
+        moment = parse_due_date(now)
+    except (TypeError, ValueError, AttributeError):
+        return str(now)
+    seconds = int((moment - datetime(1970, 1, 1)).total_seconds())
+    return seconds - seconds % max(1, bucket_seconds)
+
+def canonical_tasks(tasks):
+    """Tasks without AI-derived fields, in a stable order"""
+    cleaned = [{k: v for k, v in task.items() if k not in AI_OUTPUT_FIELDS} for task in tasks or []]
+    return sorted(cleaned, key=lambda t: (str(t.get("id") or t.get("_id") or ""), str(t.get("task") or "")))
+
+def suggestion_key(tasks, user_stats, user_input, timezone, now, model="", bucket_seconds=AI_CACHE_BUCKET_SECONDS):
+    """Canonical hash of the prompt inputs, with now reduced to its time bucket"""
+    canonical = json.dumps({
+        "tasks": canonical_tasks(tasks),
+        "user_stats": user_stats or {},
+        "user_input": (user_input or "").strip(),
+        "timezone": timezone or "UTC",
+        "now": time_bucket(now, bucket_seconds),
+        "model": model
+    }, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def suggestion_user(user_id, tasks):
+    """User a suggestion belongs to: the request's user_id, else the owner of its tasks"""
+    if user_id:
+        return user_id
+    for task in tasks or []:
+        if task.get("user_id"):
+            return task["user_id"]
+    return None
+
+class ResponseCache:
+    """Byte-bounded in-process LRU of AI responses with an optional shared Mongo tier"""
+
+    def __init__(self, collection=None, max_bytes=AI_CACHE_MAX_BYTES, ttl_seconds=AI_CACHE_TTL_SECONDS):
+        self.collection = collection
+        self.max_bytes = max(1, max_bytes)
+        self.ttl = ttl_seconds
+        self._lru = OrderedDict()
+        self._by_user = {}
+        self._bytes = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.shared_errors = 0
+
+    async def get(self, key):
+        """(response, tier, age_seconds) for a cached key, or (None, None, None)"""
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self._lru.move_to_end(key)
+                    self.memory_hits += 1
+                    return dict(entry["response"]), "memory", (now - entry["created_at"]).total_seconds()
+                self._drop(key)
+
+        if self.collection is not None:
+            try:
+                doc = await self.collection.find_one({"_id": key, "expires_at": {"$gt": now}})
+                if doc:
+                    self._remember(key, doc["response"], doc.get("user_id"), doc["created_at"], doc["expires_at"])
+                    self.shared_hits += 1
+                    return doc["response"], "shared", (now - doc["created_at"]).total_seconds()
+            except Exception as e:
+                self.shared_errors += 1
+                print(f"Error reading shared AI response cache: {e}")
+
+        self.misses += 1
+        return None, None, None
+
+    def generation(self, user_id):
+        """Invalidation counter for a user; pass it to put() to drop answers that raced an edit"""
+        return self._generations.get(user_id, 0)
+
+    async def put(self, key, response, user_id=None, generation=None):
+        if generation is not None and generation != self.generation(user_id):
+            # The user's tasks changed while this answer was being computed
+            return
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+        response = dict(response)
+        self._remember(key, response, user_id, now, expires_at)
+        if self.collection is not None:
+            try:
+                await self.collection.update_one(
+                    {"_id": key},
+                    {"$set": {"user_id": user_id, "response": response, "created_at": now, "expires_at": expires_at}},
+                    upsert=True
+                )
+            except Exception as e:
+                self.shared_errors += 1
+                print(f"Error writing shared AI response cache: {e}")
+
+    async def invalidate_user(self, user_id):
+        """Drop every cached response for a user (call after any edit to their tasks)"""
+        if not user_id:
+            return
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+        self.invalidations += 1
+        if self.collection is not None:
+            try:
+                await self.collection.delete_many({"user_id": user_id})
+            except Exception as e:
+                self.shared_errors += 1
+                print(f"Error invalidating shared AI response cache: {e}")
+
+    def _remember(self, key, response, user_id, created_at, expires_at):
+        size = len(json.dumps(response, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._lru:
+                self._drop(key)
+            self._lru[key] = {"response": response, "user_id": user_id, "created_at": created_at, "expires_at": expires_at, "size": size}
+            self._by_user.setdefault(user_id, set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._lru)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        # Caller holds the lock
+        entry = self._lru.pop(key)
+        self._bytes -= entry["size"]
+        keys = self._by_user.get(entry["user_id"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry["user_id"]]
+
+    def stats(self):
+        lookups = self.memory_hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "shared": self.collection is not None,
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "shared_errors": self.shared_errors,
+            "hit_rate": round((self.memory_hits + self.shared_hits) / lookups, 4) if lookups else 0
+        }
+
+ai_cache = ResponseCache(async_ai_responses_collection if MONGO_AVAILABLE and AI_CACHE_SHARED else None)
+
+def set_cache_headers(response, status, key, tier=None, age=None):
+    """Expose cache status on an HTTP response"""
+    response.headers["X-Cache"] = status
+    response.headers["X-Cache-Key"] = key[:16]
+    if tier:
+        response.headers["X-Cache-Tier"] = tier
+    if age is not None:
+        response.headers["Age"] = str(int(age))
+
+# Identical suggestion requests that arrive while one is being computed wait for it
+AI_SUGGEST_TIMEOUT_SECONDS = float(os.getenv("AI_SUGGEST_TIMEOUT_SECONDS", "60"))
+ai_flights = SingleFlight()
@@ -1,5 +1,5 @@
 # import google.generativeai as genai
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pymongo import MongoClient
 import os
@@ -23,8 +23,11 @@ users_collection = db["users"]
 reminders_collection = db["reminders"]
 notifications_collection = db["notifications"]
 
+# Services started and stopped with the app (shared with main.py)
+from startup import lifespan
+
 # Create FastAPI app
-app = FastAPI(title="TaskFlow AI Backend")
+app = FastAPI(title="TaskFlow AI Backend", lifespan=lifespan)
 
 # Allow CORS
 app.add_middleware(
@@ -39,16 +42,61 @@ app.add_middleware(
 from routes.tasks.tasks import router as tasks_router
 from routes.users.users import router as users_router
 from routes.ai.ai import router as ai_router
+from routes.admin.admin import router as admin_router
+from embedding_service import embedding_service, run_embedding
+from embedding_cache import embedding_cache
+from embedding_server import EmbeddingClient, EmbeddingServerUnavailable
+from vector_index import vector_indexes
+from ai_cache import ai_cache, ai_flights
+from scheduler import scheduler_stats
+import preprocess
 
 # Include routers
 app.include_router(tasks_router, prefix="/tasks", tags=["tasks"])
 app.include_router(users_router, prefix="/users", tags=["users"])
 app.include_router(ai_router, prefix="/ai", tags=["ai"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
 @app.get("/")
 def root():
     return {"message": "TaskFlow AI Backend running"}
 
+@app.post("/warmup")
+async def warmup():
+    """Load lazily loaded models and data now; returns load times per resource"""
+    timings = await run_embedding(preprocess.warmup)
+    return {"ready": preprocess.is_ready(), "load_ms": timings}
+
+@app.get("/ready")
+def ready(response: Response):
+    """Readiness probe: 503 until the embedding model, vectorizer and NLTK data are loaded"""
+    components = preprocess.readiness()
+    is_ready = preprocess.is_ready()
+    if not is_ready:
+        response.status_code = 503
+    return {"ready": is_ready, "components": components}
+
+@app.get("/metrics")
+def metrics():
+    """Report runtime metrics for tuning throughput and latency"""
+    embedding_server = None
+    if preprocess.EMBEDDING_BACKEND == "server":
+        client = preprocess.get_embedding_client()
+        embedding_server = {"client": client.stats()}
+        try:
+            embedding_server["server"] = EmbeddingClient(timeout=1, autostart=False).health()
+        except EmbeddingServerUnavailable as e:
+            embedding_server["server"] = {"ok": False, "error": str(e)}
+    return {
+        "embedding": embedding_service.stats(),
+        "embedding_server": embedding_server,
+        "embedding_cache": embedding_cache.stats(),
+        "vector_index": vector_indexes.stats(),
+        "ai_cache": ai_cache.stats(),
+        "ai_single_flight": ai_flights.stats(),
+        "scheduler": scheduler_stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     try:
@@ -0,0 +1,190 @@
+"""End-to-end benchmark of the AI routes against the local fake model.
+
+Runs the AI router in-process (no server, no API key) with LLM_BACKEND=fake and drives
+/ai/suggest, /ai/suggest/stream or /ai/apply-schedule at a fixed concurrency. Latency,
+jitter, error rate, truncated (malformed) answers and markdown fences of the fake model
+are configurable. Reports throughput, p50/p99 latency, HTTP errors and the share of
+answers that could not be parsed. Writebacks go to the configured MongoDB, or the
+in-memory fallback when it is not reachable. Pass --url to drive a running server
+instead (configure its fake model through the FAKE_LLM_* variables).
+
+Usage (from backend/):
+    python benchmarks/ai_bench.py [--scenario suggest|stream|apply|legacy] [--requests 500]
+        [--concurrency 32] [--tasks 20] [--latency-ms 200] [--jitter-ms 50] [--token-delay-ms 0]
+        [--error-rate 0.05] [--malformed-rate 0.05] [--fenced] [--deadline-ms 0]
+        [--repeat-ratio 0] [--csv results.csv]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "fake")
+import httpx
+import numpy as np
+from fastapi import FastAPI
+import llm
+
+ROUTES = {
+    "suggest": "/ai/suggest",
+    "stream": "/ai/suggest/stream",
+    "apply": "/ai/apply-schedule",
+    "legacy": "/ai-suggest"
+}
+
+def build_app(scenario):
+    if scenario == "legacy":
+        import main
+        return main.app
+    from routes.ai.ai import router as ai_router
+    app = FastAPI()
+    app.include_router(ai_router, prefix="/ai")
+    return app
+
+def make_tasks(rng, user_id, count):
+    words = ["pay", "rent", "write", "report", "gym", "groceries", "call", "mom", "study", "exam", "clean", "kitchen"]
+    return [{
+        "id": f"{rng.getrandbits(96):024x}",
+        "user_id": user_id,
+        "task": " ".join(rng.choices(words, k=rng.randint(2, 8))),
+        "due_date": f"2030-01-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00Z",
+        "estimated_minutes": rng.choice([15, 30, 45, 60, 90])
+    } for _ in range(count)]
+
+def make_body(scenario, rng, i, args, repeats):
+    if repeats and rng.random() < args.repeat_ratio:
+        # Same inputs as an earlier request: exercises the cache and single-flight
+        return rng.choice(repeats)
+    user_id = f"bench-user-{i % 50}"
+    tasks = make_tasks(rng, user_id, args.tasks)
+    if scenario == "apply":
+        body = {"user_id": user_id, "tasks": tasks, "schedule_plan": [
+            {"id": t["id"], "task": t["task"], "start_iso": "2030-01-01T09:00:00Z", "end_iso": "2030-01-01T09:30:00Z", "reason": "bench"}
+            for t in tasks
+        ]}
+    else:
+        body = {"user_id": user_id, "tasks": tasks, "user_stats": {}, "now": f"2030-01-01T{i % 24:02d}:00:00Z",
+                "timezone": "UTC", "user_input": f"plan {i}"}
+        if args.deadline_ms:
+            body["deadline_ms"] = args.deadline_ms
+    repeats.append(body)
+    return body
+
+def classify(scenario, status, text):
+    """(ok, parse_failure, engine) for one response"""
+    if scenario == "stream":
+        if "event: error" in text:
+            return False, "AI or parsing error" in text and "[fake]" not in text, None
+        return status == 200 and "event: done" in text, False, "stream"
+    if status != 200:
+        try:
+            detail = json.loads(text).get("detail", "")
+        except ValueError:
+            detail = text
+        # Injected upstream errors carry a [fake] marker; other 500s are parse failures
+        return False, status == 500 and "[fake]" not in str(detail), None
+    body = json.loads(text)
+    if scenario == "apply":
+        return True, False, None
+    return True, body.get("fallback_reason") == "unusable_response", body.get("engine")
+
+async def run(args):
+    fake = llm.FakeLLM(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        token_delay_ms=args.token_delay_ms,
+        chunk_size=args.chunk_chars,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        fenced=args.fenced,
+        seed=args.seed
+    )
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    else:
+        llm.set_llm(fake)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app(args.scenario)), base_url="http://bench", timeout=120)
+
+    rng = random.Random(args.seed)
+    repeats = []
+    bodies = [make_body(args.scenario, rng, i, args, repeats) for i in range(args.requests)]
+    path = ROUTES[args.scenario]
+    samples = []
+    queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    async def worker():
+        while not queue.empty():
+            body = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                ok, parse_failure, engine = classify(args.scenario, response.status_code, response.text)
+            except httpx.HTTPError:
+                ok, parse_failure, engine = False, False, None
+            samples.append((time.perf_counter() - started, ok, parse_failure, engine))
+
+    started = time.perf_counter()
+    async with client:
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ms = np.asarray([s[0] for s in samples]) * 1000
+    engines = {}
+    for s in samples:
+        if s[3]:
+            engines[s[3]] = engines.get(s[3], 0) + 1
+    return {
+        "scenario": args.scenario,
+        "requests": len(samples),
+        "concurrency": args.concurrency,
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+        "error_rate": round(sum(1 for s in samples if not s[1]) / len(samples), 4),
+        "parse_failure_rate": round(sum(1 for s in samples if s[2]) / len(samples), 4),
+        "engines": json.dumps(engines, sort_keys=True),
+        "model_calls": fake.calls if not args.url else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=sorted(ROUTES), default="suggest")
+    parser.add_argument("--url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--tasks", type=int, default=20, help="tasks per request")
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--token-delay-ms", type=float, default=0, help="delay between streamed chunks")
+    parser.add_argument("--chunk-chars", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--fenced", action="store_true", help="wrap answers in ```json fences")
+    parser.add_argument("--deadline-ms", type=int, default=0, help="send deadline_ms with each suggestion")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="share of requests repeating earlier inputs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", help="append results to this CSV file")
+    args = parser.parse_args()
+
+    row = asyncio.run(run(args))
+    for key, value in row.items():
+        print(f"{key:<20}{value}")
+
+    if args.csv:
+        new_file = not os.path.exists(args.csv)
+        with open(args.csv, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(row))
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+if __name__ == "__main__":
+    main()
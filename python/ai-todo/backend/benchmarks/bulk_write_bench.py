@@ -0,0 +1,106 @@
+"""Round trips and latency of AI writebacks: one update_one per item vs BulkWriter.
+
+Replays the categorize + schedule writeback of an AI plan against a scratch
+collection (bench_tasks) in the configured MongoDB, or the in-memory fallback
+when Mongo is not reachable. --latency-ms adds a simulated network delay per
+round trip to show its effect on a remote cluster.
+
+Usage (from backend/):
+    python benchmarks/bulk_write_bench.py [--items 200] [--batch-size 500] [--latency-ms 0] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+from bulk_writer import BulkWriter
+from task_writeback import build_task_lookup, writeback_filter
+
+class CountingCollection:
+    """Wraps a collection and counts (optionally delays) each server round trip"""
+
+    ROUND_TRIP_METHODS = ("update_one", "insert_one", "bulk_write")
+
+    def __init__(self, collection, latency_ms=0):
+        self.collection = collection
+        self.latency = latency_ms / 1000
+        self.round_trips = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.collection, name)
+        if name not in self.ROUND_TRIP_METHODS:
+            return attr
+
+        def call(*args, **kwargs):
+            self.round_trips += 1
+            if self.latency:
+                time.sleep(self.latency)
+            return attr(*args, **kwargs)
+        return call
+
+def seed(collection, items, user_id):
+    if database.MONGO_AVAILABLE:
+        collection.delete_many({"user_id": user_id})
+    tasks = []
+    for i in range(items):
+        doc = {"task": f"bench task {i}", "user_id": user_id, "status": "pending"}
+        doc["id"] = str(collection.insert_one(dict(doc)).inserted_id)
+        tasks.append(doc)
+    return tasks
+
+def plan_for(tasks):
+    categorized = [{"id": t["id"], "task": t["task"], "category": "Work", "priority": "High", "score": 0.5} for t in tasks]
+    schedule = [{"id": t["id"], "task": t["task"], "start_iso": "2025-11-14T09:00:00Z", "end_iso": "2025-11-14T10:00:00Z"} for t in tasks]
+    return categorized, schedule
+
+def per_item_writeback(collection, lookup, user_id, categorized, schedule):
+    for item in categorized:
+        collection.update_one(writeback_filter(item, lookup, user_id), {"$set": {"category": item["category"], "priority": item["priority"]}})
+    for item in schedule:
+        collection.update_one(writeback_filter(item, lookup, user_id), {"$set": {"scheduled_start": item["start_iso"], "scheduled_end": item["end_iso"]}})
+
+def bulk_writeback(collection, lookup, user_id, categorized, schedule, batch_size):
+    with BulkWriter(collection, batch_size) as writer:
+        for item in categorized:
+            writer.update_one(writeback_filter(item, lookup, user_id), {"$set": {"category": item["category"], "priority": item["priority"]}}, key=item["id"])
+    with BulkWriter(collection, batch_size) as writer:
+        for item in schedule:
+            writer.update_one(writeback_filter(item, lookup, user_id), {"$set": {"scheduled_start": item["start_iso"], "scheduled_end": item["end_iso"]}}, key=item["id"])
+
+def measure(name, fn, counting, repeat):
+    times = []
+    for _ in range(repeat):
+        counting.round_trips = 0
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    print(f"{name:<10} round_trips/request={counting.round_trips:>5}  best={min(times) * 1000:8.2f}ms")
+    return counting.round_trips, min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    raw = database.db["bench_tasks"] if database.MONGO_AVAILABLE else database.tasks_collection
+    user_id = "bulk-write-bench"
+    tasks = seed(raw, args.items, user_id)
+    lookup = build_task_lookup(tasks)
+    categorized, schedule = plan_for(tasks)
+    counting = CountingCollection(raw, args.latency_ms)
+
+    print(f"items={args.items} (categorize + schedule)  mongo={database.MONGO_AVAILABLE}  latency={args.latency_ms}ms")
+    before, before_s = measure("per-item", lambda: per_item_writeback(counting, lookup, user_id, categorized, schedule), counting, args.repeat)
+    after, after_s = measure("bulk", lambda: bulk_writeback(counting, lookup, user_id, categorized, schedule, args.batch_size), counting, args.repeat)
+    print(f"round trips {before} -> {after}  speedup={before_s / after_s:.1f}x")
+
+    if database.MONGO_AVAILABLE:
+        raw.drop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""BERT runtime benchmark and accuracy check: torch fp32 vs ONNX fp32 vs ONNX int8.
+
+Encodes a fixed corpus of task-like texts with each runtime and reports single-text
+latency (p50/p99), batch throughput and model size. Vectors of every runtime are compared
+with the torch fp32 vectors; the run fails when the mean or minimum cosine similarity
+drops below the thresholds.
+
+Usage (from backend/):
+    python benchmarks/embedding_bench.py [--runtimes torch onnx onnx-int8] [--threads 0]
+        [--texts 512] [--batch-size 32] [--latency-samples 200]
+        [--min-cosine 0.97] [--mean-cosine 0.99] [--csv results.csv]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import preprocess
+
+VERBS = ["pay", "write", "call", "book", "review", "clean", "buy", "prepare", "send", "fix", "plan", "study for"]
+OBJECTS = ["rent", "the quarterly report", "mom", "dentist appointment", "pull request #42", "the kitchen",
+           "groceries", "slides for Monday's standup", "invoice to ACME", "flat tyre", "weekend trip", "the exam"]
+DETAILS = ["", "before Friday", "asap!!", "after work", "— don't forget the receipts", "at 9:30am",
+           "(high priority)", "with Sam & Alex", "if it's sunny", "by end of month"]
+
+def corpus(n, seed=0):
+    """Fixed corpus of task-like texts, normalized like the production path"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        words = [rng.choice(VERBS), rng.choice(OBJECTS), rng.choice(DETAILS)]
+        if rng.random() < 0.2:
+            words += [rng.choice(VERBS), rng.choice(OBJECTS)]
+        texts.append(preprocess.normalize(" ".join(words)))
+    return texts
+
+def model_mb(model):
+    path = getattr(model, "path", None)
+    if path:
+        return os.path.getsize(path) / 1e6
+    return sum(p.numel() * p.element_size() for p in model.parameters()) / 1e6
+
+def cosine_rows(a, b):
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+def bench(runtime, texts, args):
+    started = time.perf_counter()
+    model = preprocess.build_bert_model(runtime, threads=args.threads)
+    load_ms = (time.perf_counter() - started) * 1000
+    model.encode(texts[:args.batch_size], batch_size=args.batch_size)   # warm up
+
+    latencies = []
+    for text in texts[:args.latency_samples]:
+        started = time.perf_counter()
+        model.encode([text], batch_size=1)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=args.batch_size), dtype=np.float32)
+    elapsed = time.perf_counter() - started
+    return vectors, {
+        "runtime": runtime,
+        "threads": args.threads,
+        "load_ms": round(load_ms, 1),
+        "model_mb": round(model_mb(model), 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "batch_size": args.batch_size,
+        "texts_per_s": round(len(texts) / elapsed, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runtimes", nargs="+", default=list(preprocess.BERT_RUNTIMES), choices=preprocess.BERT_RUNTIMES)
+    parser.add_argument("--threads", type=int, default=preprocess.EMBEDDING_THREADS, help="intra-op threads (0: library default)")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--latency-samples", type=int, default=200)
+    parser.add_argument("--min-cosine", type=float, default=0.97, help="lowest allowed cosine to the torch vector")
+    parser.add_argument("--mean-cosine", type=float, default=0.99, help="lowest allowed mean cosine to the torch vectors")
+    parser.add_argument("--csv", help="append results to this CSV file")
+    args = parser.parse_args()
+
+    texts = corpus(args.texts)
+    runtimes = args.runtimes if "torch" in args.runtimes else ["torch"] + args.runtimes
+    reference = None
+    rows = []
+    failed = False
+    for runtime in runtimes:
+        vectors, row = bench(runtime, texts, args)
+        if reference is None:
+            reference = vectors
+        cos = cosine_rows(vectors, reference)
+        row["mean_cosine"] = round(float(cos.mean()), 5)
+        row["min_cosine"] = round(float(cos.min()), 5)
+        row["accuracy"] = "ok" if cos.min() >= args.min_cosine and cos.mean() >= args.mean_cosine else "FAIL"
+        failed = failed or row["accuracy"] == "FAIL"
+        rows.append(row)
+
+    columns = list(rows[0])
+    print("  ".join(f"{c:>12}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[c]):>12}" for c in columns))
+
+    if args.csv:
+        new_file = not os.path.exists(args.csv)
+        with open(args.csv, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Import time per backend module, checked against a regression budget.
+
+Each module is imported in a fresh interpreter with -X importtime (median of --repeat
+runs). The cumulative time is compared with benchmarks/import_budget.json. The check
+also verifies that heavy dependencies (nltk, scikit-learn, sentence-transformers,
+torch) are still not imported by importing the module. Exits with status 1 on any
+regression, so it can run in CI.
+
+app and main connect to MongoDB on import; run against a reachable mongod, or the
+pymongo client waits out its 5 s server selection timeout.
+
+Usage (from backend/):
+    python benchmarks/import_time.py [--modules preprocess app] [--repeat 3] [--update]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(BACKEND, "benchmarks", "import_budget.json")
+# Headroom applied to measured times by --update
+UPDATE_HEADROOM = 2.0
+
+def measure(module, lazy_modules):
+    """(cumulative import ms, heavy modules that got imported) for one fresh import"""
+    probe = f"import sys, json, {module}; print(json.dumps(sorted(m for m in {lazy_modules!r} if m in sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=BACKEND, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2] == " " + module:
+            # Top-level (unindented) entry for the module itself
+            cumulative_us = int(parts[1])
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return (cumulative_us or 0) / 1000, loaded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", help="modules to check (default: all in the budget file)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--update", action="store_true", help=f"rewrite budgets as {UPDATE_HEADROOM}x the measured times")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as f:
+        config = json.load(f)
+    budgets = config["budgets_ms"]
+    lazy_modules = config.get("lazy_modules", [])
+    modules = args.modules or list(budgets)
+
+    failed = False
+    print(f"{'module':<20}{'median ms':>12}{'budget ms':>12}  status")
+    for module in modules:
+        runs = [measure(module, lazy_modules) for _ in range(max(1, args.repeat))]
+        median_ms = statistics.median(ms for ms, _ in runs)
+        eager = sorted(set(m for _, loaded in runs for m in loaded))
+        budget = budgets.get(module)
+        status = "ok"
+        if budget is not None and median_ms > budget:
+            status = "OVER BUDGET"
+        if eager:
+            status = f"imports {', '.join(eager)} eagerly"
+        if status != "ok":
+            failed = True
+        print(f"{module:<20}{median_ms:>12.1f}{budget if budget is not None else '-':>12}  {status}")
+        if args.update:
+            budgets[module] = int(round(median_ms * UPDATE_HEADROOM, -1)) or 10
+
+    if args.update:
+        with open(BUDGET_FILE, "w") as f:
+            json.dump(config, f, indent=2)
+            f.write("\n")
+        print(f"Updated {BUDGET_FILE}")
+    elif failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Concurrency vs latency curve for a running backend.
+
+Start the router app against a local mongod (uvicorn app:app --port 8000), then sweep
+concurrency levels. Run once on a build with sync routes and once with async routes
+(pass --label to tell the runs apart, --csv to append results to a file).
+
+Usage (from backend/):
+    python benchmarks/load_test.py [--url http://localhost:8000] [--scenario mixed]
+        [--concurrency 1 8 32 64 128 256] [--requests 2000] [--label async] [--csv results.csv]
+
+Scenarios:
+    list    GET /tasks/?user_id=...&limit=50
+    ranked  GET /tasks/ranked?user_id=...&k=20
+    add     POST /tasks/add (embedding + writes)
+    mixed   70% list, 20% ranked, 10% add
+"""
+import argparse
+import csv
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+USER_ID = "load-test-user"
+
+def make_request(session, base, scenario, rng):
+    if scenario == "mixed":
+        scenario = rng.choices(["list", "ranked", "add"], weights=[70, 20, 10])[0]
+    if scenario == "list":
+        return session.get(f"{base}/tasks/", params={"user_id": USER_ID, "limit": 50})
+    if scenario == "ranked":
+        return session.get(f"{base}/tasks/ranked", params={"user_id": USER_ID, "k": 20})
+    return session.post(f"{base}/tasks/add", json={
+        "user_id": USER_ID,
+        "task": f"load test task {rng.randrange(1_000_000)}",
+        "estimated_minutes": rng.randrange(5, 120)
+    })
+
+def seed(base, count):
+    """Give the load-test user some tasks to list and rank"""
+    rows = "\n".join(
+        f'{{"user_id": "{USER_ID}", "task": "seed task {i}", "estimated_minutes": {5 + i % 100}}}'
+        for i in range(count)
+    )
+    response = requests.post(f"{base}/tasks/bulk-add", data=rows.encode(), headers={"Content-Type": "application/x-ndjson"})
+    response.raise_for_status()
+    print(f"seeded {response.json().get('inserted')} tasks")
+
+def run_level(base, scenario, concurrency, total):
+    sessions = [requests.Session() for _ in range(concurrency)]
+    samples = []
+
+    def worker(i):
+        session = sessions[i]
+        rng = random.Random(i)
+        for _ in range(i, total, concurrency):
+            started = time.perf_counter()
+            try:
+                ok = make_request(session, base, scenario, rng).status_code < 400
+            except requests.RequestException:
+                ok = False
+            samples.append((time.perf_counter() - started, ok))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ms = np.asarray([latency for latency, _ in samples]) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": sum(1 for _, ok in samples if not ok),
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--scenario", choices=["list", "ranked", "add", "mixed"], default="mixed")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64, 128, 256])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--seed-tasks", type=int, default=500, help="tasks created before the sweep (0 to skip)")
+    parser.add_argument("--label", default=os.getenv("LOAD_TEST_LABEL", ""))
+    parser.add_argument("--csv", help="append results to this CSV file")
+    args = parser.parse_args()
+
+    if args.seed_tasks:
+        seed(args.url, args.seed_tasks)
+
+    rows = []
+    print(f"{'label':<10}{'conc':>6}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for concurrency in args.concurrency:
+        row = {"label": args.label, "scenario": args.scenario, **run_level(args.url, args.scenario, concurrency, args.requests)}
+        rows.append(row)
+        print(f"{row['label']:<10}{row['concurrency']:>6}{row['rps']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}{row['errors']:>8}")
+
+    if args.csv:
+        new_file = not os.path.exists(args.csv)
+        with open(args.csv, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Vectorized ranking vs the scalar compute_task_score loop.
+
+Checks that ranking.score_tasks matches compute_task_score within a tolerance
+and reports the speedup.
+
+Usage (from backend/):
+    python benchmarks/ranking_bench.py [--tasks 5000] [--repeat 5] [--tolerance 1e-5] [--legacy-fraction 0.3]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ranking import score_tasks, top_k
+from scheduler import compute_task_score
+from vector_codec import encode_dense
+
+def synthetic_tasks(n, dim, now, rng, legacy_fraction=0.0):
+    tasks = []
+    for i in range(n):
+        task = {"task": f"task {i}"}
+        if rng.random() < 0.8:
+            due = now + timedelta(hours=float(rng.uniform(-48, 240)))
+            task["due_date"] = due.isoformat() + ("Z" if i % 2 else "")
+        if rng.random() < 0.7:
+            task["estimated_minutes"] = int(rng.integers(5, 240))
+        if rng.random() < 0.9:
+            vec = rng.normal(size=dim).astype(np.float32)
+            # Optionally mix in legacy list vectors, like a partially migrated collection
+            task["bert_vector"] = vec.tolist() if rng.random() < legacy_fraction else encode_dense(vec)
+        tasks.append(task)
+    return tasks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    parser.add_argument("--legacy-fraction", type=float, default=0.0, help="share of vectors stored as lists")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    now = datetime.utcnow()
+    tasks = synthetic_tasks(args.tasks, args.dim, now, rng, args.legacy_fraction)
+    profile = {"user_embedding": encode_dense(rng.normal(size=args.dim)), "priority_adjustment": 0.1}
+
+    scalar_times, vector_times = [], []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        scalar = np.array([compute_task_score(t, profile, now=now) for t in tasks])
+        t1 = time.perf_counter()
+        vectorized = score_tasks(tasks, profile, now=now)
+        top_k(vectorized, args.k)
+        t2 = time.perf_counter()
+        scalar_times.append(t1 - t0)
+        vector_times.append(t2 - t1)
+
+    max_diff = float(np.max(np.abs(scalar - vectorized)))
+    scalar_ms = min(scalar_times) * 1000
+    vector_ms = min(vector_times) * 1000
+    print(f"tasks={args.tasks}  scalar={scalar_ms:.2f}ms  vectorized={vector_ms:.2f}ms  speedup={scalar_ms / vector_ms:.1f}x")
+    print(f"max |scalar - vectorized| = {max_diff:.2e} (tolerance {args.tolerance:.0e})")
+    if max_diff > args.tolerance:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
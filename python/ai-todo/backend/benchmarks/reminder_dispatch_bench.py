@@ -0,0 +1,187 @@
+"""Schedule/cancel cost and fire-time skew of the reminder dispatcher at scale.
+
+For each size, fills a MongoDB reminders collection with that many pending reminders
+spread over the next 30 days (filling only the difference from the previous size), then
+measures with the backlog in place:
+  - schedule: single upserts and upserts batched through a BulkWriter (us/op)
+  - cancel: single cancels (us/op)
+  - fire: a burst of reminders coming due over a few seconds, claimed in batches and
+    fired by the worker pool; reports the time until the last one fired and the skew
+    between the fire time and the time the worker started it (p50/p99/max)
+and the in-memory heap on its own for the same number of entries (capped by --heap-max).
+
+Needs a real MongoDB (the in-memory fallback cannot run the claim queries). 50M reminders
+take roughly 10 GB of disk with the indexes.
+
+Usage (from backend/):
+    python benchmarks/reminder_dispatch_bench.py [--sizes 1000000 10000000 50000000]
+        [--ops 10000] [--burst 20000] [--burst-seconds 10] [--workers 16] [--batch 500]
+        [--mongo-uri mongodb://localhost:27017/] [--reuse] [--drop]
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from pymongo import ASCENDING, MongoClient
+from bulk_writer import BulkWriter
+from reminder_dispatcher import NO_LEASE, PENDING, ReminderDispatcher, ReminderHeap
+
+BENCH_PREFIX = "bench_"
+
+def ensure_indexes(collection):
+    collection.create_index([("state", ASCENDING), ("fire_at", ASCENDING)])
+    collection.create_index([("user_id", ASCENDING), ("state", ASCENDING), ("fire_at", ASCENDING)])
+
+def reminder(i, fire_at, prefix="backlog_"):
+    return {
+        "_id": f"{prefix}{i}",
+        "user_id": f"user{i % 100000}",
+        "task_id": f"{i:024x}",
+        "title": "Reminder",
+        "body": f"Reminder {i}",
+        "fire_at": fire_at,
+        "state": PENDING,
+        "lease_until": NO_LEASE,
+        "attempts": 0
+    }
+
+def fill(collection, start, stop, chunk):
+    """Pending reminders start..stop, spread over 30 days starting in an hour"""
+    base = datetime.utcnow() + timedelta(hours=1)
+    for first in range(start, stop, chunk):
+        collection.insert_many(
+            [reminder(i, base + timedelta(seconds=(i * 7919) % (30 * 86400))) for i in range(first, min(first + chunk, stop))],
+            ordered=False
+        )
+
+def bench_schedule_cancel(collection, dispatcher, ops):
+    """us/op of single scheduling, BulkWriter scheduling and single cancels"""
+    base = datetime.utcnow() + timedelta(days=1)
+    fields = {"user_id": "user_bench", "task_id": "task_bench", "title": "Reminder", "body": "Reminder"}
+    started = time.perf_counter()
+    for i in range(ops):
+        dispatcher.schedule(f"{BENCH_PREFIX}single_{i}", base + timedelta(seconds=i), fields)
+    single_us = (time.perf_counter() - started) / ops * 1e6
+
+    writer = BulkWriter(collection)
+    started = time.perf_counter()
+    for i in range(ops):
+        dispatcher.schedule(f"{BENCH_PREFIX}bulk_{i}", base + timedelta(seconds=i), fields, writer)
+    writer.flush()
+    bulk_us = (time.perf_counter() - started) / ops * 1e6
+
+    started = time.perf_counter()
+    for i in range(ops):
+        dispatcher.cancel(f"{BENCH_PREFIX}single_{i}")
+    cancel_us = (time.perf_counter() - started) / ops * 1e6
+    return single_us, bulk_us, cancel_us
+
+def bench_fire(collection, args):
+    """Fire a burst of reminders due over burst_seconds; returns skews (ms) and elapsed seconds"""
+    skews = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def fire(doc):
+        skew = (datetime.utcnow() - doc["fire_at"]).total_seconds() * 1000
+        with lock:
+            skews.append(skew)
+            if len(skews) >= args.burst:
+                done.set()
+
+    dispatcher = ReminderDispatcher(collection, fire, batch_size=args.batch, workers=args.workers)
+    # Due a couple of seconds from now so the dispatcher claims them ahead of time
+    first = datetime.utcnow() + timedelta(seconds=2)
+    for start in range(0, args.burst, 10000):
+        collection.insert_many([
+            reminder(i, first + timedelta(seconds=args.burst_seconds * i / args.burst), f"{BENCH_PREFIX}burst_")
+            for i in range(start, min(start + 10000, args.burst))
+        ], ordered=False)
+    started = time.perf_counter()
+    dispatcher.start()
+    finished = done.wait(args.burst_seconds + args.timeout)
+    elapsed = time.perf_counter() - started
+    dispatcher.stop()
+    return np.asarray(skews), elapsed, finished, dispatcher.stats()
+
+def bench_heap(size):
+    """ns/op of push, cancel and pop_due on a heap holding size entries"""
+    heap = ReminderHeap()
+    times = [random.random() * 1e6 for _ in range(size)]
+    started = time.perf_counter()
+    for i, fire_ts in enumerate(times):
+        heap.push(fire_ts, i, None)
+    push_ns = (time.perf_counter() - started) / size * 1e9
+    started = time.perf_counter()
+    for i in range(0, size, 2):
+        heap.cancel(i)
+    cancel_ns = (time.perf_counter() - started) / (size // 2 or 1) * 1e9
+    started = time.perf_counter()
+    popped = 0
+    while heap.next_time() is not None:
+        popped += len(heap.pop_due(float("inf"), 1000))
+    pop_ns = (time.perf_counter() - started) / (popped or 1) * 1e9
+    return push_ns, cancel_ns, pop_ns
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument("--ops", type=int, default=10000, help="schedule/cancel operations per size")
+    parser.add_argument("--burst", type=int, default=20000, help="reminders fired per size")
+    parser.add_argument("--burst-seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--chunk", type=int, default=50000)
+    parser.add_argument("--heap-max", type=int, default=5_000_000)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--reuse", action="store_true", help="keep reminders from a previous run")
+    parser.add_argument("--drop", action="store_true", help="drop the collection when done")
+    args = parser.parse_args()
+
+    collection = MongoClient(args.mongo_uri)["taskflow_ai_bench"]["reminders"]
+    if not args.reuse:
+        collection.drop()
+    ensure_indexes(collection)
+    collection.delete_many({"_id": {"$regex": f"^{BENCH_PREFIX}"}})
+    dispatcher = ReminderDispatcher(collection, lambda doc: None)
+
+    rows = []
+    for size in sorted(args.sizes):
+        have = collection.estimated_document_count()
+        if have < size:
+            started = time.perf_counter()
+            fill(collection, have, size, args.chunk)
+            elapsed = time.perf_counter() - started
+            print(f"filled {size - have:,} reminders in {elapsed:.1f}s ({(size - have) / elapsed:,.0f}/s)")
+
+        single_us, bulk_us, cancel_us = bench_schedule_cancel(collection, dispatcher, args.ops)
+        skews, elapsed, finished, stats = bench_fire(collection, args)
+        heap_ns = bench_heap(min(size, args.heap_max))
+        collection.delete_many({"_id": {"$regex": f"^{BENCH_PREFIX}"}})
+        rows.append((size, single_us, bulk_us, cancel_us, skews, elapsed, finished, stats, heap_ns))
+
+    print(f"{'reminders':>11} {'schedule us':>12} {'bulk us':>8} {'cancel us':>10} {'done s':>7} "
+          f"{'skew p50':>9} {'p99':>8} {'max ms':>8} {'claims':>7} {'heap push/cancel/pop ns':>24}")
+    failed = False
+    for size, single_us, bulk_us, cancel_us, skews, elapsed, finished, stats, heap_ns in rows:
+        failed = failed or not finished
+        p50, p99, worst = (np.percentile(skews, 50), np.percentile(skews, 99), skews.max()) if len(skews) else (0, 0, 0)
+        print(f"{size:>11,} {single_us:>12.0f} {bulk_us:>8.0f} {cancel_us:>10.0f} {elapsed:>7.1f} "
+              f"{p50:>9.1f} {p99:>8.1f} {worst:>8.1f} {stats['claim_round_trips']:>7} "
+              f"{'/'.join(f'{ns:.0f}' for ns in heap_ns):>24}{'' if finished else '  (timed out)'}")
+    print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    if args.drop:
+        collection.drop()
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
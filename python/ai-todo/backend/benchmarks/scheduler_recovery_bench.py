@@ -0,0 +1,171 @@
+"""Recovery time of the persistent reminder job store after a restart.
+
+Fills a job store (SQLite file or MongoDB collection) with pending reminder jobs the way
+scheduler.schedule_reminder stores them, then starts a fresh scheduler on it, as after a
+restart. Some reminders came due while the backend was down: those within the misfire
+grace fire on startup, older ones are dropped, and recurring ones fire once (coalesced).
+Reports the fill rate, how long start() takes, the time to the first and the last
+catch-up run, and the next wakeup found through the next_run_time index.
+
+Usage (from backend/):
+    python benchmarks/scheduler_recovery_bench.py [--store sqlite|mongo] [--reminders 1000000]
+        [--overdue 0.01] [--stale 0.001] [--recurring 0.05] [--grace-seconds 3600]
+        [--path /tmp/recovery.sqlite] [--mongo-uri mongodb://localhost:27017/] [--reuse]
+"""
+import argparse
+import os
+import pickle
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytz
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.job import Job
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.util import datetime_to_utc_timestamp
+
+def fire(user_id, task_id, title, body):
+    """Stands in for scheduler.send_reminder so the benchmark measures the scheduler only"""
+
+def open_store(args):
+    from reminder_index import IndexedMongoDBJobStore, job_owner
+    if args.store == "sqlite":
+        from sqlite_jobstore import SQLiteJobStore
+        return SQLiteJobStore(args.path, owner_of=job_owner)
+    return IndexedMongoDBJobStore(host=args.mongo_uri, database="taskflow_ai_bench", collection="scheduler_jobs")
+
+def job_states(args, now):
+    """(id, next_run_time timestamp, pickled state) for every reminder, in chunks"""
+    template = Job(
+        BackgroundScheduler(timezone=pytz.UTC), id="template", func=fire,
+        trigger=DateTrigger(now, timezone=pytz.UTC), executor="default", args=("user", "task", "title", "body"), kwargs={},
+        name="send_reminder", misfire_grace_time=args.grace_seconds, coalesce=True,
+        max_instances=1, next_run_time=now
+    ).__getstate__()
+    n = args.reminders
+    stale = int(n * args.stale)
+    overdue = int(n * args.overdue)
+    recurring = int(n * args.recurring)
+    chunk = []
+    for i in range(n):
+        if i < stale:
+            run_time = now - timedelta(seconds=args.grace_seconds * 2 + i % 3600)
+        elif i < stale + overdue:
+            run_time = now - timedelta(seconds=(i % max(1, args.grace_seconds // 2)) + 1)
+        else:
+            # Spread the rest over the next 30 days
+            run_time = now + timedelta(seconds=60 + (i * 7919) % (30 * 86400))
+        state = dict(template)
+        state["args"] = (f"user{i % 100000}", f"{i:024x}", "Reminder", f"Reminder {i}")
+        if stale + overdue <= i < stale + overdue + recurring:
+            # Daily reminder that started three days ago: three missed runs, coalesced into one
+            start = now - timedelta(days=3, seconds=i % max(1, args.grace_seconds // 2))
+            state["id"] = f"recurring_daily_user{i % 100000}_{i:024x}_{start.isoformat()}"
+            state["trigger"] = IntervalTrigger(days=1, start_date=start, timezone=pytz.UTC)
+            state["next_run_time"] = start
+        else:
+            state["id"] = f"reminder_user{i % 100000}_{i:024x}_{run_time.isoformat()}"
+            state["trigger"] = DateTrigger(run_time, timezone=pytz.UTC)
+            state["next_run_time"] = run_time
+        chunk.append((
+            state["id"], datetime_to_utc_timestamp(state["next_run_time"]), pickle.dumps(state, pickle.HIGHEST_PROTOCOL),
+            state["args"][0], state["args"][1]
+        ))
+        if len(chunk) == args.chunk:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def fill(store, args, now):
+    store.remove_all_jobs()
+    for chunk in job_states(args, now):
+        if args.store == "sqlite":
+            store.add_states(chunk)
+        else:
+            from bson.binary import Binary
+            store.collection.insert_many(
+                [{"_id": job_id, "next_run_time": ts, "job_state": Binary(state), "user_id": user_id, "task_id": task_id}
+                 for job_id, ts, state, user_id, task_id in chunk],
+                ordered=False
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", choices=["sqlite", "mongo"], default="sqlite")
+    parser.add_argument("--reminders", type=int, default=1_000_000)
+    parser.add_argument("--overdue", type=float, default=0.01, help="share that came due during the downtime, within the grace")
+    parser.add_argument("--stale", type=float, default=0.001, help="share missed by more than the grace")
+    parser.add_argument("--recurring", type=float, default=0.05, help="share of daily recurring reminders with missed runs")
+    parser.add_argument("--grace-seconds", type=int, default=3600)
+    parser.add_argument("--chunk", type=int, default=50000)
+    parser.add_argument("--path", default="/tmp/scheduler_recovery_bench.sqlite")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--reuse", action="store_true", help="skip filling and recover the existing store")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    now = datetime.now(pytz.UTC)
+    expected = int(args.reminders * args.stale) + int(args.reminders * args.overdue) + int(args.reminders * args.recurring)
+    if not args.reuse:
+        store = open_store(args)
+        started = time.perf_counter()
+        fill(store, args, now)
+        elapsed = time.perf_counter() - started
+        print(f"filled {args.reminders:,} jobs in {elapsed:.1f}s ({args.reminders / elapsed:,.0f} jobs/s)")
+        store.shutdown()
+
+    # Restart: a new store connection and a new scheduler
+    counts = {"executed": 0, "missed": 0, "errors": 0}
+    first = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def listener(event):
+        with lock:
+            key = "missed" if event.code == EVENT_JOB_MISSED else ("errors" if event.code == EVENT_JOB_ERROR else "executed")
+            counts[key] += 1
+            if not first:
+                first.append(time.perf_counter())
+            if sum(counts.values()) >= expected:
+                done.set()
+
+    store = open_store(args)
+    scheduler = BackgroundScheduler(
+        jobstores={"default": store},
+        executors={"default": ThreadPoolExecutor(20)},
+        job_defaults={"coalesce": True, "misfire_grace_time": args.grace_seconds},
+        timezone=pytz.UTC
+    )
+    scheduler.add_listener(listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+    started = time.perf_counter()
+    scheduler.start()
+    start_ms = (time.perf_counter() - started) * 1000
+    finished = done.wait(args.timeout)
+    caught_up_ms = (time.perf_counter() - started) * 1000
+    first_ms = (first[0] - started) * 1000 if first else None
+
+    lookup = time.perf_counter()
+    next_run = store.get_next_run_time()
+    next_ms = (time.perf_counter() - lookup) * 1000
+    scheduler.shutdown(wait=False)
+
+    print(f"store={args.store}  pending={args.reminders:,}  due at restart={expected:,}")
+    print(f"start()            {start_ms:10.1f} ms")
+    print(f"first catch-up run {first_ms:10.1f} ms" if first_ms is not None else "first catch-up run          - ")
+    print(f"all due handled    {caught_up_ms:10.1f} ms{'' if finished else '  (timed out)'}")
+    print(f"fired {counts['executed']:,}  dropped as stale {counts['missed']:,}  errors {counts['errors']:,}")
+    print(f"next wakeup lookup {next_ms:10.2f} ms  ({next_run.isoformat() if next_run else None})")
+    print(f"peak RSS           {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:10.0f} MB")
+    if not finished:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
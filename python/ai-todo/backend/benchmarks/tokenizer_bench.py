@@ -0,0 +1,76 @@
+"""Fast tokenizer vs the NLTK path: output equivalence and docs/sec.
+
+Checks that preprocess.tokenize_and_clean gives exactly the tokens of the NLTK reference
+(preprocess.tokenize_nltk) on the golden corpus in tokenizer_golden.txt plus generated
+task texts, then reports docs/sec for the NLTK path, the fast path with a cold cache and
+the batch API on a corpus with repeated texts.
+
+Usage (from backend/):
+    python benchmarks/tokenizer_bench.py [--docs 20000] [--repeat-ratio 0.5] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import preprocess
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tokenizer_golden.txt")
+
+WORDS = ["pay", "rent", "write", "report", "call", "mom", "can't", "cannot", "gonna", "wanna", "the",
+         "Q3", "invoice#42", "e-mail", "café", "meeting@10:30", "(urgent)", "don't", "gotta", "lemme",
+         "gimme", "review", "PR", "deploy!!", "groceries", "—", "...", "naïve", "日本", "Straße"]
+
+def generated(n, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(1, 16))) for _ in range(n)]
+
+def with_repeats(texts, ratio, seed=1):
+    """Same length as texts, with ratio of the entries repeating earlier ones"""
+    rng = random.Random(seed)
+    out = []
+    for text in texts:
+        out.append(rng.choice(out) if out and rng.random() < ratio else text)
+    return out
+
+def docs_per_sec(fn, docs, repeat, before=None):
+    best = float("inf")
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - started)
+    return len(docs) / best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--repeat-ratio", type=float, default=0.5, help="share of repeated texts for the batch run")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = f.read().split("\n")
+    docs = generated(args.docs)
+
+    mismatches = [text for text in golden + docs if preprocess.tokenize_and_clean(text) != preprocess.tokenize_nltk(text)]
+    for text in mismatches[:10]:
+        print(f"MISMATCH {text!r}: fast={preprocess.tokenize_and_clean(text)} nltk={preprocess.tokenize_nltk(text)}")
+    print(f"checked {len(golden)} golden + {len(docs)} generated texts, {len(mismatches)} mismatches")
+
+    clear = preprocess._clean_tokens.cache_clear
+    nltk_rate = docs_per_sec(lambda d: [preprocess.tokenize_nltk(t) for t in d], docs, args.repeat)
+    fast_rate = docs_per_sec(lambda d: [preprocess.tokenize_and_clean(t) for t in d], docs, args.repeat, before=clear)
+    repeated = with_repeats(docs, args.repeat_ratio)
+    batch_rate = docs_per_sec(preprocess.tokenize_batch, repeated, args.repeat, before=clear)
+    print(f"nltk          {nltk_rate:>12,.0f} docs/s")
+    print(f"fast (cold)   {fast_rate:>12,.0f} docs/s  {fast_rate / nltk_rate:.1f}x")
+    print(f"batch ({args.repeat_ratio:.0%} repeats) {batch_rate:>8,.0f} docs/s  {batch_rate / nltk_rate:.1f}x")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Recall and latency of exact vs IVF search in vector_index.
+
+Each size is measured at several --noise levels: 0.6 gives well separated clusters,
+1.5 and 3.0 overlapping ones, closer to embeddings of short and varied task text, where
+IVF recall drops sharply.
+
+Usage (from backend/):
+    python benchmarks/vector_index_bench.py [--sizes 1000 10000 100000] [--noise 0.6 1.5 3.0]
+        [--queries 200] [--k 10] [--nprobe 32]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vector_index import VectorIndex, VECTOR_INDEX_NPROBE
+
+def synthetic_embeddings(n, dim, clusters, noise, rng):
+    """Clustered unit vectors; the higher the noise, the more the clusters overlap"""
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    data = centers[labels] + noise * rng.normal(size=(n, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+def percentile_ms(samples, p):
+    return float(np.percentile(np.asarray(samples) * 1000, p))
+
+def run(size, noise, queries, k, dim, nprobe):
+    rng = np.random.default_rng(42)
+    data = synthetic_embeddings(size + queries, dim, max(8, size // 200), noise, rng)
+    # Partitions are built once, when the last vector is added
+    index = VectorIndex(dim=dim, exact_max=size - 1, nprobe=nprobe)
+
+    started = time.perf_counter()
+    for i in range(size):
+        index.upsert(str(i), data[i])
+    build_s = time.perf_counter() - started
+
+    exact_times, ivf_times, recalls = [], [], []
+    for q in data[size:]:
+        t0 = time.perf_counter()
+        truth = index.search(q, k=k, exact=True)
+        t1 = time.perf_counter()
+        approx = index.search(q, k=k, exact=False)
+        t2 = time.perf_counter()
+        exact_times.append(t1 - t0)
+        ivf_times.append(t2 - t1)
+        truth_ids = {tid for tid, _ in truth}
+        recalls.append(len(truth_ids & {tid for tid, _ in approx}) / len(truth_ids))
+
+    print(
+        f"n={size:>8}  noise={noise:3.1f}  build={build_s:6.2f}s  partitions={len(index.lists):>4}  "
+        f"exact p50={percentile_ms(exact_times, 50):7.3f}ms p99={percentile_ms(exact_times, 99):7.3f}ms  "
+        f"ivf p50={percentile_ms(ivf_times, 50):7.3f}ms p99={percentile_ms(ivf_times, 99):7.3f}ms  "
+        f"recall@{k}={np.mean(recalls):.3f}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--noise", type=float, nargs="+", default=[0.6, 1.5, 3.0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--nprobe", type=int, default=VECTOR_INDEX_NPROBE)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for noise in args.noise:
+            run(size, noise, args.queries, args.k, args.dim, args.nprobe)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads for blocking database, job-store and index work called from async routes. Kept
+# apart from the embedding executor so slow Mongo or SQLite calls do not hold encode threads.
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "16"))
+
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking (non-embedding) function on the blocking I/O executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(fn, *args, **kwargs))
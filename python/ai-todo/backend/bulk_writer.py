@@ -0,0 +1,126 @@
+import os
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Operations sent per bulk_write round trip
+BULK_WRITE_BATCH_SIZE = int(os.getenv("BULK_WRITE_BATCH_SIZE", "500"))
+
+class BulkWriter:
+    """Queues writes for one collection and sends them as unordered bulk_write batches.
+
+    Every queued operation (and every skipped item) gets a per-item result with its
+    caller-supplied key, so a request can report exactly which writes failed.
+    """
+
+    def __init__(self, collection, batch_size=BULK_WRITE_BATCH_SIZE):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.pending = []
+        self.results = []
+        self.round_trips = 0
+        self.counts = {"matched": 0, "modified": 0, "upserted": 0, "inserted": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def add(self, operation, key=None):
+        """Queue a pymongo write operation; flushes when a batch is full"""
+        self.pending.append((key, operation))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def update_one(self, filter, update, upsert=False, key=None):
+        self.add(UpdateOne(filter, update, upsert=upsert), key)
+
+    def insert_one(self, document, key=None):
+        self.add(InsertOne(document), key)
+
+    def skip(self, key, reason):
+        """Record an item that was not written, so it still shows up in the results"""
+        self.results.append({"key": key, "ok": False, "error": reason})
+
+    def flush(self):
+        """Send queued operations; returns the per-item results so far"""
+        if not self.pending:
+            return self.results
+        batch, self.pending = self.pending, []
+        try:
+            details = self.collection.bulk_write([op for _, op in batch], ordered=False).bulk_api_result
+        except Exception as e:
+            details = self._error_details(batch, e)
+        self._record(batch, details)
+        return self.results
+
+    def _error_details(self, batch, error):
+        if isinstance(error, BulkWriteError):
+            # Unordered: the other operations in the batch were still applied
+            return error.details
+        print(f"Error writing batch of {len(batch)} operations: {error}")
+        return {"writeErrors": [{"index": i, "errmsg": str(error)} for i in range(len(batch))]}
+
+    def _record(self, batch, details):
+        self.round_trips += 1
+        errors = {error["index"]: error.get("errmsg", "write error") for error in details.get("writeErrors", [])}
+        upserted = {upsert["index"]: upsert["_id"] for upsert in details.get("upserted", [])}
+        self.counts["matched"] += details.get("nMatched", 0)
+        self.counts["modified"] += details.get("nModified", 0)
+        self.counts["upserted"] += details.get("nUpserted", 0)
+        self.counts["inserted"] += details.get("nInserted", 0)
+
+        for i, (key, _) in enumerate(batch):
+            item = {"key": key, "ok": i not in errors}
+            if i in errors:
+                item["error"] = errors[i]
+            if i in upserted:
+                item["upserted_id"] = str(upserted[i])
+            self.results.append(item)
+
+    def summary(self):
+        """Totals for the writes flushed so far"""
+        failed = sum(1 for item in self.results if not item["ok"])
+        return {
+            "items": len(self.results),
+            "written": len(self.results) - failed,
+            "failed": failed,
+            **self.counts,
+            "round_trips": self.round_trips
+        }
+
+    def report(self):
+        """Flush and return the summary plus per-item results"""
+        self.flush()
+        return {**self.summary(), "results": self.results}
+
+class AsyncBulkWriter(BulkWriter):
+    """BulkWriter for async (Motor) collections.
+
+    Queueing stays synchronous, so sync helpers such as scheduler.schedule_reminder can
+    fill it; batches are only sent when flush() or report() is awaited.
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.flush()
+
+    def add(self, operation, key=None):
+        self.pending.append((key, operation))
+
+    async def flush(self):
+        while self.pending:
+            batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+            try:
+                result = await self.collection.bulk_write([op for _, op in batch], ordered=False)
+                details = result.bulk_api_result
+            except Exception as e:
+                details = self._error_details(batch, e)
+            self._record(batch, details)
+        return self.results
+
+    async def report(self):
+        await self.flush()
+        return {**self.summary(), "results": self.results}
@@ -1,16 +1,41 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, InsertOne
 from pymongo.errors import ConnectionFailure
 import os
+import asyncio
+import functools
+import itertools
 from datetime import datetime
 
+# Motor is optional; without it the async collections run blocking calls in a thread pool
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    MOTOR_AVAILABLE = True
+except ImportError:
+    MOTOR_AVAILABLE = False
+
+# Connection pool size of the async client (upper bound on concurrent Mongo operations)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+
+class MockCursor(list):
+    """List of documents that accepts the cursor methods routes chain onto find()"""
+    
+    def sort(self, *args, **kwargs):
+        return self
+    
+    def limit(self, n):
+        return MockCursor(self[:n]) if n else self
+    
+    def batch_size(self, n):
+        return self
+
 # Define MockCollection class
 class MockCollection:
     def __init__(self):
         self._tasks = []
         self._id_counter = 1
     
-    def find(self, query=None):
-        return self._tasks
+    def find(self, query=None, projection=None):
+        return MockCursor(self._tasks)
     
     def insert_one(self, task):
         from bson.objectid import ObjectId
@@ -18,17 +43,48 @@ class MockCollection:
         self._tasks.append(task)
         return type('obj', (object,), {'inserted_id': task["_id"]})()
     
-    def update_one(self, query, update):
+    def insert_many(self, documents, ordered=True):
+        ids = [self.insert_one(document).inserted_id for document in documents]
+        return type('obj', (object,), {'inserted_ids': ids})()
+    
+    def update_one(self, query, update, upsert=False):
         # Simple implementation for mock
         return type('obj', (object,), {'matched_count': 1})()
     
+    def bulk_write(self, requests, ordered=True):
+        # Simple implementation for mock: report every operation as applied
+        result = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [], "writeErrors": []}
+        for request in requests:
+            if isinstance(request, InsertOne):
+                self.insert_one(request._doc)
+                result["nInserted"] += 1
+            else:
+                result["nMatched"] += 1
+        return type('obj', (object,), {'bulk_api_result': result})()
+    
+    def delete_many(self, query):
+        # Simple implementation for mock
+        return type('obj', (object,), {'deleted_count': 0})()
+    
+    def create_index(self, keys, **kwargs):
+        # Indexes are not needed for in-memory storage
+        return None
+    
     def delete_one(self, query):
         # Simple implementation for mock
         return type('obj', (object,), {'deleted_count': 1})()
     
-    def find_one(self, query):
+    def find_one(self, query, projection=None):
         # Simple implementation for mock
         return self._tasks[0] if self._tasks else None
+    
+    def find_one_and_update(self, query, update, projection=None):
+        # Simple implementation for mock
+        return self.find_one(query, projection)
+    
+    def find_one_and_delete(self, query, projection=None):
+        # Simple implementation for mock
+        return self.find_one(query, projection)
 
 try:
     # Try to connect to MongoDB
@@ -41,16 +97,109 @@ try:
     users_collection = db["users"]
     reminders_collection = db["reminders"]
     notifications_collection = db["notifications"]
+    embeddings_collection = db["embeddings"]
+    vectorizers_collection = db["vectorizers"]
+    leases_collection = db["leases"]
+    ai_responses_collection = db["ai_responses"]
+    MONGO_AVAILABLE = True
     print("Connected to MongoDB successfully")
 except ConnectionFailure:
     print("Failed to connect to MongoDB. Using in-memory storage instead.")
+    db = None
     tasks_collection = MockCollection()
     users_collection = MockCollection()
     reminders_collection = MockCollection()
     notifications_collection = MockCollection()
+    embeddings_collection = MockCollection()
+    vectorizers_collection = MockCollection()
+    leases_collection = MockCollection()
+    ai_responses_collection = MockCollection()
+    MONGO_AVAILABLE = False
 except Exception as e:
     print(f"Error connecting to MongoDB: {e}. Using in-memory storage instead.")
+    db = None
     tasks_collection = MockCollection()
     users_collection = MockCollection()
     reminders_collection = MockCollection()
-    notifications_collection = MockCollection()
\ No newline at end of file
+    notifications_collection = MockCollection()
+    embeddings_collection = MockCollection()
+    vectorizers_collection = MockCollection()
+    leases_collection = MockCollection()
+    ai_responses_collection = MockCollection()
+    MONGO_AVAILABLE = False
+
+class AsyncCursor:
+    """Async iteration over a blocking cursor, fetching in the default executor"""
+    
+    def __init__(self, cursor):
+        self.cursor = cursor
+    
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+    
+    def limit(self, n):
+        self.cursor = self.cursor.limit(n)
+        return self
+    
+    def batch_size(self, n):
+        self.cursor = self.cursor.batch_size(n)
+        return self
+    
+    async def to_list(self, length=None):
+        def fetch():
+            docs = []
+            for doc in self.cursor:
+                docs.append(doc)
+                if length and len(docs) >= length:
+                    break
+            return docs
+        return await asyncio.get_running_loop().run_in_executor(None, fetch)
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        loop = asyncio.get_running_loop()
+        iterator = iter(self.cursor)
+        while True:
+            # One executor hop per batch of documents, not per document
+            docs = await loop.run_in_executor(None, lambda: list(itertools.islice(iterator, 100)))
+            if not docs:
+                return
+            for doc in docs:
+                yield doc
+
+class AsyncCollection:
+    """Motor-compatible wrapper that runs a blocking collection's calls in the default executor"""
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+    
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+        
+        async def call(*args, **kwargs):
+            return await asyncio.get_running_loop().run_in_executor(None, functools.partial(method, *args, **kwargs))
+        return call
+
+# Async collections for `async def` routes
+if MONGO_AVAILABLE and MOTOR_AVAILABLE:
+    async_client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE, serverSelectionTimeoutMS=5000)
+    async_db = async_client["taskflow_ai"]
+    async_tasks_collection = async_db["tasks"]
+    async_users_collection = async_db["users"]
+    async_reminders_collection = async_db["reminders"]
+    async_notifications_collection = async_db["notifications"]
+    async_ai_responses_collection = async_db["ai_responses"]
+else:
+    if MONGO_AVAILABLE:
+        print("motor is not installed; async routes will run pymongo calls in a thread pool")
+    async_tasks_collection = AsyncCollection(tasks_collection)
+    async_users_collection = AsyncCollection(users_collection)
+    async_reminders_collection = AsyncCollection(reminders_collection)
+    async_notifications_collection = AsyncCollection(notifications_collection)
+    async_ai_responses_collection = AsyncCollection(ai_responses_collection)
@@ -0,0 +1,217 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import preprocess
+from preprocess import normalize, get_tfidf_embedding, get_tfidf_embeddings, get_bert_embeddings
+from database import embeddings_collection, MONGO_AVAILABLE
+from embedding_service import embedding_service
+from vector_codec import encode_dense, is_dense_encoded
+from bulk_writer import BulkWriter
+
+# In-process tier size (entries)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# Comma-separated model versions whose shared entries are deleted at startup
+RETIRED_EMBEDDING_VERSIONS = [v.strip() for v in os.getenv("RETIRED_EMBEDDING_VERSIONS", "").split(",") if v.strip()]
+
+def embedding_key(kind, text, model_version):
+    """Content-addressed cache key for a text under a given model version"""
+    raw = f"{kind}\x00{model_version}\x00{normalize(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """Two-tier embedding cache: bounded in-process LRU in front of a shared Mongo collection"""
+
+    def __init__(self, collection=None, max_entries=EMBEDDING_CACHE_SIZE):
+        self.collection = collection
+        self.max_entries = max(1, max_entries)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = {}
+
+        # Metrics
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_errors = 0
+
+    def get(self, kind, text, model_version, compute_fn):
+        """Get one embedding, computing and storing it on a miss"""
+        return self.get_many(kind, [text], model_version, compute_fn)[0]
+
+    def get_many(self, kind, texts, model_version, compute_fn):
+        """Get embeddings for texts, calling compute_fn once for all misses"""
+        self._check_version(kind, model_version)
+        keys = [embedding_key(kind, text, model_version) for text in texts]
+        found = {}
+
+        # Tier 1: in-process LRU
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+        self.memory_hits += sum(1 for key in keys if key in found)
+
+        # Tier 2: shared collection
+        pending = [key for key in dict.fromkeys(keys) if key not in found]
+        if pending and self.collection is not None:
+            try:
+                for doc in self.collection.find({"_id": {"$in": pending}}, {"vector": 1}):
+                    found[doc["_id"]] = doc["vector"]
+                    self._remember(doc["_id"], doc["vector"])
+                    self.shared_hits += 1
+            except Exception as e:
+                self.shared_errors += 1
+                print(f"Error reading shared embedding cache: {e}")
+
+        # Compute whatever is still missing in one call
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            self.misses += len(missing)
+            vectors = compute_fn(list(missing.values()))
+            for key, vector in zip(missing, vectors):
+                found[key] = vector
+                self._remember(key, vector)
+            self._store_shared(kind, model_version, dict(zip(missing, vectors)))
+
+        return [found[key] for key in keys]
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+                self.evictions += 1
+
+    def _store_shared(self, kind, model_version, vectors):
+        if self.collection is None or not vectors:
+            return
+        now = datetime.utcnow()
+        # One unordered bulk_write for all new entries
+        writer = BulkWriter(self.collection)
+        for key, vector in vectors.items():
+            writer.update_one(
+                {"_id": key},
+                {"$setOnInsert": {
+                    "kind": kind,
+                    "model": model_version,
+                    "vector": vector,
+                    "created_at": now
+                }},
+                upsert=True,
+                key=key
+            )
+        failed = [item for item in writer.flush() if not item["ok"]]
+        if failed:
+            self.shared_errors += len(failed)
+            print(f"Error writing {len(failed)} shared embeddings: {failed[0].get('error')}")
+
+    def _check_version(self, kind, model_version):
+        """Drop in-process entries of a kind whose model version changed"""
+        previous = self._versions.get(kind)
+        if previous == model_version:
+            return
+        self._versions[kind] = model_version
+        if previous is not None:
+            # Other replicas may still use the previous version (rolling deploys, BERT_RUNTIME
+            # set per node), so its shared entries are left to expire through the TTL index
+            with self._lock:
+                self._lru.clear()
+
+    def retire(self, model_version):
+        """Delete the shared entries of a model version that no replica uses any more"""
+        # Keys embed the model version, so the LRU can simply be cleared
+        with self._lock:
+            self._lru.clear()
+        if self.collection is None:
+            return
+        try:
+            result = self.collection.delete_many({"model": model_version})
+            print(f"Deleted {result.deleted_count} shared embeddings of retired model {model_version}")
+        except Exception as e:
+            self.shared_errors += 1
+            print(f"Error retiring shared embeddings: {e}")
+
+    def stats(self):
+        """Report hit/miss counters for both tiers"""
+        lookups = self.memory_hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "shared_errors": self.shared_errors,
+            "hit_rate": round((self.memory_hits + self.shared_hits) / lookups, 4) if lookups else 0
+        }
+
+# The in-memory fallback collection cannot answer $in queries, so only share through real Mongo
+# Shared entries expire through the TTL index declared in indexes.py
+embedding_cache = EmbeddingCache(embeddings_collection if MONGO_AVAILABLE else None)
+
+def purge_stale_embeddings():
+    """Remove shared embeddings of the model versions listed in RETIRED_EMBEDDING_VERSIONS"""
+    for version in RETIRED_EMBEDDING_VERSIONS:
+        if version in (preprocess.BERT_VERSION, preprocess.TFIDF_VERSION):
+            print(f"Not retiring embeddings of {version}: this process still uses it")
+            continue
+        embedding_cache.retire(version)
+
+def encode_bert_embeddings(texts):
+    """Embed texts through the batching service and pack them as float32 binaries"""
+    return [encode_dense(vector) for vector in embedding_service.embed_many(texts)]
+
+def get_cached_bert_embedding(text):
+    """float32-encoded BERT embedding for text, served from cache or the batching service"""
+    vector = embedding_cache.get("bert", text, preprocess.BERT_VERSION, encode_bert_embeddings)
+    # Shared entries written before the binary encoding are still plain lists
+    return vector if is_dense_encoded(vector) else encode_dense(vector)
+
+def get_cached_tfidf_embedding(text, tfidf_state=None):
+    """TF-IDF embedding for text, served from cache when the vectorizer version matches"""
+    version, vectorizer = tfidf_state or preprocess.get_tfidf_state()
+    if version is None:
+        # No fitted vectorizer yet
+        return None
+    return embedding_cache.get(
+        "tfidf",
+        text,
+        version,
+        lambda texts: [get_tfidf_embedding(t, vectorizer) for t in texts]
+    )
+
+def encode_bert_chunk(texts):
+    """Embed a whole chunk in one encode call, bypassing the micro-batcher (used by bulk imports)"""
+    return [encode_dense(vector) for vector in get_bert_embeddings(texts)]
+
+def get_cached_bert_embeddings(texts, compute_fn=encode_bert_embeddings):
+    """float32-encoded BERT embeddings for texts; all cache misses are computed in one compute_fn call"""
+    vectors = embedding_cache.get_many("bert", texts, preprocess.BERT_VERSION, compute_fn)
+    return [vector if is_dense_encoded(vector) else encode_dense(vector) for vector in vectors]
+
+def get_cached_tfidf_embeddings(texts, tfidf_state=None):
+    """TF-IDF embeddings for texts; all cache misses share one transform call"""
+    version, vectorizer = tfidf_state or preprocess.get_tfidf_state()
+    if version is None:
+        return [None for _ in texts]
+    return embedding_cache.get_many("tfidf", texts, version, lambda batch: get_tfidf_embeddings(batch, vectorizer))
+
+def embed_task_fields(text):
+    """Embedding fields stored on a task document for its text (blocking; run it on the embedding executor)"""
+    # Taken before encoding, so a vectorizer swapped in meanwhile cannot mislabel the vector
+    tfidf_state = preprocess.get_tfidf_state()
+    return {
+        "bert_vector": get_cached_bert_embedding(text),
+        "tfidf_vector": get_cached_tfidf_embedding(text, tfidf_state),
+        "tfidf_version": tfidf_state[0],
+        # Part of the vector index version, so other workers notice the new vector
+        "embedded_at": datetime.utcnow().isoformat()
+    }
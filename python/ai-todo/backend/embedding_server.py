@@ -0,0 +1,305 @@
+"""Shared embedding server: one process owns the SentenceTransformer model for all API workers.
+
+API workers send encode requests over a Unix socket. The server batches texts from all
+connections (EmbeddingBatcher) so concurrent workers share encode calls. A supervisor
+restarts the server when it exits or stops answering health checks.
+
+Usage (from backend/):
+    python embedding_server.py supervise   # supervisor + server (what EMBEDDING_SERVER_AUTOSTART runs)
+    python embedding_server.py serve       # server only
+    python embedding_server.py health      # print the server's health report
+"""
+import os
+import sys
+import json
+import time
+import errno
+import fcntl
+import socket
+import struct
+import signal
+import threading
+import subprocess
+import socketserver
+import numpy as np
+
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "/tmp/taskflow-embedding.sock")
+# Seconds a client waits for an answer (and for a restarting server to come back)
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "30"))
+# Start the supervisor from the first API worker that finds no server running
+EMBEDDING_SERVER_AUTOSTART = os.getenv("EMBEDDING_SERVER_AUTOSTART", "true").lower() in ("1", "true", "yes")
+EMBEDDING_SERVER_HEALTH_INTERVAL = float(os.getenv("EMBEDDING_SERVER_HEALTH_INTERVAL", "5"))
+# Consecutive failed health checks before the supervisor restarts the server
+EMBEDDING_SERVER_MAX_FAILED_CHECKS = int(os.getenv("EMBEDDING_SERVER_MAX_FAILED_CHECKS", "3"))
+
+HEADER = struct.Struct(">II")
+
+class EmbeddingServerUnavailable(RuntimeError):
+    """The embedding server could not be reached within the timeout"""
+
+# Wire format: (header length, payload length), JSON header, raw payload bytes.
+# Vectors travel as float32 payloads instead of JSON numbers.
+
+def send_message(sock, header, payload=b""):
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(HEADER.pack(len(data), len(payload)) + data + payload)
+
+def recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("embedding server connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def recv_message(sock):
+    header_len, payload_len = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    header = json.loads(recv_exactly(sock, header_len))
+    payload = recv_exactly(sock, payload_len) if payload_len else b""
+    return header, payload
+
+# Server
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """One thread per API worker connection; requests on it are answered in order"""
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                header, _ = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            op = header.get("op")
+            try:
+                if op == "encode":
+                    texts = header.get("texts") or []
+                    vectors = np.asarray(server.batcher.embed_many(texts, timeout=EMBEDDING_SERVER_TIMEOUT), dtype=np.float32)
+                    dim = vectors.shape[1] if vectors.ndim == 2 else 0
+                    send_message(self.request, {"ok": True, "count": len(texts), "dim": dim}, vectors.tobytes())
+                elif op == "health":
+                    send_message(self.request, server.health())
+                else:
+                    send_message(self.request, {"ok": False, "error": f"unknown op {op!r}"})
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                send_message(self.request, {"ok": False, "error": str(e)})
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, batcher):
+        self.batcher = batcher
+        self.started_at = time.time()
+        super().__init__(socket_path, EmbeddingRequestHandler)
+
+    def health(self):
+        import preprocess
+        stats = self.batcher.stats()
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "model": preprocess.BERT_VERSION,
+            "runtime": preprocess.BERT_RUNTIME,
+            "model_loaded": preprocess.bert_model is not None,
+            "model_state": preprocess.readiness()["bert"],
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "queue_depth": stats["queue_depth"],
+            "batcher": stats
+        }
+
+def serve(socket_path=EMBEDDING_SERVER_SOCKET):
+    """Load the model and answer encode requests until terminated"""
+    import preprocess
+    from embedding_service import EmbeddingBatcher
+
+    # Always encode in this process, whatever EMBEDDING_BACKEND the API workers use
+    preprocess.EMBEDDING_BACKEND = "local"
+    batcher = EmbeddingBatcher(preprocess.encode_bert_local)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = EmbeddingServer(socket_path, batcher)
+    os.chmod(socket_path, 0o660)
+    # Listen right away so health checks see the process while the model loads;
+    # encode requests that arrive meanwhile wait for it
+    threading.Thread(target=preprocess.warmup, name="embedding-warmup", daemon=True).start()
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"Embedding server {os.getpid()} listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        batcher.stop()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+# Supervisor
+
+def supervise(socket_path=EMBEDDING_SERVER_SOCKET):
+    """Run the server as a child process and restart it when it exits or stops answering"""
+    lock = open(socket_path + ".lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print("Another embedding server supervisor is already running")
+        return
+
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    backoff = 1
+    restarts = 0
+    while not stopping:
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--socket", socket_path])
+        print(f"Started embedding server {child.pid} (restarts: {restarts})")
+        failed_checks = 0
+        client = EmbeddingClient(socket_path, timeout=EMBEDDING_SERVER_HEALTH_INTERVAL, autostart=False)
+        while not stopping and child.poll() is None:
+            time.sleep(EMBEDDING_SERVER_HEALTH_INTERVAL)
+            if child.poll() is not None:
+                break
+            try:
+                client.health()
+                failed_checks = 0
+                backoff = 1
+            except Exception as e:
+                failed_checks += 1
+                print(f"Embedding server health check failed ({failed_checks}): {e}")
+                if failed_checks >= EMBEDDING_SERVER_MAX_FAILED_CHECKS:
+                    print(f"Embedding server {child.pid} is unresponsive, restarting it")
+                    child.kill()
+        client.close()
+
+        if child.poll() is None:
+            child.terminate()
+            try:
+                child.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                child.kill()
+        if stopping:
+            break
+        print(f"Embedding server {child.pid} exited with {child.returncode}, restarting in {backoff}s")
+        restarts += 1
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+def start_supervisor(socket_path=EMBEDDING_SERVER_SOCKET):
+    """Spawn a detached supervisor unless one already holds the lock"""
+    lock_path = socket_path + ".lock"
+    with open(lock_path, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "supervise", "--socket", socket_path],
+        start_new_session=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    print(f"Started embedding server supervisor for {socket_path}")
+    return True
+
+# Client
+
+class EmbeddingClient:
+    """Thin client used by the API workers; one connection per calling thread"""
+
+    def __init__(self, socket_path=EMBEDDING_SERVER_SOCKET, timeout=EMBEDDING_SERVER_TIMEOUT, autostart=EMBEDDING_SERVER_AUTOSTART):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.autostart = autostart
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.requests = 0
+        self.errors = 0
+        self.reconnects = 0
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _call(self, header):
+        """Send one request, reconnecting (and starting the server if allowed) until the timeout"""
+        deadline = time.monotonic() + self.timeout
+        started_supervisor = False
+        while True:
+            sock = getattr(self._local, "sock", None)
+            try:
+                if sock is None:
+                    sock = self._connect()
+                    self._local.sock = sock
+                    with self._lock:
+                        self.reconnects += 1
+                send_message(sock, header)
+                return recv_message(sock)
+            except OSError as e:
+                if sock is not None:
+                    sock.close()
+                self._local.sock = None
+                missing = isinstance(e, (FileNotFoundError, ConnectionRefusedError)) or e.errno in (errno.ENOENT, errno.ECONNREFUSED)
+                if missing and self.autostart and not started_supervisor:
+                    started_supervisor = True
+                    start_supervisor(self.socket_path)
+                if time.monotonic() >= deadline:
+                    with self._lock:
+                        self.errors += 1
+                    raise EmbeddingServerUnavailable(f"embedding server at {self.socket_path} unavailable: {e}")
+                time.sleep(0.2)
+
+    def encode(self, texts):
+        """Embeddings for already-normalized texts, as lists of floats"""
+        if not texts:
+            return []
+        with self._lock:
+            self.requests += 1
+        header, payload = self._call({"op": "encode", "texts": list(texts)})
+        if not header.get("ok"):
+            with self._lock:
+                self.errors += 1
+            raise RuntimeError(f"embedding server error: {header.get('error')}")
+        vectors = np.frombuffer(payload, dtype=np.float32).reshape(header["count"], header["dim"])
+        return vectors.tolist()
+
+    def health(self):
+        header, _ = self._call({"op": "health"})
+        return header
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def stats(self):
+        return {
+            "socket": self.socket_path,
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections": self.reconnects
+        }
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Shared embedding server")
+    parser.add_argument("command", choices=["serve", "supervise", "health"])
+    parser.add_argument("--socket", default=EMBEDDING_SERVER_SOCKET)
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.socket)
+    elif args.command == "supervise":
+        supervise(args.socket)
+    else:
+        print(json.dumps(EmbeddingClient(args.socket, timeout=5, autostart=False).health(), indent=2))
@@ -0,0 +1,156 @@
+import os
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from preprocess import get_bert_embeddings
+
+# Micro-batching limits (tune batch size against p99 latency on CPU nodes)
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "10"))
+
+# Threads for blocking embedding work called from async routes
+EMBED_EXECUTOR_WORKERS = int(os.getenv("EMBED_EXECUTOR_WORKERS", "8"))
+
+# Number of recent samples kept for percentile metrics
+METRICS_WINDOW = 2048
+
+class EmbeddingBatcher:
+    """Queue embedding requests from all handlers and encode them in micro-batches"""
+
+    def __init__(self, encode_fn, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self._queue_waits_ms = deque(maxlen=METRICS_WINDOW)
+        self._encode_ms = deque(maxlen=METRICS_WINDOW)
+
+    def start(self):
+        """Start the batching worker thread if it is not running"""
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread after draining queued requests"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def submit(self, text):
+        """Queue a text for embedding and return a future for its vector"""
+        future = Future()
+        self.start()
+        with self._cond:
+            self._queue.append((text, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def embed(self, text, timeout=None):
+        """Embed a single text, blocking until its batch has been encoded"""
+        return self.submit(text).result(timeout=timeout)
+
+    def embed_many(self, texts, timeout=None):
+        """Embed several texts, letting them share batches with other callers"""
+        futures = [self.submit(text) for text in texts]
+        return [f.result(timeout=timeout) for f in futures]
+
+    def _next_batch(self):
+        """Wait for a full batch or for the oldest request to reach max wait"""
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            if not self._queue:
+                return []
+
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._stopped:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            started = time.perf_counter()
+            texts = [text for text, _, _ in batch]
+            futures = [future for _, future, _ in batch]
+            try:
+                vectors = self.encode_fn(texts)
+            except Exception as e:
+                self._errors += 1
+                print(f"Error encoding embedding batch: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for future, vector in zip(futures, vectors):
+                future.set_result(vector)
+
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_sizes.append(len(batch))
+            self._encode_ms.append((finished - started) * 1000)
+            for _, _, enqueued in batch:
+                self._queue_waits_ms.append((started - enqueued) * 1000)
+
+    def stats(self):
+        """Report batch-size, queue-wait and encode-time metrics"""
+        def percentiles(samples):
+            if not samples:
+                return {"p50": None, "p99": None, "max": None}
+            arr = np.fromiter(samples, dtype=float)
+            return {
+                "p50": round(float(np.percentile(arr, 50)), 3),
+                "p99": round(float(np.percentile(arr, 99)), 3),
+                "max": round(float(arr.max()), 3)
+            }
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": len(self._queue),
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+            "avg_batch_size": round(self._items / self._batches, 3) if self._batches else 0,
+            "batch_size": percentiles(self._batch_sizes),
+            "queue_wait_ms": percentiles(self._queue_waits_ms),
+            "encode_ms": percentiles(self._encode_ms)
+        }
+
+# Shared service used by all request handlers
+embedding_service = EmbeddingBatcher(get_bert_embeddings)
+
+# Blocking embedding work (cache lookups, encodes, TF-IDF) runs here instead of on the event loop
+embedding_executor = ThreadPoolExecutor(max_workers=EMBED_EXECUTOR_WORKERS, thread_name_prefix="embedding")
+
+async def run_embedding(fn, *args, **kwargs):
+    """Run a blocking embedding function on the embedding executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(embedding_executor, functools.partial(fn, *args, **kwargs))
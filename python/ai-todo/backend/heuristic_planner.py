@@ -0,0 +1,147 @@
+import os
+import re
+import pytz
+from datetime import datetime, timedelta
+import numpy as np
+from scheduler import parse_due_date
+from ranking import TaskColumns, score_columns, top_k
+
+# Working hours (user's timezone) the local planner places tasks into
+LOCAL_PLAN_DAY_START_HOUR = int(os.getenv("LOCAL_PLAN_DAY_START_HOUR", "9"))
+LOCAL_PLAN_DAY_END_HOUR = int(os.getenv("LOCAL_PLAN_DAY_END_HOUR", "18"))
+LOCAL_PLAN_SLOT_MINUTES = int(os.getenv("LOCAL_PLAN_SLOT_MINUTES", "15"))
+LOCAL_PLAN_MAX_TASKS = int(os.getenv("LOCAL_PLAN_MAX_TASKS", "8"))
+LOCAL_PLAN_REMINDERS = int(os.getenv("LOCAL_PLAN_REMINDERS", "3"))
+
+CATEGORY_KEYWORDS = [
+    ("Finance", r"\b(pay|bill|bank|tax|taxes|invoice|budget|rent|insurance)\b"),
+    ("Health", r"\b(gym|doctor|dentist|run|workout|exercise|medicine|yoga|walk)\b"),
+    ("Study", r"\b(study|exam|homework|assignment|read|course|lecture|revise|learn)\b"),
+    ("Home", r"\b(clean|laundry|cook|dishes|vacuum|garden|repair|fix)\b"),
+    ("Errand", r"\b(buy|shop|shopping|pick up|groceries|store|post office|return)\b"),
+    ("Work", r"\b(meeting|email|report|project|client|deploy|review|presentation|call)\b"),
+    ("Personal", r"\b(birthday|friend|family|mom|dad|call|gift|trip)\b")
+]
+
+def guess_category(text):
+    """Keyword-based category for a task description"""
+    text = (text or "").lower()
+    for category, pattern in CATEGORY_KEYWORDS:
+        if re.search(pattern, text):
+            return category
+    return "Other"
+
+def priority_for(score, due_in_hours):
+    if due_in_hours is not None and due_in_hours <= 24:
+        return "High"
+    if score >= 0.6:
+        return "High"
+    if score >= 0.35:
+        return "Medium"
+    return "Low"
+
+def next_slot(local):
+    """First slot boundary at or after a naive local time that falls inside working hours"""
+    step = max(1, LOCAL_PLAN_SLOT_MINUTES)
+    minutes = (local.minute // step + (1 if local.minute % step or local.second or local.microsecond else 0)) * step
+    local = local.replace(minute=0, second=0, microsecond=0) + timedelta(minutes=minutes)
+    if local.hour < LOCAL_PLAN_DAY_START_HOUR:
+        local = local.replace(hour=LOCAL_PLAN_DAY_START_HOUR, minute=0)
+    elif local.hour >= LOCAL_PLAN_DAY_END_HOUR:
+        local = (local + timedelta(days=1)).replace(hour=LOCAL_PLAN_DAY_START_HOUR, minute=0)
+    return local
+
+def iso_utc(local, tz):
+    """ISO UTC string for a naive local time in tz"""
+    return tz.localize(local).astimezone(pytz.UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def rank_open_tasks(tasks, user_stats, now_utc):
+    """Open tasks as (score, hours until due or None, task), best first.
+
+    Scores and order come from the vectorized ranking (ranking.score_columns and top_k),
+    so the local plan and the prompt rank tasks exactly like /tasks/ranked; this only
+    drops completed tasks and keeps the hours until due for priorities and reasons.
+    """
+    # Same filter as the /tasks/ranked query
+    open_tasks = [task for task in tasks or [] if not task.get("completed") and task.get("status") != "completed"]
+    if not open_tasks:
+        return []
+    cols = TaskColumns(open_tasks, now=now_utc)
+    scores = score_columns(cols, user_stats or {})
+    ranked = []
+    for i in top_k(scores, None):
+        hours = cols.delta_hours[i]
+        ranked.append((float(scores[i]), None if np.isnan(hours) else float(hours), open_tasks[i]))
+    return ranked
+
+def parse_now(now):
+    """Request "now" as a naive UTC datetime (current time if missing or invalid)"""
+    try:
+        return parse_due_date(now)
+    except (TypeError, ValueError, AttributeError):
+        return datetime.utcnow()
+
+def local_plan(tasks, user_stats, now, timezone="UTC"):
+    """Suggestion in the same shape as the model's, computed without calling it.
+
+    Open tasks are ranked like /tasks/ranked and placed greedily, in rank order, into
+    the next free slots inside working hours; the top tasks get a reminder before their slot.
+    """
+    try:
+        tz = pytz.timezone(timezone or "UTC")
+    except pytz.UnknownTimeZoneError:
+        tz = pytz.UTC
+    now_utc = parse_now(now)
+    ranked = rank_open_tasks(tasks, user_stats, now_utc)
+
+    categorized = []
+    schedule_plan = []
+    reminder_recs = []
+    # Slots are computed on naive local times so DST changes land on the right wall-clock hours
+    cursor = next_slot(pytz.UTC.localize(now_utc).astimezone(tz).replace(tzinfo=None))
+    for score, due_in_hours, task in ranked:
+        ref = {"id": task.get("id") or task.get("_id"), "task": task.get("task")}
+        categorized.append({
+            **ref,
+            "category": task.get("category") or guess_category(task.get("task")),
+            "priority": priority_for(score, due_in_hours),
+            "score": round(max(0.0, min(1.0, score)), 3)
+        })
+        if len(schedule_plan) >= LOCAL_PLAN_MAX_TASKS:
+            continue
+
+        try:
+            minutes = int(task.get("estimated_minutes") or 30)
+        except (TypeError, ValueError):
+            minutes = 30
+        minutes = max(LOCAL_PLAN_SLOT_MINUTES, minutes)
+        end = cursor + timedelta(minutes=minutes)
+        day_end = cursor.replace(hour=LOCAL_PLAN_DAY_END_HOUR, minute=0)
+        if end > day_end and cursor > cursor.replace(hour=LOCAL_PLAN_DAY_START_HOUR, minute=0):
+            # Does not fit in what is left of the day; start it the next morning
+            cursor = next_slot(day_end)
+            end = cursor + timedelta(minutes=minutes)
+
+        reason = "Ranked by due date, estimated time and your history"
+        if due_in_hours is not None and due_in_hours <= 24:
+            reason = "Due within 24 hours"
+        schedule_plan.append({**ref, "start_iso": iso_utc(cursor, tz), "end_iso": iso_utc(end, tz), "reason": reason})
+        if len(reminder_recs) < LOCAL_PLAN_REMINDERS:
+            reminder_recs.append({**ref, "reminder_iso": iso_utc(cursor - timedelta(minutes=15), tz), "method": "in-app"})
+        cursor = next_slot(end)
+
+    return {
+        "categorized": categorized,
+        "schedule_plan": schedule_plan,
+        "reminder_recs": reminder_recs,
+        "explanation": "Planned locally: tasks ranked by due date, estimated time and your history, then placed in the next free slots of your working day."
+    }
+
+def mark_engine(response, result, engine, reason=None):
+    """Record which engine produced a suggestion, in the body and an X-AI-Engine header"""
+    result["engine"] = engine
+    response.headers["X-AI-Engine"] = engine
+    if reason:
+        result["fallback_reason"] = reason
+        response.headers["X-AI-Fallback-Reason"] = reason
+    return result
@@ -0,0 +1,124 @@
+import os
+from pymongo import ASCENDING, DESCENDING
+from database import db, MONGO_AVAILABLE
+
+EMBEDDING_CACHE_TTL_DAYS = int(os.getenv("EMBEDDING_CACHE_TTL_DAYS", "30"))
+
+# Profiler level set at startup (0 = off, 1 = slow operations, 2 = all)
+MONGO_PROFILE_LEVEL = int(os.getenv("MONGO_PROFILE_LEVEL", "0"))
+MONGO_PROFILE_SLOW_MS = int(os.getenv("MONGO_PROFILE_SLOW_MS", "100"))
+
+# Every index the service relies on, by collection
+DECLARED_INDEXES = {
+    "tasks": [
+        {"keys": [("user_id", ASCENDING)]},
+        {"keys": [("user_id", ASCENDING), ("status", ASCENDING), ("due_date", ASCENDING)]},
+        # Keyset pagination of /tasks: sort=_id and sort=due_date (due_date, _id) per user
+        {"keys": [("user_id", ASCENDING), ("_id", ASCENDING)]},
+        {"keys": [("user_id", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)]},
+        # Vector index version: latest embedding per user
+        {"keys": [("user_id", ASCENDING), ("embedded_at", DESCENDING)]},
+    ],
+    "reminders": [
+        {"keys": [("task_id", ASCENDING)]},
+        {"keys": [("user_id", ASCENDING), ("task_id", ASCENDING)]},
+        # Reminder dispatcher: claim due reminders, list a user's pending ones
+        {"keys": [("state", ASCENDING), ("fire_at", ASCENDING)]},
+        {"keys": [("user_id", ASCENDING), ("state", ASCENDING), ("fire_at", ASCENDING)]},
+    ],
+    "notifications": [
+        {"keys": [("user_id", ASCENDING), ("read", ASCENDING), ("created_at", DESCENDING)]},
+    ],
+    "embeddings": [
+        {"keys": [("created_at", ASCENDING)], "options": {"expireAfterSeconds": EMBEDDING_CACHE_TTL_DAYS * 24 * 3600}},
+        {"keys": [("kind", ASCENDING), ("model", ASCENDING)]},
+    ],
+    "vectorizers": [
+        {"keys": [("kind", ASCENDING), ("created_at", DESCENDING)]},
+    ],
+    "ai_responses": [
+        # Cached AI suggestions expire at their own expires_at
+        {"keys": [("expires_at", ASCENDING)], "options": {"expireAfterSeconds": 0}},
+        {"keys": [("user_id", ASCENDING)]},
+    ],
+}
+
+def index_name(keys):
+    """Default Mongo index name for a key list (e.g. user_id_1_status_1)"""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+def ensure_indexes():
+    """Create all declared indexes; existing ones are left untouched"""
+    if not MONGO_AVAILABLE:
+        return []
+    created = []
+    for collection, specs in DECLARED_INDEXES.items():
+        for spec in specs:
+            try:
+                created.append(db[collection].create_index(spec["keys"], **spec.get("options", {})))
+            except Exception as e:
+                print(f"Error creating index {index_name(spec['keys'])} on {collection}: {e}")
+    print(f"Ensured {len(created)} indexes")
+    return created
+
+def enable_profiler():
+    """Turn on the Mongo profiler when MONGO_PROFILE_LEVEL is set"""
+    if not MONGO_AVAILABLE or MONGO_PROFILE_LEVEL <= 0:
+        return
+    try:
+        db.command("profile", MONGO_PROFILE_LEVEL, slowms=MONGO_PROFILE_SLOW_MS)
+    except Exception as e:
+        print(f"Error enabling Mongo profiler: {e}")
+
+def collection_scans(limit=1000):
+    """Group recent profiled collection scans by namespace and filter shape"""
+    scans = {}
+    profile = db["system.profile"].find(
+        {"planSummary": {"$regex": "^COLLSCAN"}},
+        {"ns": 1, "op": 1, "command": 1, "millis": 1, "docsExamined": 1, "ts": 1}
+    ).sort("ts", DESCENDING).limit(limit)
+    for entry in profile:
+        command = entry.get("command", {})
+        query = command.get("filter") or command.get("q") or command.get("query") or {}
+        shape = sorted(query.keys()) if isinstance(query, dict) else []
+        key = (entry.get("ns"), entry.get("op"), tuple(shape))
+        scan = scans.setdefault(key, {
+            "ns": entry.get("ns"),
+            "op": entry.get("op"),
+            "filter_fields": shape,
+            "count": 0,
+            "total_millis": 0,
+            "max_docs_examined": 0,
+            "last_seen": None
+        })
+        scan["count"] += 1
+        scan["total_millis"] += entry.get("millis", 0)
+        scan["max_docs_examined"] = max(scan["max_docs_examined"], entry.get("docsExamined", 0))
+        if scan["last_seen"] is None:
+            scan["last_seen"] = entry.get("ts").isoformat() if entry.get("ts") else None
+    return sorted(scans.values(), key=lambda s: s["total_millis"], reverse=True)
+
+def index_report():
+    """Declared vs existing indexes per collection, plus collection scans seen by the profiler"""
+    if not MONGO_AVAILABLE:
+        return {"mongo": False}
+
+    collections = {}
+    for collection, specs in DECLARED_INDEXES.items():
+        existing = db[collection].index_information()
+        declared = [index_name(spec["keys"]) for spec in specs]
+        collections[collection] = {
+            "existing": sorted(existing),
+            "declared": declared,
+            "missing": [name for name in declared if name not in existing]
+        }
+
+    try:
+        profiler = db.command("profile", -1)
+        profiling = {"level": profiler.get("was", 0), "slowms": profiler.get("slowms")}
+        scans = collection_scans()
+    except Exception as e:
+        profiling = {"error": str(e)}
+        scans = []
+
+    return {"mongo": True, "collections": collections, "profiling": profiling, "collection_scans": scans}
@@ -0,0 +1,36 @@
+"""Named leases in MongoDB: at most one process holds a lease until it expires or is released.
+
+Used for work that must run once across hosts (running the stored reminder jobs, fitting
+the TF-IDF vectorizer), where a threading or file lock only covers one process or host.
+"""
+import os
+import socket
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import leases_collection
+
+# Identifies this process as a lease holder
+LEASE_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+def acquire_lease(name, seconds, owner=LEASE_OWNER, now=None):
+    """Take or renew a lease for seconds; True while owner holds it"""
+    now = now or datetime.utcnow()
+    try:
+        lease = leases_collection.find_one_and_update(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Held by another process: the upsert collided with its document
+        return False
+    return lease is not None and lease.get("owner") == owner
+
+def release_lease(name, owner=LEASE_OWNER):
+    """Give up a lease so another process can take it right away"""
+    try:
+        leases_collection.delete_one({"_id": name, "owner": owner})
+    except Exception as e:
+        print(f"Error releasing lease {name}: {e}")
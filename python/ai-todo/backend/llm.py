@@ -0,0 +1,219 @@
+import os
+import json
+import random
+import asyncio
+from abc import ABC, abstractmethod
+
+# Try to import google.generativeai, but make it optional so the fake backend works offline
+try:
+    import google.generativeai as genai
+    GENAI_AVAILABLE = True
+except ImportError as e:
+    genai = None
+    GENAI_AVAILABLE = False
+    print(f"Warning: google-generativeai not available due to: {e}. Only LLM_BACKEND=fake will work.")
+
+class Completion:
+    """Text of a model answer plus the prompt size the model reported (None if unknown)"""
+
+    def __init__(self, text, prompt_tokens=None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+
+class LLMClient(ABC):
+    """Interface the AI routes use to talk to a model.
+
+    generate(prompt) returns a Completion; stream(prompt) yields text chunks as they are
+    produced. needs_api_key tells the routes whether GOOGLE_API_KEY must be set.
+    """
+    model_name = ""
+    engine = ""
+    needs_api_key = False
+
+    @abstractmethod
+    async def generate(self, prompt):
+        """Complete prompt; returns a Completion"""
+
+    @abstractmethod
+    def stream(self, prompt):
+        """Async iterator of text chunks (implement as an async generator)"""
+
+class GeminiClient(LLMClient):
+    """Google Generative AI model with plain and streaming text generation"""
+    engine = "gemini"
+    needs_api_key = True
+
+    def __init__(self, model_name, generation_config=None):
+        if not GENAI_AVAILABLE:
+            raise RuntimeError("google-generativeai is not installed; set LLM_BACKEND=fake to run without it")
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if api_key:
+            genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.generation_config = generation_config or {'temperature': 0.0, 'max_output_tokens': 800}
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt):
+        completion = await self.model.generate_content_async(prompt, generation_config=self.generation_config)
+        if not completion:
+            raise Exception("Empty response from Google Generative AI")
+        usage = getattr(completion, "usage_metadata", None)
+        return Completion(completion.text, getattr(usage, "prompt_token_count", None))
+
+    async def stream(self, prompt):
+        """Yield text chunks as the model produces them"""
+        completion = await self.model.generate_content_async(
+            prompt,
+            generation_config=self.generation_config,
+            stream=True
+        )
+        async for chunk in completion:
+            if chunk.text:
+                yield chunk.text
+
+def prompt_tasks(prompt):
+    """The tasks array embedded in a suggestion prompt (empty if it cannot be found)"""
+    start = prompt.find('"tasks":')
+    if start == -1:
+        return []
+    try:
+        tasks, _ = json.JSONDecoder().raw_decode(prompt[start + len('"tasks":'):].lstrip())
+        return tasks if isinstance(tasks, list) else []
+    except ValueError:
+        return []
+
+def fake_plan(prompt):
+    """Deterministic suggestion JSON for the tasks in a prompt"""
+    tasks = prompt_tasks(prompt)
+    categorized = []
+    schedule = []
+    reminders = []
+    for i, task in enumerate(tasks):
+        ref = {"id": task.get("id"), "task": task.get("task", task.get("t"))}
+        categorized.append({**ref, "category": "Work", "priority": "High" if i == 0 else "Medium", "score": round(1 / (i + 1), 3)})
+        schedule.append({**ref, "start_iso": f"2030-01-01T{9 + i % 8:02d}:00:00Z", "end_iso": f"2030-01-01T{9 + i % 8:02d}:30:00Z", "reason": "fake plan"})
+    if tasks:
+        reminders.append({"id": tasks[0].get("id"), "task": tasks[0].get("task", tasks[0].get("t")), "reminder_iso": "2030-01-01T08:30:00Z", "method": "in-app"})
+    return json.dumps({
+        "categorized": categorized,
+        "schedule_plan": schedule,
+        "reminder_recs": reminders,
+        "explanation": "Fake plan generated locally."
+    }, indent=2)
+
+def canned(text):
+    """respond() that ignores the prompt and always answers with text"""
+    return lambda prompt: text
+
+def env_flag(name, default="false"):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+class FakeLLMError(Exception):
+    """Injected upstream failure; the message mimics the real API so routes handle it the same way"""
+
+class FakeLLM(LLMClient):
+    """Local stand-in for the model, for offline runs, CI and benchmarks.
+
+    latency_ms (+/- jitter_ms) passes before any output; streamed output then arrives
+    chunk_size characters at a time, token_delay_ms apart. error_rate of calls fail with
+    a 429 or 500 style error, malformed_rate return truncated JSON, and fenced wraps
+    answers in a ```json block. respond(prompt) produces the answer text; use canned() to
+    always return the same text.
+    """
+
+    def __init__(self, respond=fake_plan, latency_ms=0, jitter_ms=0, token_delay_ms=0, chunk_size=8,
+                 error_rate=0.0, quota_error_share=0.5, malformed_rate=0.0, fenced=False, seed=None):
+        self.model_name = "fake"
+        self.engine = "fake"
+        self.respond = respond
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.token_delay = token_delay_ms / 1000
+        self.chunk_size = max(1, chunk_size)
+        self.error_rate = error_rate
+        self.quota_error_share = quota_error_share
+        self.malformed_rate = malformed_rate
+        self.fenced = fenced
+        self.rng = random.Random(seed)
+
+        # Metrics
+        self.calls = 0
+        self.errors = 0
+        self.malformed = 0
+
+    @classmethod
+    def from_env(cls, model_name=None):
+        respond = fake_plan
+        response_file = os.getenv("FAKE_LLM_RESPONSE_FILE")
+        if response_file:
+            with open(response_file) as f:
+                respond = canned(f.read())
+        return cls(
+            respond=respond,
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "200")),
+            jitter_ms=float(os.getenv("FAKE_LLM_JITTER_MS", "50")),
+            token_delay_ms=float(os.getenv("FAKE_LLM_TOKEN_DELAY_MS", "20")),
+            chunk_size=int(os.getenv("FAKE_LLM_CHUNK_CHARS", "8")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            malformed_rate=float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0")),
+            fenced=env_flag("FAKE_LLM_FENCED"),
+            seed=int(os.getenv("FAKE_LLM_SEED")) if os.getenv("FAKE_LLM_SEED") else None
+        )
+
+    async def _start(self, prompt):
+        """Wait out the latency, maybe fail, and return the answer text"""
+        self.calls += 1
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            if self.rng.random() < self.quota_error_share:
+                raise FakeLLMError("429 Resource has been exhausted (e.g. check quota). [fake]")
+            raise FakeLLMError("500 An internal error has occurred. [fake]")
+
+        text = self.respond(prompt)
+        if self.rng.random() < self.malformed_rate:
+            # Cut the answer off mid-way, like a response that hit max_output_tokens
+            self.malformed += 1
+            text = text[:max(1, len(text) // 2)]
+        return f"```json\n{text}\n```" if self.fenced else text
+
+    async def generate(self, prompt):
+        return Completion(await self._start(prompt))
+
+    async def stream(self, prompt):
+        text = await self._start(prompt)
+        for i in range(0, len(text), self.chunk_size):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield text[i:i + self.chunk_size]
+
+    def stats(self):
+        return {"calls": self.calls, "errors": self.errors, "malformed": self.malformed}
+
+# Backends selectable with LLM_BACKEND; each factory takes the model name
+LLM_BACKENDS = {
+    "gemini": GeminiClient,
+    "fake": FakeLLM.from_env
+}
+
+_clients = {}
+_override = None
+
+def get_llm(model_name):
+    """Client for the configured backend (one per model name)"""
+    if _override is not None:
+        return _override
+    backend = os.getenv("LLM_BACKEND", "gemini")
+    key = (backend, model_name)
+    if key not in _clients:
+        if backend not in LLM_BACKENDS:
+            raise ValueError(f"Unknown LLM_BACKEND {backend!r}; expected one of {sorted(LLM_BACKENDS)}")
+        _clients[key] = LLM_BACKENDS[backend](model_name)
+    return _clients[key]
+
+def set_llm(client):
+    """Route every get_llm() call to client (None restores the configured backend)"""
+    global _override
+    _override = client
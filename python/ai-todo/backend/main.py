@@ -1,31 +1,35 @@
-import google.generativeai as genai
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, validator
-from pymongo import MongoClient
 from bson.objectid import ObjectId
 import os
-import json
 from dotenv import load_dotenv
 from typing import Optional, List
 from datetime import datetime
 import numpy as np
-from preprocess import get_bert_embedding, get_tfidf_embedding
-from scheduler import scheduler, schedule_reminder, update_user_embedding
+import preprocess
+from embedding_cache import embed_task_fields
+from embedding_service import run_embedding
+from blocking_io import run_blocking
+from startup import lifespan
+from scheduler import scheduler, schedule_reminder, reschedule_task_reminders, cancel_task_reminders, index_task_embedding
+from vector_codec import encode_dense, dense_to_list
+from bulk_writer import AsyncBulkWriter
+from ai_cache import ai_cache
+from llm import get_llm
+from suggestion_pipeline import suggest
+from vector_index import vector_indexes
+from task_queries import find_tasks, stream_ndjson, encode_cursor, InvalidCursor, MAX_PAGE_SIZE
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+GEMINI_MODEL = 'models/gemini-2.5-flash'
 
-# MongoDB setup (adjust URI for Atlas if needed)
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-db = client["taskflow_ai"]
-tasks_collection = db["tasks"]
-users_collection = db["users"]
-reminders_collection = db["reminders"]
+# MongoDB setup (adjust MONGO_URI for Atlas if needed); routes use the async collections
+from database import async_tasks_collection, async_users_collection, async_reminders_collection
 
-app = FastAPI(title="TaskFlow AI Backend")
+app = FastAPI(title="TaskFlow AI Backend", lifespan=lifespan)
 
 # Allow CORS from local dev and deployed origins
 app.add_middleware(
@@ -97,6 +101,9 @@ class AISuggestionRequest(BaseModel):
     now: str
     timezone: str
     user_input: str | None = "What should I do next?"
+    user_id: str | None = None
+    # Answer with a local plan if the model has not answered within this many milliseconds
+    deadline_ms: int | None = None
 
 class ScheduleReminder(BaseModel):
     reminder_iso: str
@@ -128,13 +135,57 @@ def doc_to_task(doc):
 def root():
     return {"message": "TaskFlow AI Backend running"}
 
+@app.post("/warmup")
+async def warmup():
+    """Load lazily loaded models and data now; returns load times per resource"""
+    timings = await run_embedding(preprocess.warmup)
+    return {"ready": preprocess.is_ready(), "load_ms": timings}
+
+@app.get("/ready")
+def ready(response: Response):
+    """Readiness probe: 503 until the embedding model, vectorizer and NLTK data are loaded"""
+    components = preprocess.readiness()
+    is_ready = preprocess.is_ready()
+    if not is_ready:
+        response.status_code = 503
+    return {"ready": is_ready, "components": components}
+
 @app.get("/tasks")
-def get_tasks():
-    docs = list(tasks_collection.find({}))
-    return [doc_to_task(d) for d in docs]
+async def get_tasks(
+    response: Response,
+    user_id: Optional[str] = None,
+    status: Optional[str] = None,
+    due_after: Optional[str] = None,
+    due_before: Optional[str] = None,
+    sort: str = Query("_id", pattern="^(_id|due_date)$"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """List tasks filtered by user, status and due window, with keyset pagination"""
+    try:
+        docs = find_tasks(async_tasks_collection, user_id, status, due_after, due_before, sort, cursor, limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if format == "ndjson":
+        # Constant-memory response for large accounts
+        return StreamingResponse(
+            stream_ndjson(docs, doc_to_task, sort, limit),
+            media_type="application/x-ndjson"
+        )
+    
+    tasks = []
+    last = None
+    async for d in docs:
+        tasks.append(doc_to_task(d))
+        last = d
+    if limit and len(tasks) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(last, sort)
+    return tasks
 
 @app.post("/add-task")
-def add_task(payload: AddTask):
+async def add_task(payload: AddTask):
     now = datetime.utcnow().isoformat()
     doc = {
         "user_id": payload.user_id,
@@ -152,21 +203,19 @@ def add_task(payload: AddTask):
         "snooze_count": 0,
         "last_ai_score": None
     }
-    result = tasks_collection.insert_one(doc)
+    result = await async_tasks_collection.insert_one(doc)
     doc["_id"] = result.inserted_id
+    await ai_cache.invalidate_user(payload.user_id)
     
-    # Compute embeddings
+    # Compute embeddings off the event loop
     try:
-        doc["bert_vector"] = get_bert_embedding(payload.task)
-        doc["tfidf_vector"] = get_tfidf_embedding(payload.task)
+        fields = await run_embedding(embed_task_fields, payload.task)
+        doc.update(fields)
         # Update the document with embeddings
-        tasks_collection.update_one(
-            {"_id": doc["_id"]}, 
-            {"$set": {"bert_vector": doc["bert_vector"], "tfidf_vector": doc["tfidf_vector"]}}
-        )
+        await async_tasks_collection.update_one({"_id": doc["_id"]}, {"$set": fields})
         
-        # Update user embedding for personalization
-        update_user_embedding(payload.user_id, doc["bert_vector"])
+        # Update user embedding for personalization and the user's vector index
+        await run_blocking(index_task_embedding, payload.user_id, str(doc["_id"]), doc["bert_vector"])
     except Exception as e:
         print(f"Error computing embeddings: {e}")
         # Continue without embeddings if there's an error
@@ -174,13 +223,15 @@ def add_task(payload: AddTask):
     
     # Schedule reminders if provided
     if payload.reminders:
-        for reminder_time in payload.reminders:
-            schedule_reminder(reminder_time, payload.user_id, str(doc["_id"]), payload.task, f"Reminder for: {payload.task}")
+        async with AsyncBulkWriter(async_reminders_collection) as writer:
+            for reminder_time in payload.reminders:
+                await run_blocking(schedule_reminder, reminder_time, payload.user_id, str(doc["_id"]), payload.task,
+                                    f"Reminder for: {payload.task}", writer=writer)
     
     return {"task": doc_to_task(doc)}
 
 @app.post("/edit-task")
-def edit_task(payload: EditTask):
+async def edit_task(payload: EditTask):
     try:
         obj_id = ObjectId(payload.id)
     except Exception:
@@ -194,265 +245,105 @@ def edit_task(payload: EditTask):
     update_data = {
         "task": payload.task.strip(),
         "due_date": payload.due_date,
-        "reminders": payload.reminders or [],
         "recurrence": payload.recurrence,
         "estimated_minutes": payload.estimated_minutes,
         "completed": payload.completed,
         "updated_at": datetime.utcnow().isoformat()
     }
     
+    # Reminders are only replaced when the field is sent
+    if payload.reminders is not None:
+        update_data["reminders"] = payload.reminders
+    
     # Add status if provided
     if payload.status:
         update_data["status"] = payload.status
     
+    # Remember the current text so unchanged tasks are not re-embedded
+    existing = await async_tasks_collection.find_one({"_id": obj_id}, {"task": 1})
+    
     # Update the task
-    result = tasks_collection.update_one(
+    result = await async_tasks_collection.update_one(
         {"_id": obj_id},
         {"$set": update_data}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Task not found")
+    await ai_cache.invalidate_user(payload.user_id)
     
-    # Recompute embeddings for updated task
-    try:
-        updated_bert_vector = get_bert_embedding(payload.task.strip())
-        updated_tfidf_vector = get_tfidf_embedding(payload.task.strip())
-        tasks_collection.update_one(
-            {"_id": obj_id},
-            {"$set": {"bert_vector": updated_bert_vector, "tfidf_vector": updated_tfidf_vector}}
-        )
-        
-        # Update user embedding for personalization
-        update_user_embedding(payload.user_id, updated_bert_vector)
-    except Exception as e:
-        print(f"Error updating embeddings: {e}")
-        # Continue without updating embeddings if there's an error
-        pass
+    # Recompute embeddings only when the task text changed
+    if not existing or existing.get("task") != update_data["task"]:
+        try:
+            fields = await run_embedding(embed_task_fields, update_data["task"])
+            await async_tasks_collection.update_one({"_id": obj_id}, {"$set": fields})
+            
+            # Update user embedding for personalization and the user's vector index
+            await run_blocking(index_task_embedding, payload.user_id, payload.id, fields["bert_vector"])
+        except Exception as e:
+            print(f"Error updating embeddings: {e}")
+            # Continue without updating embeddings if there's an error
+            pass
     
-    # Schedule reminders if provided
-    if payload.reminders:
-        for reminder_time in payload.reminders:
-            schedule_reminder(reminder_time, payload.user_id, payload.id, payload.task, f"Reminder for: {payload.task}")
+    # Completed tasks keep no reminders; otherwise the listed reminders replace the old ones
+    if payload.completed or payload.status == "completed":
+        await run_blocking(cancel_task_reminders, payload.id)
+    elif payload.reminders is not None:
+        async with AsyncBulkWriter(async_reminders_collection) as writer:
+            await run_blocking(reschedule_task_reminders, payload.reminders, payload.user_id, payload.id, payload.task,
+                                f"Reminder for: {payload.task}", writer=writer)
     
     # Fetch updated task
-    updated_doc = tasks_collection.find_one({"_id": obj_id})
+    updated_doc = await async_tasks_collection.find_one({"_id": obj_id})
     return {"task": doc_to_task(updated_doc)}
 
 @app.post("/delete-task")
-def delete_task(payload: DeleteTask):
+async def delete_task(payload: DeleteTask):
     try:
         obj_id = ObjectId(payload.id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid task ID format")
     
-    result = tasks_collection.delete_one({"_id": obj_id})
+    deleted = await async_tasks_collection.find_one_and_delete({"_id": obj_id}, projection={"user_id": 1})
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Task not found")
+    await run_blocking(vector_indexes.remove, payload.id, deleted.get("user_id"))
+    await run_blocking(cancel_task_reminders, payload.id)
+    await ai_cache.invalidate_user(deleted.get("user_id"))
     
     return {"message": "Task deleted"}
 
 @app.post("/ai-suggest")
-def ai_suggest(payload: AISuggestionRequest):
-    # Check if Google API key is configured
-    if not GOOGLE_API_KEY or GOOGLE_API_KEY == "your_actual_google_api_key_here":
-        raise HTTPException(
-            status_code=500, 
-            detail="Google API key not configured. Please set your API key in the .env file."
-        )
-    
-    tasks = payload.tasks or []
-    user_input = payload.user_input or "What should I do next?"
-    user_stats = payload.user_stats or {}
-    now = payload.now or datetime.utcnow().isoformat()
-    timezone = payload.timezone or "UTC"
-
-    prompt = f"""
-    You are an assistant that MUST output strict JSON only (no extra commentary).
-    Input contains:
-    {{
-      "tasks": {tasks},
-      "user_stats": {user_stats},
-      "now": "{now}",
-      "timezone": "{timezone}",
-      "user_input": "{user_input}"
-    }}
-    You must output valid JSON with these keys:
-    - categorized: array of objects {{"task": "...", "category": "Work|Personal|Health|Study|Finance|Home|Errand|Other", "priority":"High|Medium|Low", "score": 0-1}}
-    - schedule_plan: array of objects {{"task":"...", "start_iso":"2025-11-14T09:00:00Z", "end_iso":"...", "reason":"..."}}
-    - reminder_recs: array of objects {{"task":"...", "reminder_iso":"...", "method":"push|email|in-app"}}
-    - explanation: short string (1-2 sentences) summarizing the approach
-    
-    Constraints:
-    - Use user's timezone for scheduling and return ISO UTC times.
-    - Prioritize tasks with closer due_date, higher historical completion urgency, and shorter estimated duration if user prefers quick wins.
-    - Output only valid JSON with no extra text.
-    - Make sure your response starts with '{{' and ends with '}}'.
-    - Do not include any markdown formatting or code blocks.
-    - Keep your response short and concise.
-    - If you cannot generate a response, return an empty JSON object {{}}.
-    """
-
-    try:
-        # Use Google Generative AI instead of OpenAI
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.0,
-                max_output_tokens=800
-            )
-        )
-        
-        # Check if response has content
-        if not response:
-            raise Exception("Empty response from Google Generative AI")
-            
-        # For simplicity, just get the text directly
-        try:
-            text = response.text.strip()
-            print(f"AI Response: {text}")  # Debug line to see what the model returns
-            
-            # Handle completely empty responses
-            if not text or text.strip() == "":
-                print("Empty response from AI, providing default suggestions")
-                raise ValueError("Empty response from AI")
-        except Exception as e:
-            # If we can't get the text or it's empty, return default suggestions
-            print(f"Error getting AI response: {e}")
-            return {
-                "categorized": [
-                    {"task": "Review and organize your tasks", "category": "Work", "priority": "High", "score": 0.8},
-                    {"task": "Plan your day ahead", "category": "Personal", "priority": "Medium", "score": 0.7},
-                    {"task": "Complete pending assignments", "category": "Study", "priority": "High", "score": 0.9}
-                ],
-                "schedule_plan": [
-                    {"task": "Review and organize your tasks", "start_iso": "2025-11-28T09:00:00Z", "end_iso": "2025-11-28T09:30:00Z", "reason": "Start with organizing your tasks for better productivity"},
-                    {"task": "Plan your day ahead", "start_iso": "2025-11-28T10:00:00Z", "end_iso": "2025-11-28T10:15:00Z", "reason": "Planning helps you stay focused and productive"}
-                ],
-                "reminder_recs": [
-                    {"task": "Review and organize your tasks", "reminder_iso": "2025-11-28T08:30:00Z", "method": "in-app"}
-                ],
-                "explanation": "These are default suggestions to help you get started. Add more specific tasks for personalized AI recommendations."
-            }
-
-        # Try to parse the JSON even if the model added backticks or codeblock markers
-        try:
-            # strip code fences if present
-            if text.startswith("```"):
-                # remove fences
-                text = "\n".join(text.splitlines()[1:-1])
-            
-            # Handle completely empty responses
-            if not text or text.strip() == "":
-                raise ValueError("Empty response from AI")
-                
-            parsed = json.loads(text)
-            
-            # Check if the parsed response has meaningful content
-            if not parsed or (not parsed.get("categorized") and not parsed.get("schedule_plan") and not parsed.get("reminder_recs")):
-                raise ValueError("Empty or incomplete response from AI")
-                
-        except Exception:
-            # fallback: try to be forgiving by finding first '{' and last '}'
-            start = text.find("{")
-            end = text.rfind("}")
-            if start != -1 and end != -1:
-                parsed_text = text[start:end+1]
-                if parsed_text and parsed_text != "{}":
-                    parsed = json.loads(parsed_text)
-                else:
-                    # Provide default suggestions when AI fails
-                    return {
-                        "categorized": [
-                            {"task": "Review and organize your tasks", "category": "Work", "priority": "High", "score": 0.8},
-                            {"task": "Plan your day ahead", "category": "Personal", "priority": "Medium", "score": 0.7},
-                            {"task": "Complete pending assignments", "category": "Study", "priority": "High", "score": 0.9}
-                        ],
-                        "schedule_plan": [
-                            {"task": "Review and organize your tasks", "start_iso": "2025-11-28T09:00:00Z", "end_iso": "2025-11-28T09:30:00Z", "reason": "Start with organizing your tasks for better productivity"},
-                            {"task": "Plan your day ahead", "start_iso": "2025-11-28T10:00:00Z", "end_iso": "2025-11-28T10:15:00Z", "reason": "Planning helps you stay focused and productive"}
-                        ],
-                        "reminder_recs": [
-                            {"task": "Review and organize your tasks", "reminder_iso": "2025-11-28T08:30:00Z", "method": "in-app"}
-                        ],
-                        "explanation": "These are default suggestions to help you get started. Add more specific tasks for personalized AI recommendations."
-                    }
-            else:
-                # Provide default suggestions when AI fails
-                return {
-                    "categorized": [
-                        {"task": "Review and organize your tasks", "category": "Work", "priority": "High", "score": 0.8},
-                        {"task": "Plan your day ahead", "category": "Personal", "priority": "Medium", "score": 0.7},
-                        {"task": "Complete pending assignments", "category": "Study", "priority": "High", "score": 0.9}
-                    ],
-                    "schedule_plan": [
-                        {"task": "Review and organize your tasks", "start_iso": "2025-11-28T09:00:00Z", "end_iso": "2025-11-28T09:30:00Z", "reason": "Start with organizing your tasks for better productivity"},
-                        {"task": "Plan your day ahead", "start_iso": "2025-11-28T10:00:00Z", "end_iso": "2025-11-28T10:15:00Z", "reason": "Planning helps you stay focused and productive"}
-                    ],
-                    "reminder_recs": [
-                        {"task": "Review and organize your tasks", "reminder_iso": "2025-11-28T08:30:00Z", "method": "in-app"}
-                    ],
-                    "explanation": "These are default suggestions to help you get started. Add more specific tasks for personalized AI recommendations."
-                }
-
-        # Update tasks in DB with category/priority and scores
-        for item in parsed.get("categorized", []):
-            # find the task doc and update category/priority/score
-            tasks_collection.update_one(
-                {"task": item["task"]},
-                {"$set": {
-                    "category": item.get("category"), 
-                    "priority": item.get("priority"),
-                    "last_ai_score": item.get("score")
-                }}
-            )
-        
-        # Schedule recommended reminders
-        for reminder in parsed.get("reminder_recs", []):
-            schedule_reminder(
-                reminder["reminder_iso"], 
-                reminder.get("user_id", "default"), 
-                reminder.get("task_id", "default"), 
-                reminder.get("task", "Reminder"), 
-                f"Reminder for: {reminder.get('task', 'Task')}"
-            )
-
-        return parsed
-
-    except Exception as e:
-        # Check if it's a quota error
-        error_message = str(e)
-        if "insufficient_quota" in error_message or "429" in error_message:
-            raise HTTPException(
-                status_code=429, 
-                detail="Google API quota exceeded. Please check your plan and billing details"
-            )
-        else:
-            raise HTTPException(status_code=500, detail=f"AI or parsing error: {str(e)}")
+async def ai_suggest(payload: AISuggestionRequest, response: Response, cache_control: Optional[str] = Header(None)):
+    return await suggest(get_llm(GEMINI_MODEL), payload, response, cache_control)
 
 @app.get("/user/{user_id}")
-def get_user(user_id: str):
+async def get_user(user_id: str):
     """Get user profile"""
-    user_doc = users_collection.find_one({"_id": user_id})
+    user_doc = await async_users_collection.find_one({"_id": user_id})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Convert ObjectId to string for JSON serialization
     user_doc["id"] = str(user_doc["_id"])
     del user_doc["_id"]
+    user_doc["user_embedding"] = dense_to_list(user_doc.get("user_embedding"))
     return user_doc
 
 @app.post("/user")
-def create_user(user: User):
+async def create_user(user: User):
     """Create a new user profile"""
     user_dict = user.dict()
     user_dict["_id"] = user_dict.pop("id")
+    embedding = user_dict["user_embedding"]
+    if embedding is not None:
+        user_dict["user_embedding"] = encode_dense(embedding)
     
-    result = users_collection.insert_one(user_dict)
+    result = await async_users_collection.insert_one(user_dict)
     user_dict["id"] = str(result.inserted_id)
     del user_dict["_id"]
+    user_dict["user_embedding"] = embedding
     
     return user_dict
 
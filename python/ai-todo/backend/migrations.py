@@ -0,0 +1,121 @@
+"""Batched data migrations.
+
+Usage:
+    python migrations.py tfidf-sparse [--batch-size 500] [--limit N]
+    python migrations.py vectors-f32 [--batch-size 500] [--limit N]
+"""
+import argparse
+import os
+import time
+from pymongo import UpdateOne
+from database import tasks_collection, users_collection, MONGO_AVAILABLE
+from vector_codec import encode_sparse_dense, encode_dense
+
+# Background re-encoder: documents converted per run and run interval
+REENCODE_BATCH_LIMIT = int(os.getenv("REENCODE_BATCH_LIMIT", "2000"))
+REENCODE_INTERVAL_MINUTES = float(os.getenv("REENCODE_INTERVAL_MINUTES", "5"))
+
+def migrate_field(collection, field, legacy_query, convert, batch_size=500, limit=None):
+    """Rewrite one field on documents matching legacy_query in _id-ordered batches"""
+    query = {field: legacy_query}
+    last_id = None
+    migrated = 0
+    started = time.perf_counter()
+
+    while limit is None or migrated < limit:
+        page_query = dict(query)
+        if last_id is not None:
+            page_query["_id"] = {"$gt": last_id}
+        size = batch_size if limit is None else min(batch_size, limit - migrated)
+        docs = list(collection.find(page_query, {field: 1}).sort("_id", 1).limit(size))
+        if not docs:
+            break
+
+        ops = [
+            UpdateOne({"_id": doc["_id"], field: legacy_query}, {"$set": {field: convert(doc[field])}})
+            for doc in docs
+        ]
+        result = collection.bulk_write(ops, ordered=False)
+        migrated += result.modified_count
+        last_id = docs[-1]["_id"]
+        print(f"{field}: migrated {migrated} documents ({migrated / (time.perf_counter() - started):.0f} docs/s)")
+
+    return migrated
+
+def migrate_tfidf_sparse(batch_size=500, limit=None):
+    """Convert dense tfidf_vector lists into the sparse binary encoding"""
+    return migrate_field(
+        tasks_collection,
+        "tfidf_vector",
+        {"$type": "array"},
+        encode_sparse_dense,
+        batch_size=batch_size,
+        limit=limit
+    )
+
+def migrate_vectors_f32(batch_size=500, limit=None):
+    """Convert bert_vector and user_embedding lists into packed float32 binaries"""
+    migrated = migrate_field(
+        tasks_collection,
+        "bert_vector",
+        {"$type": "array"},
+        encode_dense,
+        batch_size=batch_size,
+        limit=limit
+    )
+    migrated += migrate_field(
+        users_collection,
+        "user_embedding",
+        {"$type": "array"},
+        encode_dense,
+        batch_size=batch_size,
+        limit=limit
+    )
+    return migrated
+
+MIGRATIONS = {
+    "tfidf-sparse": migrate_tfidf_sparse,
+    "vectors-f32": migrate_vectors_f32,
+}
+
+def reencode_legacy_vectors():
+    """Background job: re-encode a bounded number of legacy vector documents per run"""
+    try:
+        migrated = migrate_vectors_f32(limit=REENCODE_BATCH_LIMIT)
+        migrated += migrate_tfidf_sparse(limit=REENCODE_BATCH_LIMIT)
+    except Exception as e:
+        print(f"Error re-encoding legacy vectors: {e}")
+        return
+    if migrated == 0:
+        # Nothing left in the legacy formats
+        from scheduler import scheduler
+        scheduler.remove_job("vector_reencode")
+        print("Legacy vector re-encoding complete")
+
+def schedule_vector_reencoder(scheduler):
+    """Register the background job that migrates legacy vector formats"""
+    if not MONGO_AVAILABLE:
+        return
+    scheduler.add_job(
+        reencode_legacy_vectors,
+        'interval',
+        minutes=REENCODE_INTERVAL_MINUTES,
+        id="vector_reencode",
+        replace_existing=True
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Run batched data migrations")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many documents")
+    args = parser.parse_args()
+
+    if not MONGO_AVAILABLE:
+        print("MongoDB is not available; nothing to migrate")
+        return
+    total = MIGRATIONS[args.migration](batch_size=args.batch_size, limit=args.limit)
+    print(f"Done: {total} documents migrated")
+
+if __name__ == "__main__":
+    main()
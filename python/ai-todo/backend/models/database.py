@@ -1,6 +1,7 @@
 from typing import Optional, List, Dict
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
+from vector_codec import sparse_to_dense, dense_to_list
 
 class TaskModel(BaseModel):
     id: Optional[str] = None
@@ -22,6 +23,16 @@ class TaskModel(BaseModel):
     scheduled_end: Optional[str] = None
     bert_vector: Optional[List[float]] = None
     tfidf_vector: Optional[List[float]] = None
+    
+    @validator('bert_vector', pre=True)
+    def decode_bert_vector(cls, v):
+        # Stored as float32 binary (or a legacy list)
+        return dense_to_list(v)
+    
+    @validator('tfidf_vector', pre=True)
+    def decode_tfidf_vector(cls, v):
+        # Stored as sparse binary (or a legacy dense list); expose the dense form
+        return sparse_to_dense(v)
 
 class UserModel(BaseModel):
     id: str
@@ -31,6 +42,11 @@ class UserModel(BaseModel):
     behavior_stats: Dict[str, float]
     user_embedding: Optional[List[float]] = None
     created_at: str
+    
+    @validator('user_embedding', pre=True)
+    def decode_user_embedding(cls, v):
+        # Stored as float32 binary (or a legacy list)
+        return dense_to_list(v)
 
 class ReminderModel(BaseModel):
     id: Optional[str] = None
@@ -0,0 +1,159 @@
+"""ONNX Runtime sentence encoder, optionally int8-quantized, for CPU-only nodes.
+
+The SentenceTransformer model is exported once (transformer -> ONNX, tokenizer -> tokenizer.json)
+into ONNX_MODEL_DIR and quantized with dynamic int8 quantization. At runtime only onnxruntime
+and tokenizers are needed; torch and sentence-transformers are only used for the export.
+
+Usage (from backend/), e.g. while building the image:
+    python onnx_encoder.py export [--model all-MiniLM-L6-v2]
+"""
+import os
+import json
+import threading
+import numpy as np
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models"))
+ONNX_OPSET = int(os.getenv("ONNX_OPSET", "14"))
+
+_export_lock = threading.Lock()
+
+def model_dir(model_name):
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+def export_onnx(model_name, out_dir=None):
+    """Export the transformer, tokenizer and pooling settings of a SentenceTransformer model"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = out_dir or model_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0]
+    tokenizer = transformer.tokenizer
+    auto_model = transformer.auto_model.eval()
+    tokenizer.save_pretrained(out_dir)   # fast tokenizers write tokenizer.json
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = auto_model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    tmp_path = os.path.join(out_dir, f"model.onnx.{os.getpid()}.tmp")
+    dynamic = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(),
+            tuple(sample[name] for name in input_names),
+            tmp_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=ONNX_OPSET
+        )
+    os.replace(tmp_path, os.path.join(out_dir, "model.onnx"))
+
+    pooling = st[1] if len(st) > 1 else None
+    meta = {
+        "model": model_name,
+        "inputs": input_names,
+        "max_seq_length": st.max_seq_length,
+        "pooling": "cls" if getattr(pooling, "pooling_mode_cls_token", False) else "mean",
+        "normalize": any(type(module).__name__ == "Normalize" for module in st),
+        "dim": st.get_sentence_embedding_dimension(),
+        "pad_token": tokenizer.pad_token,
+        "pad_id": tokenizer.pad_token_id
+    }
+    with open(os.path.join(out_dir, "encoder.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"Exported {model_name} to {out_dir}")
+    return out_dir
+
+def quantize_int8(out_dir):
+    """Dynamic int8 quantization of the exported model (weights int8, activations quantized at runtime)"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    tmp_path = os.path.join(out_dir, f"model.int8.onnx.{os.getpid()}.tmp")
+    quantize_dynamic(os.path.join(out_dir, "model.onnx"), tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, os.path.join(out_dir, "model.int8.onnx"))
+    print(f"Quantized {out_dir}/model.onnx to int8")
+
+class OnnxEncoder:
+    """Drop-in for SentenceTransformer.encode() backed by an ONNX Runtime session"""
+
+    def __init__(self, directory, quantized=False, threads=0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(directory, "encoder.json")) as f:
+            self.meta = json.load(f)
+        self.quantized = quantized
+        self.path = os.path.join(directory, "model.int8.onnx" if quantized else "model.onnx")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.meta["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.meta["pad_id"], pad_token=self.meta["pad_token"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.meta["dim"]
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {
+            "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        hidden = self.session.run(None, {name: feed[name] for name in self.meta["inputs"]})[0]
+        if self.meta["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.meta["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size=32):
+        """Embeddings as a float32 array (one row per sentence; a single string gives one vector)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.meta["dim"]), dtype=np.float32)
+        batch_size = max(1, batch_size)
+        vectors = np.vstack([self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+        return vectors[0] if single else vectors
+
+def load_onnx_encoder(model_name, quantized=False, threads=0):
+    """Encoder for model_name, exporting (and quantizing) it on first use when needed"""
+    directory = model_dir(model_name)
+    with _export_lock:
+        if not os.path.exists(os.path.join(directory, "model.onnx")):
+            export_onnx(model_name, directory)
+        if quantized and not os.path.exists(os.path.join(directory, "model.int8.onnx")):
+            quantize_int8(directory)
+    return OnnxEncoder(directory, quantized=quantized, threads=threads)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export a SentenceTransformer model to ONNX")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--model", default=os.getenv("BERT_MODEL_NAME", "all-MiniLM-L6-v2"))
+    parser.add_argument("--no-int8", action="store_true", help="skip the int8 quantized copy")
+    args = parser.parse_args()
+    directory = export_onnx(args.model)
+    if not args.no_int8:
+        quantize_int8(directory)
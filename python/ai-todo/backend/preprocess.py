@@ -1,75 +1,352 @@
 import re
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from sklearn.feature_extraction.text import TfidfVectorizer
-import numpy as np
 import os
+import time
+import threading
+import functools
+import importlib.util
+import numpy as np
+from vector_codec import encode_sparse
+
+# nltk, scikit-learn and sentence-transformers are imported on first use (or by warmup())
+# so importing this module stays fast and never touches the network
+
+# How the BERT model runs on this node:
+# - "torch": SentenceTransformer in full precision
+# - "onnx": ONNX Runtime export of the same model
+# - "onnx-int8": ONNX Runtime with dynamic int8 quantization (smallest and fastest on CPU)
+BERT_RUNTIME = os.getenv("BERT_RUNTIME", "torch")
+BERT_RUNTIMES = ("torch", "onnx", "onnx-int8")
+# Intra-op threads for the encoder (0: library default, usually one per core)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+# Checked without importing them (importing pulls in torch)
+if BERT_RUNTIME == "torch":
+    BERT_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+    if not BERT_AVAILABLE:
+        print("Warning: sentence-transformers not available. BERT embeddings will be disabled.")
+else:
+    BERT_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("onnxruntime", "tokenizers"))
+    if not BERT_AVAILABLE:
+        print(f"Warning: onnxruntime or tokenizers not available (BERT_RUNTIME={BERT_RUNTIME}). BERT embeddings will be disabled.")
+
+# NLTK data shipped with the backend; searched before the default NLTK locations
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"))
+# Allow downloading NLTK data that is missing from every data path (off: never hit the network)
+NLTK_AUTO_DOWNLOAD = os.getenv("NLTK_AUTO_DOWNLOAD", "false").lower() in ("1", "true", "yes")
 
-# Try to import sentence_transformers, but make it optional
-try:
-    from sentence_transformers import SentenceTransformer
-    BERT_AVAILABLE = True
-except (ImportError, OSError) as e:
-    BERT_AVAILABLE = False
-    print(f"Warning: sentence-transformers not available due to: {e}. BERT embeddings will be disabled.")
+_load_lock = threading.RLock()
+_stopwords = None
+_word_tokenizer = None
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+def get_stopwords():
+    """English stopwords, read from the vendored NLTK corpus on first use"""
+    global _stopwords
+    if _stopwords is None:
+        with _load_lock:
+            if _stopwords is None:
+                vendored = os.path.join(NLTK_DATA_DIR, "corpora", "stopwords", "english")
+                if os.path.exists(vendored):
+                    with open(vendored, encoding="utf-8") as f:
+                        _stopwords = {line.strip() for line in f if line.strip()}
+                else:
+                    import nltk
+                    from nltk.corpus import stopwords
+                    if NLTK_DATA_DIR not in nltk.data.path:
+                        nltk.data.path.insert(0, NLTK_DATA_DIR)
+                    try:
+                        nltk.data.find('corpora/stopwords')
+                    except LookupError:
+                        if not NLTK_AUTO_DOWNLOAD:
+                            raise
+                        nltk.download('stopwords', download_dir=NLTK_DATA_DIR)
+                    _stopwords = set(stopwords.words("english"))
+    return _stopwords
 
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+def get_word_tokenizer():
+    """NLTK's Treebank word tokenizer, loaded on first use (only tokenize_nltk() uses it).
 
-# Initialize stopwords
-STOP = set(stopwords.words("english"))
+    normalize() strips punctuation, so word_tokenize()'s punkt sentence split never splits
+    anything; tokenizing with the word tokenizer directly gives the same tokens without
+    needing the punkt data.
+    """
+    global _word_tokenizer
+    if _word_tokenizer is None:
+        with _load_lock:
+            if _word_tokenizer is None:
+                from nltk.tokenize.destructive import NLTKWordTokenizer
+                _word_tokenizer = NLTKWordTokenizer()
+    return _word_tokenizer
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
 
 def normalize(text: str) -> str:
     """Normalize text by lowercasing and removing punctuation"""
     t = text.lower()
-    t = re.sub(r"[^\w\s]", " ", t)        # remove punctuation
-    t = re.sub(r"\s+", " ", t).strip()
+    t = _PUNCTUATION_RE.sub(" ", t)        # remove punctuation
+    t = _WHITESPACE_RE.sub(" ", t).strip()
     return t
 
+def normalize_batch(texts):
+    """normalize() for a list of texts; repeated texts are normalized once"""
+    unique = {text: normalize(text) for text in dict.fromkeys(texts)}
+    return [unique[text] for text in texts]
+
+# Fast tokenizer. normalize() leaves only word characters separated by single spaces, and on
+# such text NLTK's Treebank rules reduce to a whitespace split plus the contractions it splits
+# without an apostrophe: can|not, gim|me, gon|na, got|ta, lem|me, wan|na. The patterns are
+# case-insensitive, so a dotless i (which lower() keeps) still matches "gimme".
+_SPLIT_WORDS = frozenset(["cannot", "gimme", "gonna", "gotta", "lemme", "wanna"])
+
+# Raw texts whose cleaned tokens are kept (repeated task texts skip tokenizing)
+TOKENIZE_CACHE_SIZE = int(os.getenv("TOKENIZE_CACHE_SIZE", "50000"))
+
+def tokenize_normalized(text: str) -> list:
+    """Word tokens of normalized text, identical to NLTK's word tokenizer"""
+    tokens = []
+    for word in text.split(" "):
+        if not word:
+            continue
+        if len(word) == 5 or len(word) == 6:
+            key = word.replace("\u0131", "i") if "\u0131" in word else word
+            if key in _SPLIT_WORDS:
+                tokens.append(word[:3])
+                tokens.append(word[3:])
+                continue
+        tokens.append(word)
+    return tokens
+
+@functools.lru_cache(maxsize=TOKENIZE_CACHE_SIZE)
+def _clean_tokens(text: str) -> tuple:
+    stop = get_stopwords()
+    return tuple(t for t in tokenize_normalized(normalize(text)) if t not in stop and len(t) > 1)
+
 def tokenize_and_clean(text: str) -> list:
     """Tokenize and clean text by removing stopwords and short tokens"""
+    return list(_clean_tokens(text))
+
+def tokenize_batch(texts) -> list:
+    """tokenize_and_clean() for a list of texts; repeated texts are tokenized once"""
+    unique = {text: _clean_tokens(text) for text in dict.fromkeys(texts)}
+    return [list(unique[text]) for text in texts]
+
+def tokenize_nltk(text: str) -> list:
+    """Reference tokenizer through NLTK, which the fast path must match"""
     text = normalize(text)
-    tokens = word_tokenize(text)
-    tokens = [t for t in tokens if t not in STOP and len(t) > 1]
+    tokens = get_word_tokenizer().tokenize(text)
+    stop = get_stopwords()
+    tokens = [t for t in tokens if t not in stop and len(t) > 1]
     return tokens
 
-# TF-IDF: fit a vectorizer on project corpus (or use incremental)
-tfidf_vectorizer = TfidfVectorizer(tokenizer=tokenize_and_clean, max_features=2000)
+# TF-IDF modes:
+# - "fitted": vocabulary and IDF fitted on the task corpus and loaded from vectorizer_store
+# - "hashing": stateless hashed term frequencies, so new vocabulary never forces re-vectorizing
+TFIDF_MODE = os.getenv("TFIDF_MODE", "fitted")
+TFIDF_MAX_FEATURES = int(os.getenv("TFIDF_MAX_FEATURES", "2000"))
+
+def build_tfidf_vectorizer(vocabulary=None, idf=None):
+    """Create a TF-IDF vectorizer, optionally restored from a fitted vocabulary and IDF"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizer = TfidfVectorizer(
+        tokenizer=tokenize_and_clean,
+        token_pattern=None,
+        max_features=TFIDF_MAX_FEATURES,
+        vocabulary=vocabulary
+    )
+    if vocabulary is not None and idf is not None:
+        vectorizer.idf_ = np.asarray(idf, dtype=np.float64)
+    return vectorizer
+
+def build_hashing_vectorizer():
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(
+        tokenizer=tokenize_and_clean,
+        token_pattern=None,
+        n_features=TFIDF_MAX_FEATURES,
+        alternate_sign=False,
+        norm="l2"
+    )
+
+# Active vectorizer and its version tag (None until a fitted vectorizer is loaded). The
+# version is known up front; the vectorizer itself is built from _tfidf_factory on first use.
+tfidf_vectorizer = None
+_tfidf_factory = None
+TFIDF_VERSION = None
+if TFIDF_MODE == "hashing":
+    _tfidf_factory = build_hashing_vectorizer
+    TFIDF_VERSION = f"hashing-{TFIDF_MAX_FEATURES}"
+
+def set_tfidf_vectorizer(vectorizer, version):
+    """Swap in a fitted vectorizer together with its version tag"""
+    global tfidf_vectorizer, _tfidf_factory, TFIDF_VERSION
+    with _load_lock:
+        tfidf_vectorizer = vectorizer
+        _tfidf_factory = None
+        TFIDF_VERSION = version
+
+def set_tfidf_factory(factory, version):
+    """Make version active now, but only build its vectorizer (factory()) when first needed"""
+    global tfidf_vectorizer, _tfidf_factory, TFIDF_VERSION
+    with _load_lock:
+        tfidf_vectorizer = None
+        _tfidf_factory = factory
+        TFIDF_VERSION = version
+
+def get_tfidf_vectorizer():
+    """Active vectorizer, built on first use; None while no fitted vectorizer exists"""
+    global tfidf_vectorizer, _tfidf_factory
+    if tfidf_vectorizer is None and _tfidf_factory is not None:
+        with _load_lock:
+            if tfidf_vectorizer is None and _tfidf_factory is not None:
+                tfidf_vectorizer = _tfidf_factory()
+                _tfidf_factory = None
+    return tfidf_vectorizer
+
+def get_tfidf_state():
+    """Active (version, vectorizer) pair, read together so a concurrent swap cannot mix them"""
+    with _load_lock:
+        return TFIDF_VERSION, get_tfidf_vectorizer()
 
-# BERT embeddings (sentence-transformers)
+BERT_MODEL_NAME = os.getenv("BERT_MODEL_NAME", "all-MiniLM-L6-v2")   # fast, good for demos
+# Model version tag (part of every cached embedding key). The fp32 ONNX export gives the same
+# vectors as torch; int8 vectors drift slightly, so they are cached under their own version.
+BERT_VERSION = BERT_MODEL_NAME + ("+int8" if BERT_RUNTIME == "onnx-int8" else "")
+
+def build_bert_model(runtime=BERT_RUNTIME, threads=EMBEDDING_THREADS, model_name=BERT_MODEL_NAME):
+    """Load model_name with the given runtime; the result has SentenceTransformer's encode()"""
+    if runtime not in BERT_RUNTIMES:
+        raise ValueError(f"Unknown BERT_RUNTIME {runtime!r}; expected one of {list(BERT_RUNTIMES)}")
+    if runtime == "torch":
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+    from onnx_encoder import load_onnx_encoder
+    return load_onnx_encoder(model_name, quantized=runtime == "onnx-int8", threads=threads)
+
+# BERT embeddings, loaded on first use
 bert_model = None
-if BERT_AVAILABLE:
-    try:
-        bert_model = SentenceTransformer("all-MiniLM-L6-v2")   # fast, good for demos
-    except Exception as e:
-        BERT_AVAILABLE = False
-        print(f"Warning: Failed to initialize BERT model: {e}")
+
+def get_bert_model():
+    """The BERT encoder for BERT_RUNTIME, or None when it is unavailable"""
+    global bert_model, BERT_AVAILABLE
+    if bert_model is None and BERT_AVAILABLE:
+        with _load_lock:
+            if bert_model is None and BERT_AVAILABLE:
+                try:
+                    bert_model = build_bert_model()
+                except Exception as e:
+                    BERT_AVAILABLE = False
+                    print(f"Warning: Failed to initialize BERT model: {e}")
+    return bert_model
+
+# Where BERT embeddings are computed:
+# - "local": every API worker loads its own copy of the model
+# - "server": one shared embedding server process owns the model (see embedding_server.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "local")
+
+_embedding_client = None
+
+def get_embedding_client():
+    """Client for the shared embedding server, created on first use"""
+    global _embedding_client
+    if _embedding_client is None:
+        with _load_lock:
+            if _embedding_client is None:
+                from embedding_server import EmbeddingClient
+                _embedding_client = EmbeddingClient()
+    return _embedding_client
+
+class EmbeddingModelUnavailable(RuntimeError):
+    """The BERT model could not be loaded; raised instead of returning placeholder vectors"""
+
+def encode_bert_local(normalized):
+    """Encode already-normalized texts with the in-process model in one encode call"""
+    model = get_bert_model()
+    if model is None:
+        # Placeholder vectors would be cached, shared with other replicas and stored on tasks
+        raise EmbeddingModelUnavailable(f"BERT model {BERT_MODEL_NAME} is not available")
+    vecs = model.encode(normalized, batch_size=len(normalized))
+    return vecs.tolist()
 
 def get_bert_embedding(text):
     """Get BERT embedding for text using SentenceTransformer"""
-    if not BERT_AVAILABLE or bert_model is None:
-        # Return a zero vector of the same size as expected
-        return [0.0] * 384  # all-MiniLM-L6-v2 produces 384-dimensional vectors
+    return get_bert_embeddings([text])[0]
+
+def get_bert_embeddings(texts):
+    """Get BERT embeddings for a batch of texts with a single encode call"""
+    if not texts:
+        return []
+    normalized = normalize_batch(texts)
+    if EMBEDDING_BACKEND == "server":
+        return get_embedding_client().encode(normalized)
+    return encode_bert_local(normalized)
+
+def get_tfidf_embedding(text, vectorizer=None):
+    """Get sparse-encoded TF-IDF embedding for text, or None until a fitted vectorizer is loaded"""
+    if vectorizer is None:
+        vectorizer = get_tfidf_vectorizer()
+    if vectorizer is None:
+        return None
     
-    text = normalize(text)
-    vec = bert_model.encode(text).tolist()
-    return vec
-
-def get_tfidf_embedding(text, fit_vectorizer=False):
-    """Get TF-IDF embedding for text"""
-    if fit_vectorizer:
-        # Fit the vectorizer on the text itself (for demo purposes)
-        tfidf_vectorizer.fit([text])
+    # Transform the text and keep only its non-zero terms
+    row = vectorizer.transform([text])
+    return encode_sparse(row.indices, row.data, row.shape[1])
+
+def get_tfidf_embeddings(texts, vectorizer=None):
+    """Sparse-encoded TF-IDF embeddings for a batch of texts with a single transform call"""
+    if vectorizer is None:
+        vectorizer = get_tfidf_vectorizer()
+    if vectorizer is None or not texts:
+        return [None for _ in texts]
     
-    # Transform the text to TF-IDF vector
-    vector = tfidf_vectorizer.transform([text]).toarray()[0].tolist()
-    return vector
\ No newline at end of file
+    matrix = vectorizer.transform(texts).tocsr()
+    return [encode_sparse(row.indices, row.data, row.shape[1]) for row in matrix]
+
+def warmup():
+    """Load every lazily loaded resource now and run one encode; returns load times in ms"""
+    timings = {}
+    # In server mode the model lives in the embedding server; waiting for its health check
+    # also starts it when EMBEDDING_SERVER_AUTOSTART is on
+    load_bert = get_bert_model if EMBEDDING_BACKEND != "server" else lambda: get_embedding_client().health()
+    for name, load in (("stopwords", get_stopwords), ("tfidf", get_tfidf_vectorizer), ("bert", load_bert)):
+        started = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            print(f"Error warming up {name}: {e}")
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    started = time.perf_counter()
+    try:
+        get_bert_embeddings(["warmup"])
+    except Exception as e:
+        print(f"Error warming up the first encode: {e}")
+    get_tfidf_embeddings(["warmup"])
+    timings["first_encode"] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
+
+def readiness():
+    """Load state per resource: ready, pending (not loaded yet) or unavailable"""
+    def state(loaded, available=True):
+        return "ready" if loaded else ("pending" if available else "unavailable")
+    return {
+        "stopwords": state(_stopwords is not None),
+        # Nothing to load while no fitted vectorizer exists yet
+        "tfidf": state(tfidf_vectorizer is not None or _tfidf_factory is None),
+        "bert": bert_server_state() if EMBEDDING_BACKEND == "server" else state(bert_model is not None, BERT_AVAILABLE)
+    }
+
+def bert_server_state():
+    """Model state reported by the embedding server; pending while it cannot be reached"""
+    try:
+        from embedding_server import EmbeddingClient
+        probe = EmbeddingClient(timeout=1, autostart=False)
+        health = probe.health()
+        probe.close()
+    except Exception:
+        return "pending"
+    return health.get("model_state", "pending")
+
+def is_ready():
+    return all(value != "pending" for value in readiness().values())
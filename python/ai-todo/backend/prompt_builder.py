@@ -0,0 +1,99 @@
+import os
+import json
+from heuristic_planner import rank_open_tasks, parse_now
+
+# Approximate prompt size limit; tasks are added in rank order until it is reached
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+# Never send more than this many tasks, however short they are
+PROMPT_MAX_TASKS = int(os.getenv("PROMPT_MAX_TASKS", "40"))
+# Task text is cut to this many characters
+PROMPT_TASK_CHARS = int(os.getenv("PROMPT_TASK_CHARS", "80"))
+
+SUGGESTION_ARRAYS = ("categorized", "schedule_plan", "reminder_recs")
+
+PROMPT_TEMPLATE = """You are an assistant that MUST output strict JSON only (no extra commentary).
+Task fields: id = task id, t = task text, due = due date (UTC), min = estimated minutes, rec = recurrence, cat = current category.
+Input:
+{input}
+You must output JSON with these keys:
+- categorized: array of objects {{"id": "...", "category": "Work|Personal|Health|Study|Finance|Home|Errand|Other", "priority":"High|Medium|Low", "score": 0-1}}
+- schedule_plan: array of objects {{"id": "...", "start_iso":"2025-11-14T09:00:00Z", "end_iso":"...", "reason":"..."}}
+- reminder_recs: array of objects {{"id": "...", "reminder_iso":"...", "method":"push|email|in-app"}}
+- explanation: short string (1-2 sentences) summarizing the approach
+
+Constraints:
+- Use user's timezone for scheduling and return ISO UTC times.
+- Prioritize tasks with closer due_date, higher historical completion urgency, and shorter estimated duration if user prefers quick wins.
+- Refer to tasks only by their "id"; do not repeat the task text.
+- Output only JSON, starting with '{{' and ending with '}}', without markdown or code blocks.
+"""
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English and JSON)"""
+    return (len(text) + 3) // 4
+
+def compact_task(task, short_id):
+    """Prompt representation of a task: short id and field aliases, no vectors or AI output"""
+    entry = {"id": short_id, "t": (task.get("task") or "")[:PROMPT_TASK_CHARS]}
+    if task.get("due_date"):
+        entry["due"] = str(task["due_date"])[:16]
+    if task.get("estimated_minutes"):
+        entry["min"] = task["estimated_minutes"]
+    if task.get("recurrence"):
+        entry["rec"] = task["recurrence"]
+    if task.get("category"):
+        entry["cat"] = task["category"]
+    return entry
+
+def render(entries, user_stats, now, timezone, user_input):
+    return PROMPT_TEMPLATE.format(input=json.dumps({
+        "tasks": entries,
+        "user_stats": user_stats,
+        "now": now,
+        "timezone": timezone,
+        "user_input": user_input
+    }, separators=(",", ":"), default=str))
+
+def build_suggest_prompt(tasks, user_stats, now, timezone, user_input, token_budget=PROMPT_TOKEN_BUDGET, max_tasks=PROMPT_MAX_TASKS):
+    """Prompt for the top-ranked open tasks that fit the token budget.
+
+    Returns (prompt, id_map, stats): id_map maps the short ids used in the prompt back to
+    the original tasks (see expand_answer), stats reports what was sent.
+    """
+    ranked = rank_open_tasks(tasks, user_stats, parse_now(now))
+    used = estimate_tokens(render([], user_stats, now, timezone, user_input))
+    entries = []
+    id_map = {}
+    for _, _, task in ranked:
+        if len(entries) >= max_tasks:
+            break
+        entry = compact_task(task, f"t{len(entries) + 1}")
+        cost = estimate_tokens(json.dumps(entry, separators=(",", ":"), default=str)) + 1
+        if entries and used + cost > token_budget:
+            break
+        entries.append(entry)
+        id_map[entry["id"]] = task
+        used += cost
+
+    prompt = render(entries, user_stats, now, timezone, user_input)
+    stats = {
+        "tasks_total": len(tasks or []),
+        "tasks_sent": len(entries),
+        "prompt_tokens_est": estimate_tokens(prompt),
+        "token_budget": token_budget
+    }
+    return prompt, id_map, stats
+
+def expand_item(item, id_map):
+    """Replace the short id in one answer element with the task's real id and text"""
+    task = id_map.get(str(item.get("id")))
+    if task is None:
+        return item
+    task_id = task.get("id") or (str(task["_id"]) if task.get("_id") else None)
+    return {**item, "id": task_id, "task": task.get("task")}
+
+def expand_answer(parsed, id_map):
+    """Map every element of a model answer back to the original tasks"""
+    for key in SUGGESTION_ARRAYS:
+        parsed[key] = [expand_item(item, id_map) for item in parsed.get(key) or [] if isinstance(item, dict)]
+    return parsed
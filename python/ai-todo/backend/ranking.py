@@ -0,0 +1,139 @@
+from datetime import datetime
+import numpy as np
+from scheduler import parse_due_date
+from vector_codec import read_dense, is_dense_encoded, DENSE_HEADER
+
+# Weights shared with scheduler.compute_task_score
+DUE_WEIGHT = 0.45
+SIMILARITY_WEIGHT = 0.25
+DURATION_WEIGHT = 0.2
+HISTORY_WEIGHT = 0.1
+
+# Score compute_task_score falls back to when a task cannot be scored
+FALLBACK_SCORE = 0.5
+
+def _hours_until(values, now, invalid):
+    """Hours from now until each ISO due date (NaN where there is none)"""
+    hours = np.full(len(values), np.nan)
+    rows = [i for i, value in enumerate(values) if value]
+    if not rows:
+        return hours
+    strings = [values[i] for i in rows]
+    try:
+        # Fast path: UTC ("Z") and naive timestamps parse in a single NumPy call
+        if any(not isinstance(s, str) or "+" in s[10:] or "-" in s[10:] for s in strings):
+            raise ValueError("timestamps with offsets")
+        stamps = np.array([s[:-1] if s.endswith("Z") else s for s in strings], dtype="datetime64[us]")
+        hours[rows] = (stamps - np.datetime64(now, "us")) / np.timedelta64(1, "h")
+    except ValueError:
+        for i, value in zip(rows, strings):
+            try:
+                hours[i] = (parse_due_date(value) - now).total_seconds() / 3600
+            except (TypeError, ValueError, AttributeError):
+                invalid[i] = True
+    return hours
+
+def _stack_vectors(values):
+    """Stack stored embeddings into a matrix; rows without a usable vector stay zero"""
+    n = len(values)
+    encoded, other, dims = [], [], []
+    for i, v in enumerate(values):
+        if v is None or len(v) == 0:
+            continue
+        if is_dense_encoded(v):
+            encoded.append(i)
+            dims.append((len(v) - DENSE_HEADER.size) // 4)
+        else:
+            other.append(i)
+            dims.append(len(v))
+    if not dims:
+        return None, np.zeros(n, dtype=bool)
+
+    # Use the most common dimension; mismatched vectors score like missing ones
+    counts = np.bincount(dims)
+    dim = int(np.argmax(counts))
+
+    matrix = np.zeros((n, dim), dtype=np.float32)
+    has_vector = np.zeros(n, dtype=bool)
+    if counts[dim] != len(dims):
+        encoded = [i for i in encoded if (len(values[i]) - DENSE_HEADER.size) // 4 == dim]
+    if encoded:
+        # One decode for all float32 binaries
+        header = DENSE_HEADER.size
+        payload = b"".join(memoryview(values[i])[header:] for i in encoded)
+        matrix[encoded] = np.frombuffer(payload, dtype="<f4").reshape(len(encoded), dim)
+        has_vector[encoded] = True
+    for i in other:
+        if len(values[i]) == dim:
+            matrix[i] = read_dense(values[i])
+            has_vector[i] = True
+    return matrix, has_vector
+
+class TaskColumns:
+    """Columnar view of a list of task documents for vectorized scoring"""
+
+    def __init__(self, tasks, now=None):
+        now = now or datetime.utcnow()
+        n = len(tasks)
+        self.n = n
+        self.invalid = np.zeros(n, dtype=bool)
+        self.delta_hours = _hours_until([task.get("due_date") for task in tasks], now, self.invalid)
+
+        self.estimated = np.full(n, np.nan)
+        for i, task in enumerate(tasks):
+            est = task.get("estimated_minutes")
+            if est:
+                if isinstance(est, (int, float)):
+                    self.estimated[i] = est
+                else:
+                    self.invalid[i] = True
+
+        # Tasks without embeddings keep zero rows and get similarity 0
+        self.vectors, self.has_vector = _stack_vectors([task.get("bert_vector") for task in tasks])
+
+def score_columns(cols, user_profile):
+    """Vectorized equivalent of compute_task_score over a TaskColumns batch"""
+    n = cols.n
+    try:
+        hist_adj = float(user_profile.get("priority_adjustment", 0) or 0)
+    except (TypeError, ValueError):
+        return np.full(n, FALLBACK_SCORE)
+
+    # due urgency decays linearly over 72 hours (0 when there is no due date)
+    due_score = np.where(np.isnan(cols.delta_hours), 0.0, np.maximum(0.0, 1 - cols.delta_hours / 72))
+
+    # similarity to user embedding
+    similarity = np.zeros(n)
+    user_embedding = user_profile.get("user_embedding")
+    if cols.vectors is not None and user_embedding is not None and len(user_embedding) > 0:
+        u = read_dense(user_embedding)
+        if u.shape[0] == cols.vectors.shape[1]:
+            dots = cols.vectors @ u
+            norms = np.linalg.norm(cols.vectors, axis=1) * np.linalg.norm(u) + 1e-9
+            similarity = np.where(cols.has_vector, dots / norms, 0.0)
+
+    # estimated time factor (prefer shorter tasks)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        est = np.where(np.isnan(cols.estimated), 0.5, np.minimum(1, 30 / cols.estimated))
+
+    score = DUE_WEIGHT * due_score + SIMILARITY_WEIGHT * similarity + DURATION_WEIGHT * est + HISTORY_WEIGHT * hist_adj
+    score[cols.invalid] = FALLBACK_SCORE
+    return score
+
+def score_tasks(tasks, user_profile, now=None):
+    """Scores for all tasks in one vectorized pass"""
+    return score_columns(TaskColumns(tasks, now=now), user_profile)
+
+def top_k(scores, k):
+    """Indices of the k best scores, best first, using argpartition"""
+    if k is None or k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+def rank_tasks(tasks, user_profile, k=None, now=None):
+    """Rank tasks by personalized score; returns (task, score) pairs, best first"""
+    if not tasks:
+        return []
+    scores = score_tasks(tasks, user_profile, now=now)
+    return [(tasks[i], float(scores[i])) for i in top_k(scores, k)]
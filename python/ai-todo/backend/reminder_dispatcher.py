@@ -0,0 +1,347 @@
+"""Reminder dispatcher: one document per reminder in reminders_collection instead of one
+APScheduler job per reminder.
+
+Each dispatcher claims the reminders coming due within REMINDER_LOOKAHEAD_SECONDS in
+batches (indexed on state, fire_at), keeps them in a min-heap keyed by fire time and
+hands due ones to a worker pool. Claims carry a token and a lease, so every API process
+can run a dispatcher on the same collection: a reminder is claimed by one of them, and
+is claimed again by another if its owner dies before firing it.
+
+Reminder states: pending -> claimed -> sent, or cancelled / missed (later than the
+misfire grace) / failed (after REMINDER_MAX_ATTEMPTS errors).
+"""
+import os
+import heapq
+import itertools
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+from pymongo import ASCENDING, UpdateOne
+
+# Reminders claimed per round trip
+REMINDER_CLAIM_BATCH = int(os.getenv("REMINDER_CLAIM_BATCH", "500"))
+# Reminders due within this window are claimed ahead of time and held in memory
+REMINDER_LOOKAHEAD_SECONDS = float(os.getenv("REMINDER_LOOKAHEAD_SECONDS", "30"))
+# How often the store is checked for newly due reminders
+REMINDER_POLL_SECONDS = float(os.getenv("REMINDER_POLL_SECONDS", "1"))
+# A claim expires this long after the end of the lookahead window (owner died)
+REMINDER_LEASE_SECONDS = float(os.getenv("REMINDER_LEASE_SECONDS", "120"))
+REMINDER_WORKERS = int(os.getenv("REMINDER_WORKERS", "16"))
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "3"))
+# Same rule as the APScheduler jobs: fire late reminders up to this late, drop older ones
+REMINDER_MISFIRE_GRACE_SECONDS = int(os.getenv("REMINDER_MISFIRE_GRACE_SECONDS", "3600"))
+
+PENDING = "pending"
+CLAIMED = "claimed"
+SENT = "sent"
+CANCELLED = "cancelled"
+MISSED = "missed"
+FAILED = "failed"
+ACTIVE = [PENDING, CLAIMED]
+
+# lease_until of unclaimed reminders, so one (state, fire_at) range query finds both new and expired claims
+NO_LEASE = datetime(1970, 1, 1)
+
+# Number of recent samples kept for percentile metrics
+METRICS_WINDOW = 2048
+
+class ReminderHeap:
+    """Min-heap of reminders keyed by fire time; cancelling is O(1) (entries are dropped when popped)"""
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._seq = itertools.count()
+
+    def push(self, fire_ts, reminder_id, item):
+        self.cancel(reminder_id)
+        entry = [fire_ts, next(self._seq), reminder_id, item]
+        self._entries[reminder_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, reminder_id):
+        entry = self._entries.pop(reminder_id, None)
+        if entry is None:
+            return False
+        entry[2] = None
+        return True
+
+    def pop_due(self, now_ts, limit):
+        """Up to limit (reminder_id, item) pairs whose fire time has come, earliest first"""
+        due = []
+        while self._heap and self._heap[0][0] <= now_ts and len(due) < limit:
+            _, _, reminder_id, item = heapq.heappop(self._heap)
+            if reminder_id is not None:
+                del self._entries[reminder_id]
+                due.append((reminder_id, item))
+        return due
+
+    def next_time(self):
+        while self._heap and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def ids(self):
+        return list(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+def utc_naive(moment):
+    """Naive UTC datetime (how reminders are stored) for a naive-UTC or aware datetime"""
+    if moment.tzinfo is not None:
+        moment = (moment - moment.utcoffset()).replace(tzinfo=None)
+    return moment
+
+def timestamp(moment):
+    return (moment - NO_LEASE).total_seconds()
+
+class ReminderDispatcher:
+    """Claims due reminders from a collection in batches and fires them on a worker pool"""
+
+    def __init__(self, collection, fire, batch_size=REMINDER_CLAIM_BATCH, lookahead_seconds=REMINDER_LOOKAHEAD_SECONDS,
+                 poll_seconds=REMINDER_POLL_SECONDS, lease_seconds=REMINDER_LEASE_SECONDS, workers=REMINDER_WORKERS,
+                 max_attempts=REMINDER_MAX_ATTEMPTS, misfire_grace_seconds=REMINDER_MISFIRE_GRACE_SECONDS):
+        self.collection = collection
+        self.fire = fire
+        self.batch_size = max(1, batch_size)
+        self.lookahead = timedelta(seconds=lookahead_seconds)
+        self.poll_seconds = poll_seconds
+        self.lease = timedelta(seconds=lease_seconds)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.misfire_grace = misfire_grace_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.heap = ReminderHeap()
+        self._cond = threading.Condition()
+        self._claim_now = False
+        self._acks = deque()
+        self._thread = None
+        self._pool = None
+        self._stopped = False
+
+        # Metrics
+        self.scheduled = 0
+        self.cancelled = 0
+        self.claimed = 0
+        self.claim_round_trips = 0
+        self.fired = 0
+        self.failed = 0
+        self.missed = 0
+        self._skew_ms = deque(maxlen=METRICS_WINDOW)
+
+    # Writes (any process, whether or not its dispatcher runs)
+
+    def schedule(self, reminder_id, fire_at, fields, writer=None):
+        """Create or reschedule a reminder; pass a BulkWriter on the collection to batch the upsert"""
+        fire_at = utc_naive(fire_at)
+        update = {
+            "$set": {**fields, "fire_at": fire_at, "state": PENDING, "lease_until": NO_LEASE, "attempts": 0},
+            "$unset": {"claim": ""}
+        }
+        if writer is not None:
+            writer.update_one({"_id": reminder_id}, update, upsert=True, key=fields.get("task_id"))
+        else:
+            self.collection.update_one({"_id": reminder_id}, update, upsert=True)
+        # A reschedule drops the copy this process may already hold
+        self.heap.cancel(reminder_id)
+        self.scheduled += 1
+        if fire_at <= datetime.utcnow() + self.lookahead:
+            self.wake()
+
+    def cancel(self, reminder_id):
+        """Cancel a pending or claimed reminder; False if it was not active"""
+        result = self.collection.update_one(
+            {"_id": reminder_id, "state": {"$in": ACTIVE}},
+            {"$set": {"state": CANCELLED}, "$unset": {"claim": ""}}
+        )
+        self.heap.cancel(reminder_id)
+        if result.matched_count:
+            self.cancelled += 1
+        return result.matched_count > 0
+
+    def cancel_task(self, task_id, keep=()):
+        """Cancel the active reminders of a task except the ids in keep (index: task_id); returns how many"""
+        query = {"task_id": task_id, "state": {"$in": ACTIVE}}
+        if keep:
+            query["_id"] = {"$nin": list(keep)}
+        # Claimed copies held in memory are skipped when they come due (no longer claimed)
+        result = self.collection.update_many(query, {"$set": {"state": CANCELLED}, "$unset": {"claim": ""}})
+        self.cancelled += result.modified_count
+        return result.modified_count
+
+    def pending_for_user(self, user_id):
+        """Active reminders of a user, earliest first (index: user_id, state, fire_at)"""
+        return list(self.collection.find(
+            {"user_id": user_id, "state": {"$in": ACTIVE}},
+            {"user_id": 1, "task_id": 1, "title": 1, "body": 1, "fire_at": 1, "state": 1}
+        ).sort("fire_at", ASCENDING))
+
+    # Dispatching
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="reminder-worker")
+                self._thread = threading.Thread(target=self._run, name="reminder-dispatcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop claiming, wait for running reminders and hand unfired claims back"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self._flush_acks()
+        held = self.heap.ids()
+        if held:
+            self.collection.update_many(
+                {"_id": {"$in": held}, "state": CLAIMED},
+                {"$set": {"state": PENDING, "lease_until": NO_LEASE}, "$unset": {"claim": ""}}
+            )
+            for reminder_id in held:
+                self.heap.cancel(reminder_id)
+
+    def wake(self):
+        """Claim right away (a reminder was scheduled inside the lookahead window)"""
+        with self._cond:
+            self._claim_now = True
+            self._cond.notify()
+
+    def claim(self, now=None):
+        """Claim one batch of reminders due within the lookahead window; returns how many this process won"""
+        now = now or datetime.utcnow()
+        horizon = now + self.lookahead
+        query = {"state": {"$in": ACTIVE}, "fire_at": {"$lte": horizon}, "lease_until": {"$lt": now}}
+        ids = [doc["_id"] for doc in self.collection.find(query, {"_id": 1}).sort("fire_at", ASCENDING).limit(self.batch_size)]
+        if not ids:
+            return 0
+        token = uuid.uuid4().hex
+        self.collection.update_many(
+            {**query, "_id": {"$in": ids}},
+            {"$set": {"state": CLAIMED, "claim": token, "claimed_by": self.owner, "lease_until": horizon + self.lease}}
+        )
+        claimed = list(self.collection.find({"_id": {"$in": ids}, "claim": token}))
+        self.claim_round_trips += 1
+        for doc in claimed:
+            self.heap.push(timestamp(doc["fire_at"]), doc["_id"], doc)
+        self.claimed += len(claimed)
+        return len(claimed)
+
+    def _run(self):
+        next_claim = 0.0
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                claim_now, self._claim_now = self._claim_now, False
+            try:
+                # Hold at most one batch beyond what is firing, so a backlog (after downtime)
+                # is spread over every running process instead of leased to the first one
+                if (claim_now or time.monotonic() >= next_claim) and len(self.heap) < self.batch_size:
+                    claimed = self.claim()
+                    # A full batch means more may be due: claim the next one once this one fired
+                    next_claim = time.monotonic() + (0 if claimed == self.batch_size else self.poll_seconds)
+                now = datetime.utcnow()
+                due = self.heap.pop_due(timestamp(now), self.batch_size)
+                while due:
+                    self._dispatch(due, now)
+                    due = self.heap.pop_due(timestamp(now), self.batch_size)
+                self._flush_acks()
+            except Exception as e:
+                print(f"Error dispatching reminders: {e}")
+                next_claim = time.monotonic() + self.poll_seconds
+
+            with self._cond:
+                if self._stopped or self._claim_now:
+                    continue
+                wait = max(0.0, next_claim - time.monotonic()) if len(self.heap) < self.batch_size else self.poll_seconds
+                next_time = self.heap.next_time()
+                if next_time is not None:
+                    wait = min(wait, max(0.0, next_time - timestamp(datetime.utcnow())))
+                self._cond.wait(wait)
+
+    def _dispatch(self, due, now):
+        """Fire due reminders that are still ours (not cancelled or rescheduled since the claim)"""
+        tokens = list({item["claim"] for _, item in due})
+        live = {doc["_id"] for doc in self.collection.find(
+            {"_id": {"$in": [reminder_id for reminder_id, _ in due]}, "state": CLAIMED, "claim": {"$in": tokens}},
+            {"_id": 1}
+        )}
+        for reminder_id, item in due:
+            if reminder_id not in live:
+                continue
+            late = (now - item["fire_at"]).total_seconds()
+            if late > self.misfire_grace:
+                print(f"Dropped {reminder_id}: missed its run time by more than {self.misfire_grace}s")
+                self._acks.append((reminder_id, item, MISSED))
+                continue
+            self._pool.submit(self._fire_one, reminder_id, item)
+
+    def _fire_one(self, reminder_id, item):
+        self._skew_ms.append((datetime.utcnow() - item["fire_at"]).total_seconds() * 1000)
+        try:
+            self.fire(item)
+            outcome = SENT
+        except Exception as e:
+            print(f"Error firing reminder {reminder_id}: {e}")
+            outcome = FAILED
+        self._acks.append((reminder_id, item, outcome))
+        with self._cond:
+            self._cond.notify()
+
+    def _flush_acks(self):
+        """Record fired, missed and failed reminders in one bulk write"""
+        operations = []
+        now = datetime.utcnow()
+        while self._acks:
+            reminder_id, item, outcome = self._acks.popleft()
+            # Only while still claimed by us: a cancel or reschedule since the claim wins
+            ours = {"_id": reminder_id, "claim": item["claim"], "state": CLAIMED}
+            if outcome == SENT:
+                self.fired += 1
+                operations.append(UpdateOne(ours, {"$set": {"state": SENT, "sent_at": now}}))
+            elif outcome == MISSED:
+                self.missed += 1
+                operations.append(UpdateOne(ours, {"$set": {"state": MISSED}}))
+            elif item.get("attempts", 0) + 1 < self.max_attempts:
+                # Retry with backoff
+                retry_at = now + timedelta(seconds=30 * 2 ** item.get("attempts", 0))
+                operations.append(UpdateOne(ours, {
+                    "$set": {"state": PENDING, "fire_at": retry_at, "lease_until": NO_LEASE},
+                    "$inc": {"attempts": 1}
+                }))
+            else:
+                self.failed += 1
+                operations.append(UpdateOne(ours, {"$set": {"state": FAILED}, "$inc": {"attempts": 1}}))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def stats(self):
+        skew = np.asarray(self._skew_ms) if self._skew_ms else None
+        return {
+            "owner": self.owner,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "held": len(self.heap),
+            "scheduled": self.scheduled,
+            "cancelled": self.cancelled,
+            "claimed": self.claimed,
+            "claim_round_trips": self.claim_round_trips,
+            "fired": self.fired,
+            "missed": self.missed,
+            "failed": self.failed,
+            "skew_ms_p50": round(float(np.percentile(skew, 50)), 2) if skew is not None else None,
+            "skew_ms_p99": round(float(np.percentile(skew, 99)), 2) if skew is not None else None
+        }
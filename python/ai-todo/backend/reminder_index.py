@@ -0,0 +1,153 @@
+"""Secondary index from user and task to reminder jobs, kept inside the job stores.
+
+APScheduler only finds jobs by id. These stores also record which user and task each
+job belongs to (indexed fields, or dicts for the memory store), so listing a user's
+reminders or cancelling a task's reminders reads only those k jobs instead of the whole
+job table. SQLiteJobStore takes the same owner_of callable.
+"""
+import pickle
+from types import SimpleNamespace
+from apscheduler.jobstores.base import ConflictingIdError, JobLookupError
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.mongodb import MongoDBJobStore
+from apscheduler.util import datetime_to_utc_timestamp
+from bson.binary import Binary
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+# Reminder callbacks by name: send_reminder(user_id, task_id, ...), the others (user_id, ...)
+TASK_CALLBACKS = {"send_reminder"}
+USER_CALLBACKS = {"send_push_notification", "send_email_notification"}
+
+def job_owner(job):
+    """(user_id, task_id) of a reminder job; task_id is None for push and email notifications"""
+    name = job.func_ref.rsplit(":", 1)[-1] if isinstance(job.func_ref, str) else ""
+    args = list(job.args)
+    if name in TASK_CALLBACKS and len(args) >= 2:
+        return args[0], args[1]
+    if name in USER_CALLBACKS and args:
+        return args[0], None
+    return None, None
+
+def stored_job_owner(owner_of, job_state):
+    """Owner of a pickled job state without reconstituting the job (which imports its function)"""
+    state = pickle.loads(job_state)
+    return owner_of(SimpleNamespace(func_ref=state["func"], args=state["args"]))
+
+def owner_filter(user_id=None, task_id=None):
+    query = {}
+    if user_id is not None:
+        query["user_id"] = user_id
+    if task_id is not None:
+        query["task_id"] = task_id
+    if not query:
+        raise ValueError("Pass user_id, task_id or both")
+    return query
+
+class IndexedMemoryJobStore(MemoryJobStore):
+    """MemoryJobStore that also maps users and tasks to their job ids"""
+
+    def __init__(self, owner_of=job_owner):
+        super().__init__()
+        self.owner_of = owner_of
+        self._owners = {}
+        self._by_user = {}
+        self._by_task = {}
+
+    def add_job(self, job):
+        super().add_job(job)
+        user_id, task_id = self.owner_of(job)
+        self._owners[job.id] = (user_id, task_id)
+        if user_id is not None:
+            self._by_user.setdefault(user_id, set()).add(job.id)
+        if task_id is not None:
+            self._by_task.setdefault(task_id, set()).add(job.id)
+
+    def remove_job(self, job_id):
+        super().remove_job(job_id)
+        user_id, task_id = self._owners.pop(job_id, (None, None))
+        for index, key in ((self._by_user, user_id), (self._by_task, task_id)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(job_id)
+                if not ids:
+                    del index[key]
+
+    def remove_all_jobs(self):
+        super().remove_all_jobs()
+        self._owners = {}
+        self._by_user = {}
+        self._by_task = {}
+
+    def get_job_ids(self, user_id=None, task_id=None):
+        owner_filter(user_id, task_id)
+        ids = None
+        if user_id is not None:
+            ids = set(self._by_user.get(user_id, ()))
+        if task_id is not None:
+            task_ids = self._by_task.get(task_id, set())
+            ids = ids & task_ids if ids is not None else set(task_ids)
+        return list(ids)
+
+    def get_jobs_for(self, user_id=None, task_id=None):
+        jobs = [self._jobs_index[job_id][0] for job_id in self.get_job_ids(user_id, task_id)]
+        return sorted(jobs, key=lambda job: (datetime_to_utc_timestamp(job.next_run_time) or float("inf"), job.id))
+
+class IndexedMongoDBJobStore(MongoDBJobStore):
+    """MongoDBJobStore whose documents also carry the indexed user_id and task_id of the job"""
+
+    def __init__(self, owner_of=job_owner, **kwargs):
+        super().__init__(**kwargs)
+        self.owner_of = owner_of
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self.collection.create_index([("user_id", ASCENDING), ("next_run_time", ASCENDING)])
+        self.collection.create_index("task_id")
+        # Jobs stored before the index existed have no user_id field yet
+        self._backfill_owners()
+
+    def add_job(self, job):
+        user_id, task_id = self.owner_of(job)
+        try:
+            self.collection.insert_one({
+                "_id": job.id,
+                "next_run_time": datetime_to_utc_timestamp(job.next_run_time),
+                "job_state": Binary(pickle.dumps(job.__getstate__(), self.pickle_protocol)),
+                "user_id": user_id,
+                "task_id": task_id
+            })
+        except DuplicateKeyError:
+            raise ConflictingIdError(job.id)
+
+    def get_job_ids(self, user_id=None, task_id=None):
+        return [document["_id"] for document in self.collection.find(owner_filter(user_id, task_id), ["_id"])]
+
+    def get_jobs_for(self, user_id=None, task_id=None):
+        return self._get_jobs(owner_filter(user_id, task_id))
+
+    def _backfill_owners(self):
+        updated = 0
+        for document in self.collection.find({"user_id": {"$exists": False}}, ["job_state"]):
+            try:
+                user_id, task_id = stored_job_owner(self.owner_of, document["job_state"])
+            except Exception:
+                user_id, task_id = None, None
+            self.collection.update_one({"_id": document["_id"]}, {"$set": {"user_id": user_id, "task_id": task_id}})
+            updated += 1
+        if updated:
+            print(f"Indexed the owners of {updated} stored jobs")
+
+def remove_jobs(scheduler, job_ids, keep=()):
+    """Remove jobs by id through the scheduler; returns how many were removed"""
+    removed = 0
+    for job_id in job_ids:
+        if job_id in keep:
+            continue
+        try:
+            scheduler.remove_job(job_id)
+            removed += 1
+        except JobLookupError:
+            # Already fired or removed by another process
+            pass
+    return removed
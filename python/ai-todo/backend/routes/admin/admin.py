@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from indexes import index_report, ensure_indexes
+
+router = APIRouter()
+
+@router.get("/indexes")
+def get_indexes():
+    """Declared vs existing indexes and collection scans seen by the profiler"""
+    return index_report()
+
+@router.post("/indexes")
+def create_indexes():
+    """Create any declared indexes that are missing"""
+    return {"indexes": ensure_indexes()}
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
-from datetime import datetime
 import json
-import google.generativeai as genai
-import os
-from database import tasks_collection, users_collection, reminders_collection
-from scheduler import schedule_reminder
+from database import async_tasks_collection, async_reminders_collection
+from task_writeback import build_task_lookup, writeback_filter
+from bulk_writer import AsyncBulkWriter
+from ai_cache import ai_cache, suggestion_key, suggestion_user
+from llm import get_llm
+from stream_json import ArrayStreamParser
+from prompt_builder import build_suggest_prompt, expand_answer, expand_item, SUGGESTION_ARRAYS
+from suggestion_pipeline import suggest, require_api_key, suggestion_inputs, queue_writeback
 
 router = APIRouter()
 
@@ -16,6 +20,9 @@ class AISuggestionRequest(BaseModel):
     now: str
     timezone: str
     user_input: str | None = "What should I do next?"
+    user_id: str | None = None
+    # Answer with a local plan if the model has not answered within this many milliseconds
+    deadline_ms: int | None = None
 
 class SchedulePlan(BaseModel):
     task: str
@@ -40,127 +47,108 @@ class AISuggestionResponse(BaseModel):
     reminder_recs: List[ReminderRec]
     explanation: str
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-# Initialize the Google Generative AI client
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+GEMINI_MODEL = 'gemini-1.5-flash'
 
 @router.post("/suggest")
-def ai_suggest(payload: AISuggestionRequest):
-    # Check if Google API key is configured
-    if not GOOGLE_API_KEY or GOOGLE_API_KEY == "your_actual_google_api_key_here":
-        raise HTTPException(
-            status_code=500, 
-            detail="Google API key not configured. Please set your API key in the .env file."
-        )
-    
-    tasks = payload.tasks or []
-    user_input = payload.user_input or "What should I do next?"
-    user_stats = payload.user_stats or {}
-    now = payload.now or datetime.utcnow().isoformat()
-    timezone = payload.timezone or "UTC"
-
-    prompt = """
-You are an assistant that MUST output strict JSON only (no extra commentary).
-Input contains:
-{
-  "tasks": """ + json.dumps(tasks) + """,
-  "user_stats": """ + json.dumps(user_stats) + """,
-  "now": \"""" + now + """\",
-  "timezone": \"""" + timezone + """\",
-  "user_input": \"""" + user_input + """\"
-}
-You must output JSON with these keys:
-- categorized: array of objects {"task": "...", "category": "Work|Personal|Health|Study|Finance|Home|Errand|Other", "priority":"High|Medium|Low", "score": 0-1}
-- schedule_plan: array of objects {"task":"...", "start_iso":"2025-11-14T09:00:00Z", "end_iso":"...", "reason":"..."}
-- reminder_recs: array of objects {"task":"...", "reminder_iso":"...", "method":"push|email|in-app"}
-- explanation: short string (1-2 sentences) summarizing the approach
-
-Constraints:
-- Use user's timezone for scheduling and return ISO UTC times.
-- Prioritize tasks with closer due_date, higher historical completion urgency, and shorter estimated duration if user prefers quick wins.
-- Output only JSON.
-"""
-
-    try:
-        # Use Google Generative AI with a supported model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(
-            prompt,
-            generation_config={'temperature': 0.0, 'max_output_tokens': 800}
-        )
-        
-        # Check if response has content
-        if not response or not response.text:
-            raise Exception("Empty response from Google Generative AI")
-
-        text = response.text.strip()
-
-        # Try to parse the JSON even if the model added backticks or codeblock markers
+async def ai_suggest(payload: AISuggestionRequest, response: Response, cache_control: Optional[str] = Header(None)):
+    return await suggest(get_llm(GEMINI_MODEL), payload, response, cache_control)
+
+def sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/suggest/stream")
+async def ai_suggest_stream(payload: AISuggestionRequest, cache_control: Optional[str] = Header(None)):
+    """Stream a suggestion as server-sent events, one per categorized/schedule_plan/reminder_recs element.
+
+    Each element is parsed out of the model's output as soon as it is complete, sent to the
+    client and written back to the DB; a final "done" event carries the explanation and the
+    writeback report.
+    """
+    llm = get_llm(GEMINI_MODEL)
+    require_api_key(llm)
+    tasks, user_stats, user_input, now, timezone = suggestion_inputs(payload)
+
+    # Shares cache entries with /suggest
+    cache_key = suggestion_key(tasks, user_stats, user_input, timezone, now, llm.model_name)
+    cache_user = suggestion_user(payload.user_id, tasks)
+    cached = None
+    if cache_control is None or "no-cache" not in cache_control:
+        cached, _, _ = await ai_cache.get(cache_key)
+    generation = ai_cache.generation(cache_user)
+    prompt, id_map, prompt_stats = build_suggest_prompt(tasks, user_stats, now, timezone, user_input)
+
+    async def events():
+        if cached is not None:
+            # Writebacks already happened when this answer was computed
+            for key in SUGGESTION_ARRAYS:
+                for item in cached.get(key, []):
+                    yield sse_event(key, item)
+            yield sse_event("done", {"explanation": cached.get("explanation", ""), "cache": "HIT"})
+            return
+
+        parser = ArrayStreamParser(SUGGESTION_ARRAYS)
+        lookup = build_task_lookup(tasks)
+        task_writer = AsyncBulkWriter(async_tasks_collection)
+        reminder_writer = AsyncBulkWriter(async_reminders_collection)
         try:
-            # strip code fences if present
-            if text.startswith("```"):
-                # remove fences
-                text = "\n".join(text.splitlines()[1:-1])
-            parsed = json.loads(text)
-        except Exception:
-            # fallback: try to be forgiving by finding first '{' and last '}'
-            start = text.find("{")
-            end = text.rfind("}")
-            if start != -1 and end != -1:
-                parsed = json.loads(text[start:end+1])
+            async for chunk in llm.stream(prompt):
+                for key, item in parser.feed(chunk):
+                    item = expand_item(item, id_map)
+                    yield sse_event(key, item)
+                    # Write each element back as it arrives
+                    await queue_writeback(key, item, lookup, payload.user_id, task_writer, reminder_writer)
+                    await task_writer.flush()
+                    await reminder_writer.flush()
+            parsed = expand_answer(parser.result(), id_map)
+        except Exception as e:
+            # Headers are already sent, so errors are reported in-band
+            error_message = str(e)
+            if "insufficient_quota" in error_message or "429" in error_message:
+                yield sse_event("error", {"status": 429, "detail": "Google API quota exceeded. Please check your plan and billing details"})
             else:
-                raise
-
-        # Update tasks in DB with category/priority and scores
-        for item in parsed.get("categorized", []):
-            # find the task doc and update category/priority/score
-            tasks_collection.update_one(
-                {"task": item["task"]},
-                {"$set": {
-                    "category": item.get("category"), 
-                    "priority": item.get("priority"),
-                    "last_ai_score": item.get("score")
-                }}
-            )
-        
-        # Schedule recommended reminders
-        for reminder in parsed.get("reminder_recs", []):
-            schedule_reminder(
-                reminder["reminder_iso"], 
-                reminder.get("user_id", "default"), 
-                reminder.get("task_id", "default"), 
-                reminder.get("task", "Reminder"), 
-                f"Reminder for: {reminder.get('task', 'Task')}"
-            )
-
-        return parsed
-
-    except Exception as e:
-        # Check if it's a quota error
-        error_message = str(e)
-        if "insufficient_quota" in error_message or "429" in error_message:
-            raise HTTPException(
-                status_code=429, 
-                detail="Google API quota exceeded. Please check your plan and billing details"
-            )
-        else:
-            raise HTTPException(status_code=500, detail=f"AI or parsing error: {str(e)}")
+                yield sse_event("error", {"status": 500, "detail": f"AI or parsing error: {error_message}"})
+            return
+
+        await ai_cache.put(cache_key, parsed, cache_user, generation)
+        yield sse_event("done", {
+            "explanation": parsed.get("explanation", ""),
+            "cache": "MISS",
+            "prompt": prompt_stats,
+            "writeback": {
+                "tasks": await task_writer.report(),
+                "reminders": await reminder_writer.report()
+            }
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Cache-Key": cache_key[:16]}
+    )
 
 @router.post("/apply-schedule")
-def apply_schedule(payload: dict):
+async def apply_schedule(payload: dict):
     """Apply AI-generated schedule to tasks"""
     schedule_plan = payload.get("schedule_plan", [])
+    lookup = build_task_lookup(payload.get("tasks"))
     
-    # Update tasks with schedule information
+    # Update tasks with schedule information, matched by id and owner, in bulk batches
+    writer = AsyncBulkWriter(async_tasks_collection)
     for item in schedule_plan:
-        tasks_collection.update_one(
-            {"task": item["task"]},
+        key = item.get("id") or item.get("task")
+        task_filter = writeback_filter(item, lookup, payload.get("user_id"))
+        if task_filter is None:
+            writer.skip(key, "task not found for user")
+            continue
+        writer.update_one(
+            task_filter,
             {"$set": {
                 "scheduled_start": item["start_iso"],
                 "scheduled_end": item["end_iso"]
-            }}
+            }},
+            key=key
         )
+    report = await writer.report()
     
-    return {"message": f"Applied schedule to {len(schedule_plan)} tasks"}
\ No newline at end of file
+    return {"message": f"Applied schedule to {report['matched']} tasks", "writeback": report}
\ No newline at end of file
@@ -1,17 +1,38 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, validator
 from typing import Optional, List
 from datetime import datetime
 from bson.objectid import ObjectId
 import json
 import numpy as np
-from database import tasks_collection, users_collection, reminders_collection
+from database import async_tasks_collection, async_users_collection, async_reminders_collection
 from models.schemas import AddTask, EditTask, DeleteTask
-from preprocess import get_bert_embedding, get_tfidf_embedding
-from scheduler import schedule_reminder, update_user_embedding
+from embedding_cache import get_cached_bert_embedding, embed_task_fields
+from embedding_service import run_embedding
+from blocking_io import run_blocking
+from scheduler import schedule_reminder, reschedule_task_reminders, cancel_task_reminders, index_task_embedding
+from bulk_writer import AsyncBulkWriter
+from ai_cache import ai_cache
+from vector_index import vector_indexes
+from ranking import rank_tasks
+from task_queries import find_tasks, stream_ndjson, encode_cursor, InvalidCursor, MAX_PAGE_SIZE
+from task_import import TaskImporter, iter_rows, new_task_doc
 
 router = APIRouter()
 
+async def schedule_task_reminders(reminders, user_id, task_id, task):
+    """Schedule a task's reminders, writing their records in one bulk round trip"""
+    async with AsyncBulkWriter(async_reminders_collection) as writer:
+        for reminder_time in reminders:
+            await run_blocking(schedule_reminder, reminder_time, user_id, task_id, task, f"Reminder for: {task}", writer=writer)
+
+async def replace_task_reminders(reminders, user_id, task_id, task):
+    """Cancel a task's reminders that were dropped and (re)schedule the listed ones"""
+    async with AsyncBulkWriter(async_reminders_collection) as writer:
+        # Job store reads and writes block, so they run off the event loop (not on the encode threads)
+        await run_blocking(reschedule_task_reminders, reminders, user_id, task_id, task, f"Reminder for: {task}", writer=writer)
+
 def doc_to_task(doc):
     return {
         "id": str(doc["_id"]),
@@ -32,44 +53,106 @@ def doc_to_task(doc):
     }
 
 @router.get("/")
-def get_tasks():
-    docs = list(tasks_collection.find({}))
-    return [doc_to_task(d) for d in docs]
+async def get_tasks(
+    response: Response,
+    user_id: Optional[str] = None,
+    status: Optional[str] = None,
+    due_after: Optional[str] = None,
+    due_before: Optional[str] = None,
+    sort: str = Query("_id", pattern="^(_id|due_date)$"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """List tasks filtered by user, status and due window, with keyset pagination"""
+    try:
+        docs = find_tasks(async_tasks_collection, user_id, status, due_after, due_before, sort, cursor, limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if format == "ndjson":
+        # Constant-memory response for large accounts
+        return StreamingResponse(
+            stream_ndjson(docs, doc_to_task, sort, limit),
+            media_type="application/x-ndjson"
+        )
+    
+    tasks = []
+    last = None
+    async for d in docs:
+        tasks.append(doc_to_task(d))
+        last = d
+    if limit and len(tasks) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(last, sort)
+    return tasks
+
+@router.get("/similar")
+async def similar_tasks(
+    user_id: str,
+    task_id: Optional[str] = None,
+    q: Optional[str] = None,
+    k: int = Query(10, ge=1, le=100),
+    exact: Optional[bool] = None
+):
+    """Find a user's tasks most similar to one of their tasks or to free text"""
+    if not task_id and not q:
+        raise HTTPException(status_code=400, detail="Provide task_id or q")
+    
+    # Loading an index and searching it are blocking, keep them off the event loop
+    index = await run_blocking(vector_indexes.get, user_id)
+    if task_id:
+        query_vector = index.get(task_id)
+        if query_vector is None:
+            raise HTTPException(status_code=404, detail="Task not found or has no embedding")
+    else:
+        try:
+            query_vector = await run_embedding(get_cached_bert_embedding, q)
+        except RuntimeError as e:
+            # Model not loaded (locally or in the embedding server)
+            raise HTTPException(status_code=503, detail=f"Embedding model unavailable: {e}")
+    
+    hits, engine = await run_blocking(index.query, query_vector, k=k, exclude=task_id, exact=exact)
+    scores = dict(hits)
+    docs = await async_tasks_collection.find(
+        {"_id": {"$in": [ObjectId(tid) for tid in scores]}},
+        {"bert_vector": 0, "tfidf_vector": 0}
+    ).to_list(None)
+    by_id = {str(d["_id"]): d for d in docs}
+    results = [
+        {"task": doc_to_task(by_id[tid]), "score": score}
+        for tid, score in hits if tid in by_id
+    ]
+    return {"results": results, "engine": engine}
+
+@router.get("/ranked")
+async def ranked_tasks(user_id: str, k: Optional[int] = Query(None, ge=1)):
+    """Rank a user's open tasks by personalized score in one vectorized pass"""
+    docs = await async_tasks_collection.find(
+        {"user_id": user_id, "completed": {"$ne": True}, "status": {"$ne": "completed"}},
+        {"tfidf_vector": 0}
+    ).to_list(None)
+    user_profile = await async_users_collection.find_one({"_id": user_id}) or {}
+    
+    ranked = await run_blocking(rank_tasks, docs, user_profile, k=k)
+    return [dict(doc_to_task(doc), score=score) for doc, score in ranked]
 
 @router.post("/add")
-def add_task(payload: AddTask):
+async def add_task(payload: AddTask):
     now = datetime.utcnow().isoformat()
-    doc = {
-        "user_id": payload.user_id,
-        "task": payload.task,
-        "due_date": payload.due_date,
-        "reminders": payload.reminders or [],
-        "recurrence": payload.recurrence,
-        "estimated_minutes": payload.estimated_minutes,
-        "created_at": now,
-        "updated_at": now,
-        "completed": False,
-        "category": None,
-        "priority": None,
-        "status": "pending",
-        "snooze_count": 0,
-        "last_ai_score": None
-    }
-    result = tasks_collection.insert_one(doc)
+    doc = new_task_doc(payload, now)
+    result = await async_tasks_collection.insert_one(doc)
     doc["_id"] = result.inserted_id
+    await ai_cache.invalidate_user(payload.user_id)
     
     # Compute embeddings
     try:
-        doc["bert_vector"] = get_bert_embedding(payload.task)
-        doc["tfidf_vector"] = get_tfidf_embedding(payload.task)
+        fields = await run_embedding(embed_task_fields, payload.task)
+        doc.update(fields)
         # Update the document with embeddings
-        tasks_collection.update_one(
-            {"_id": doc["_id"]}, 
-            {"$set": {"bert_vector": doc["bert_vector"], "tfidf_vector": doc["tfidf_vector"]}}
-        )
+        await async_tasks_collection.update_one({"_id": doc["_id"]}, {"$set": fields})
         
         # Update user embedding for personalization
-        update_user_embedding(payload.user_id, doc["bert_vector"])
+        await run_blocking(index_task_embedding, payload.user_id, str(doc["_id"]), doc["bert_vector"])
     except Exception as e:
         print(f"Error computing embeddings: {e}")
         # Continue without embeddings if there's an error
@@ -77,13 +160,33 @@ def add_task(payload: AddTask):
     
     # Schedule reminders if provided
     if payload.reminders:
-        for reminder_time in payload.reminders:
-            schedule_reminder(reminder_time, payload.user_id, str(doc["_id"]), payload.task, f"Reminder for: {payload.task}")
+        await schedule_task_reminders(payload.reminders, payload.user_id, str(doc["_id"]), payload.task)
     
     return {"task": doc_to_task(doc)}
 
+@router.post("/bulk-add")
+async def bulk_add(request: Request):
+    """Import AddTask rows streamed as a JSON array, NDJSON or CSV (Content-Type: text/csv)"""
+    importer = TaskImporter()
+    chunk = []
+    async for row, data, error in iter_rows(request.stream(), request.headers.get("content-type", "")):
+        if error:
+            importer.error(row, error)
+            continue
+        chunk.append((row, data))
+        if len(chunk) >= importer.chunk_size:
+            # Embedding and inserts are blocking, keep them off the event loop
+            await run_blocking(importer.import_chunk, chunk)
+            chunk = []
+    if chunk:
+        await run_blocking(importer.import_chunk, chunk)
+    report = await run_blocking(importer.finish)
+    for user_id in importer.users:
+        await ai_cache.invalidate_user(user_id)
+    return report
+
 @router.post("/edit")
-def edit_task(payload: EditTask):
+async def edit_task(payload: EditTask):
     try:
         obj_id = ObjectId(payload.id)
     except Exception:
@@ -97,67 +200,77 @@ def edit_task(payload: EditTask):
     update_data = {
         "task": payload.task.strip(),
         "due_date": payload.due_date,
-        "reminders": payload.reminders or [],
         "recurrence": payload.recurrence,
         "estimated_minutes": payload.estimated_minutes,
         "completed": payload.completed,
         "updated_at": datetime.utcnow().isoformat()
     }
     
+    # Reminders are only replaced when the field is sent
+    if payload.reminders is not None:
+        update_data["reminders"] = payload.reminders
+    
     # Add status if provided
     if payload.status:
         update_data["status"] = payload.status
     
+    # Remember the current text so unchanged tasks are not re-embedded
+    existing = await async_tasks_collection.find_one({"_id": obj_id}, {"task": 1})
+    
     # Update the task
-    result = tasks_collection.update_one(
+    result = await async_tasks_collection.update_one(
         {"_id": obj_id},
         {"$set": update_data}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Task not found")
+    await ai_cache.invalidate_user(payload.user_id)
     
-    # Recompute embeddings for updated task
-    try:
-        updated_bert_vector = get_bert_embedding(payload.task.strip())
-        updated_tfidf_vector = get_tfidf_embedding(payload.task.strip())
-        tasks_collection.update_one(
-            {"_id": obj_id},
-            {"$set": {"bert_vector": updated_bert_vector, "tfidf_vector": updated_tfidf_vector}}
-        )
-        
-        # Update user embedding for personalization
-        update_user_embedding(payload.user_id, updated_bert_vector)
-    except Exception as e:
-        print(f"Error updating embeddings: {e}")
-        # Continue without updating embeddings if there's an error
-        pass
+    # Recompute embeddings only when the task text changed
+    if not existing or existing.get("task") != update_data["task"]:
+        try:
+            fields = await run_embedding(embed_task_fields, update_data["task"])
+            await async_tasks_collection.update_one({"_id": obj_id}, {"$set": fields})
+            
+            # Update user embedding for personalization
+            await run_blocking(index_task_embedding, payload.user_id, payload.id, fields["bert_vector"])
+        except Exception as e:
+            print(f"Error updating embeddings: {e}")
+            # Continue without updating embeddings if there's an error
+            pass
     
-    # Schedule reminders if provided
-    if payload.reminders:
-        for reminder_time in payload.reminders:
-            schedule_reminder(reminder_time, payload.user_id, payload.id, payload.task, f"Reminder for: {payload.task}")
+    # Completed tasks keep no reminders; otherwise the listed reminders replace the old ones
+    if payload.completed or payload.status == "completed":
+        await run_blocking(cancel_task_reminders, payload.id)
+    elif payload.reminders is not None:
+        await replace_task_reminders(payload.reminders, payload.user_id, payload.id, payload.task)
     
     # Fetch updated task
-    updated_doc = tasks_collection.find_one({"_id": obj_id})
+    updated_doc = await async_tasks_collection.find_one({"_id": obj_id})
     return {"task": doc_to_task(updated_doc)}
 
 @router.post("/delete")
-def delete_task(payload: DeleteTask):
+async def delete_task(payload: DeleteTask):
     try:
         obj_id = ObjectId(payload.id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid task ID format")
     
-    result = tasks_collection.delete_one({"_id": obj_id})
+    deleted = await async_tasks_collection.find_one_and_delete({"_id": obj_id}, projection={"user_id": 1})
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    # Waits for the index lock, which a concurrent load holds for its whole Mongo read
+    await run_blocking(vector_indexes.remove, payload.id, deleted.get("user_id"))
+    await run_blocking(cancel_task_reminders, payload.id)
+    await ai_cache.invalidate_user(deleted.get("user_id"))
+    
     return {"message": "Task deleted"}
 
 @router.post("/completed")
-def task_completed(payload: dict):
+async def task_completed(payload: dict):
     task_id = payload.get("id")
     try:
         obj_id = ObjectId(task_id)
@@ -165,12 +278,15 @@ def task_completed(payload: dict):
         raise HTTPException(status_code=400, detail="Invalid task ID format")
     
     # Update task status to completed
-    result = tasks_collection.update_one(
+    updated = await async_tasks_collection.find_one_and_update(
         {"_id": obj_id},
-        {"$set": {"completed": True, "status": "completed", "updated_at": datetime.utcnow().isoformat()}}
+        {"$set": {"completed": True, "status": "completed", "updated_at": datetime.utcnow().isoformat()}},
+        projection={"user_id": 1}
     )
     
-    if result.matched_count == 0:
+    if updated is None:
         raise HTTPException(status_code=404, detail="Task not found")
+    await run_blocking(cancel_task_reminders, task_id)
+    await ai_cache.invalidate_user(updated.get("user_id"))
     
     return {"message": "Task marked as completed"}
\ No newline at end of file
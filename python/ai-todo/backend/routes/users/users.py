@@ -3,7 +3,8 @@ from pydantic import BaseModel
 from typing import Optional, Dict
 from datetime import datetime
 from bson.objectid import ObjectId
-from database import users_collection
+from database import async_users_collection
+from vector_codec import encode_dense, dense_to_list
 
 router = APIRouter()
 
@@ -17,36 +18,44 @@ class User(BaseModel):
     created_at: str
 
 @router.get("/{user_id}")
-def get_user(user_id: str):
+async def get_user(user_id: str):
     """Get user profile"""
-    user_doc = users_collection.find_one({"_id": user_id})
+    user_doc = await async_users_collection.find_one({"_id": user_id})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Convert ObjectId to string for JSON serialization
     user_doc["id"] = str(user_doc["_id"])
     del user_doc["_id"]
+    user_doc["user_embedding"] = dense_to_list(user_doc.get("user_embedding"))
     return user_doc
 
 @router.post("/")
-def create_user(user: User):
+async def create_user(user: User):
     """Create a new user profile"""
     user_dict = user.dict()
     user_dict["_id"] = user_dict.pop("id")
+    embedding = user_dict["user_embedding"]
+    if embedding is not None:
+        user_dict["user_embedding"] = encode_dense(embedding)
     
-    result = users_collection.insert_one(user_dict)
+    result = await async_users_collection.insert_one(user_dict)
     user_dict["id"] = str(result.inserted_id)
     del user_dict["_id"]
+    user_dict["user_embedding"] = embedding
     
     return user_dict
 
 @router.put("/{user_id}")
-def update_user(user_id: str, user: User):
+async def update_user(user_id: str, user: User):
     """Update user profile"""
     user_dict = user.dict()
     user_dict["_id"] = user_id
+    embedding = user_dict["user_embedding"]
+    if embedding is not None:
+        user_dict["user_embedding"] = encode_dense(embedding)
     
-    result = users_collection.update_one(
+    result = await async_users_collection.update_one(
         {"_id": user_id},
         {"$set": user_dict}
     )
@@ -56,5 +65,6 @@ def update_user(user_id: str, user: User):
     
     user_dict["id"] = user_id
     del user_dict["_id"]
+    user_dict["user_embedding"] = embedding
     
     return user_dict
\ No newline at end of file
@@ -1,15 +1,77 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+import os
+import fcntl
 import pytz
 from datetime import datetime, timedelta
 import urllib.parse
 from bson.objectid import ObjectId
-from database import tasks_collection, users_collection, reminders_collection, notifications_collection
+from database import db, MONGO_AVAILABLE, tasks_collection, users_collection, reminders_collection, notifications_collection
 import numpy as np
 import json
+from vector_codec import is_sparse_encoded, sparse_cosine, read_dense, encode_dense
+from bulk_writer import BulkWriter
+from vector_index import vector_indexes
+from leases import acquire_lease, release_lease
+from reminder_dispatcher import ReminderDispatcher
+from reminder_index import IndexedMemoryJobStore, IndexedMongoDBJobStore, job_owner, remove_jobs
+
+# Where reminder jobs are persisted so restarts and deploys keep them:
+# "auto" (MongoDB when reachable, else SQLite), "mongo", "sqlite" or "memory" (lost on restart)
+SCHEDULER_JOBSTORE = os.getenv("SCHEDULER_JOBSTORE", "auto")
+SCHEDULER_SQLITE_PATH = os.getenv("SCHEDULER_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "scheduler_jobs.sqlite"))
+# Reminders missed while the backend was down still fire on startup when they are at most
+# this late; older ones are dropped. Recurring reminders fire once for all missed runs.
+REMINDER_MISFIRE_GRACE_SECONDS = int(os.getenv("REMINDER_MISFIRE_GRACE_SECONDS", "3600"))
+# Only one process runs the persisted jobs ("auto": whichever holds the run lock, a lease
+# document in MongoDB for the mongo store (shared across hosts), else SCHEDULER_LOCK_FILE).
+# The others still add and remove jobs in the shared store.
+SCHEDULER_RUN_JOBS = os.getenv("SCHEDULER_RUN_JOBS", "auto")
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE", SCHEDULER_SQLITE_PATH + ".lock")
+# The mongo lease expires this long after its last renewal (renewed every third of it)
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+# How often the running process re-checks the store for jobs added by other processes
+SCHEDULER_POLL_SECONDS = int(os.getenv("SCHEDULER_POLL_SECONDS", "10"))
+# One-off task reminders: "auto" (dispatcher when MongoDB is reachable), "on" (dispatcher) or "off" (APScheduler jobs)
+REMINDER_DISPATCHER = os.getenv("REMINDER_DISPATCHER", "auto")
+
+def build_reminder_jobstore(kind=SCHEDULER_JOBSTORE):
+    """Persistent job store for reminders, indexed by user and task; returns (store, name)"""
+    if kind == "auto":
+        kind = "mongo" if MONGO_AVAILABLE else "sqlite"
+    if kind == "mongo":
+        # Indexed on next_run_time, so startup loads only the due jobs in one range query
+        return IndexedMongoDBJobStore(client=db.client, database=db.name, collection="scheduler_jobs"), "mongo"
+    if kind == "sqlite":
+        from sqlite_jobstore import SQLiteJobStore
+        return SQLiteJobStore(SCHEDULER_SQLITE_PATH, owner_of=job_owner), "sqlite"
+    if kind == "memory":
+        return IndexedMemoryJobStore(), "memory"
+    raise ValueError(f"Unknown SCHEDULER_JOBSTORE {kind!r}; expected auto, mongo, sqlite or memory")
+
+def acquire_run_lock():
+    """True when this process should run the persisted jobs"""
+    global _run_lock
+    if SCHEDULER_RUN_JOBS != "auto":
+        return SCHEDULER_RUN_JOBS.lower() in ("1", "true", "yes")
+    if REMINDER_JOBSTORE_KIND == "mongo":
+        # The store is shared across hosts, so a host-local file lock would let every host run it
+        return acquire_lease("reminder_jobs", SCHEDULER_LEASE_SECONDS)
+    _run_lock = open(SCHEDULER_LOCK_FILE, "w")
+    try:
+        fcntl.flock(_run_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        _run_lock.close()
+        _run_lock = None
+        return False
+
+_run_lock = None
 
 # Scheduler setup
+# Maintenance jobs (re-registered by every process at startup) stay in memory
 jobstores = {
     'default': MemoryJobStore()
 }
@@ -19,6 +81,98 @@ executors = {
 scheduler = BackgroundScheduler(jobstores=jobstores, executors=executors, timezone=pytz.UTC)
 scheduler.start()
 
+# Reminders, push and email notifications live in the persistent store
+reminder_jobstore, REMINDER_JOBSTORE_KIND = build_reminder_jobstore()
+reminder_scheduler = BackgroundScheduler(
+    jobstores={'default': reminder_jobstore, 'memory': MemoryJobStore()},
+    executors={'default': ThreadPoolExecutor(20)},
+    job_defaults={'coalesce': True, 'misfire_grace_time': REMINDER_MISFIRE_GRACE_SECONDS},
+    timezone=pytz.UTC
+)
+RUNS_REMINDERS = False
+
+# Metrics
+reminder_stats = {"executed": 0, "errors": 0, "missed": 0}
+
+def count_reminder_event(event):
+    if event.job_id == "jobstore_poll":
+        return
+    if event.code == EVENT_JOB_MISSED:
+        reminder_stats["missed"] += 1
+        print(f"Dropped {event.job_id}: missed its run time by more than {REMINDER_MISFIRE_GRACE_SECONDS}s")
+    elif event.code == EVENT_JOB_ERROR:
+        reminder_stats["errors"] += 1
+    else:
+        reminder_stats["executed"] += 1
+
+def wake_up():
+    """No-op job; running it makes the scheduler look for jobs added by other processes"""
+
+reminder_scheduler.add_listener(count_reminder_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+# Started paused: every importer can add and remove jobs in the store, but only the server
+# process that wins the run lock resumes it (see start_reminder_jobs). Resuming here would
+# also deadlock: loading persisted jobs imports this module while it is still importing.
+reminder_scheduler.start(paused=True)
+
+def run_reminder_jobs(runs):
+    """Resume or pause the stored jobs in this process"""
+    global RUNS_REMINDERS
+    if runs and not RUNS_REMINDERS:
+        if REMINDER_JOBSTORE_KIND != "memory":
+            reminder_scheduler.add_job(wake_up, 'interval', seconds=SCHEDULER_POLL_SECONDS, id="jobstore_poll",
+                                       jobstore='memory', replace_existing=True)
+        # Reminders that came due while no process was running fire now (within the grace)
+        reminder_scheduler.resume()
+    elif not runs and RUNS_REMINDERS:
+        reminder_scheduler.pause()
+        print("Lost the scheduler lease; no longer running reminder jobs in this process")
+    RUNS_REMINDERS = runs
+
+def renew_run_lease():
+    """Keep the lease while running, take it over when its holder stopped renewing it"""
+    try:
+        run_reminder_jobs(acquire_lease("reminder_jobs", SCHEDULER_LEASE_SECONDS))
+    except Exception as e:
+        # Cannot tell whether another process took over, so stop running to be safe
+        print(f"Error renewing the scheduler lease: {e}")
+        run_reminder_jobs(False)
+
+def start_reminder_jobs():
+    """Run persisted reminders in this process if it holds the run lock (called at app startup)"""
+    if reminder_dispatcher is not None:
+        # Claims are atomic, so the dispatcher runs in every process
+        reminder_dispatcher.start()
+    run_reminder_jobs(acquire_run_lock())
+    if SCHEDULER_RUN_JOBS == "auto" and REMINDER_JOBSTORE_KIND == "mongo":
+        scheduler.add_job(renew_run_lease, 'interval', seconds=max(1, SCHEDULER_LEASE_SECONDS // 3),
+                          id="scheduler_lease", replace_existing=True)
+    print(f"Reminder jobs stored in {REMINDER_JOBSTORE_KIND} ({'running' if RUNS_REMINDERS else 'not running'} them in this process)")
+
+def stop_reminder_jobs():
+    """Stop running reminders in this process (called at app shutdown)"""
+    if reminder_dispatcher is not None:
+        reminder_dispatcher.stop()
+    if scheduler.get_job("scheduler_lease"):
+        scheduler.remove_job("scheduler_lease")
+    if reminder_scheduler.running:
+        reminder_scheduler.shutdown(wait=False)
+    if RUNS_REMINDERS and SCHEDULER_RUN_JOBS == "auto" and REMINDER_JOBSTORE_KIND == "mongo":
+        # Let another process take over right away instead of after the lease expires
+        release_lease("reminder_jobs")
+
+def scheduler_stats():
+    """Reminder store, whether this process runs the jobs, and job outcome counts"""
+    next_run = reminder_jobstore.get_next_run_time()
+    return {
+        "jobstore": REMINDER_JOBSTORE_KIND,
+        "runs_jobs": RUNS_REMINDERS,
+        "run_lock": SCHEDULER_RUN_JOBS if SCHEDULER_RUN_JOBS != "auto" else ("lease" if REMINDER_JOBSTORE_KIND == "mongo" else "file"),
+        "misfire_grace_seconds": REMINDER_MISFIRE_GRACE_SECONDS,
+        "next_run_time": next_run.isoformat() if next_run else None,
+        **reminder_stats,
+        "dispatcher": reminder_dispatcher.stats() if reminder_dispatcher is not None else None
+    }
+
 def generate_calendar_url(title, description, start_time, end_time=None):
     """Generate a Google Calendar event URL"""
     # Format times for Google Calendar (ISO format without colons and dashes)
@@ -38,6 +192,21 @@ def generate_calendar_url(title, description, start_time, end_time=None):
     calendar_url = f"https://calendar.google.com/calendar/render?action=TEMPLATE&text={title_encoded}&details={description_encoded}&dates={start_formatted}/{end_formatted}"
     return calendar_url
 
+def store_notification(user_id, title, body, notification_type, writer=None):
+    """Store a notification, queued on writer when one is given"""
+    notification_doc = {
+        "user_id": user_id,
+        "title": title,
+        "body": body,
+        "type": notification_type,
+        "created_at": datetime.utcnow().isoformat(),
+        "read": False
+    }
+    if writer is not None:
+        writer.insert_one(notification_doc, key=user_id)
+    else:
+        notifications_collection.insert_one(notification_doc)
+
 def send_reminder(user_id, task_id, title, body):
     """Send a reminder to a user"""
     # This is where you would implement actual notification sending
@@ -62,60 +231,66 @@ def send_reminder(user_id, task_id, title, body):
     reminders_collection.insert_one(reminder_doc)
     
     # Also store in notifications collection
-    notification_doc = {
-        "user_id": user_id,
-        "title": title,
-        "body": body,
-        "type": "reminder",
-        "created_at": datetime.utcnow().isoformat(),
-        "read": False
-    }
-    notifications_collection.insert_one(notification_doc)
+    store_notification(user_id, title, body, "reminder")
+
+def fire_reminder(reminder):
+    """Dispatcher callback: send a claimed reminder document"""
+    send_reminder(reminder["user_id"], reminder["task_id"], reminder["title"], reminder["body"])
+
+# MockCollection cannot run the dispatcher's claim queries, so auto needs MongoDB
+if REMINDER_DISPATCHER == "on" or (REMINDER_DISPATCHER == "auto" and MONGO_AVAILABLE):
+    reminder_dispatcher = ReminderDispatcher(reminders_collection, fire_reminder)
+else:
+    reminder_dispatcher = None
 
 def send_push_notification(user_id, title, body):
     """Send a push notification to a user"""
     print(f"Push notification: {title} - {body} for user {user_id}")
     
     # Store in notifications collection
-    notification_doc = {
-        "user_id": user_id,
-        "title": title,
-        "body": body,
-        "type": "push",
-        "created_at": datetime.utcnow().isoformat(),
-        "read": False
-    }
-    notifications_collection.insert_one(notification_doc)
+    store_notification(user_id, title, body, "push")
 
 def send_email_notification(user_id, title, body):
     """Send an email notification to a user"""
     print(f"Email notification: {title} - {body} for user {user_id}")
     
     # Store in notifications collection
-    notification_doc = {
-        "user_id": user_id,
-        "title": title,
-        "body": body,
-        "type": "email",
-        "created_at": datetime.utcnow().isoformat(),
-        "read": False
-    }
-    notifications_collection.insert_one(notification_doc)
+    store_notification(user_id, title, body, "email")
 
-def schedule_reminder(reminder_iso, user_id, task_id, title, body):
-    """Schedule a reminder for a specific time"""
+def upsert_reminder(user_id, task_id, fields, writer=None):
+    """Upsert the reminder record for a task, queued on writer when one is given"""
+    # Dispatcher reminders (which have a fire_at) share the collection; keep the record apart
+    record = {"user_id": user_id, "task_id": task_id, "fire_at": {"$exists": False}}
+    if writer is not None:
+        writer.update_one(record, {"$set": fields}, upsert=True, key=task_id)
+    else:
+        reminders_collection.update_one(record, {"$set": fields}, upsert=True)
+
+def schedule_reminder(reminder_iso, user_id, task_id, title, body, writer=None):
+    """Schedule a reminder for a specific time; pass a BulkWriter on reminders_collection to batch the calendar upsert"""
     try:
         # Parse the reminder time
         run_time = datetime.fromisoformat(reminder_iso.replace("Z", "+00:00"))
+        reminder_id = f"reminder_{user_id}_{task_id}_{reminder_iso}"
         
-        # Add job to scheduler
-        scheduler.add_job(
-            send_reminder,
-            'date',
-            run_date=run_time,
-            args=[user_id, task_id, title, body],
-            id=f"reminder_{user_id}_{task_id}_{reminder_iso}"
-        )
+        if reminder_dispatcher is not None:
+            # One document per reminder, fired by the dispatcher
+            reminder_dispatcher.schedule(
+                reminder_id,
+                run_time,
+                {"user_id": user_id, "task_id": task_id, "title": title, "body": body},
+                writer
+            )
+        else:
+            # Add job to scheduler
+            reminder_scheduler.add_job(
+                send_reminder,
+                'date',
+                run_date=run_time,
+                args=[user_id, task_id, title, body],
+                id=reminder_id,
+                replace_existing=True
+            )
         
         # Generate calendar URL for this reminder
         calendar_url = generate_calendar_url(
@@ -125,11 +300,7 @@ def schedule_reminder(reminder_iso, user_id, task_id, title, body):
         )
         
         # Store calendar URL in reminders collection
-        reminders_collection.update_one(
-            {"user_id": user_id, "task_id": task_id},
-            {"$set": {"calendar_url": calendar_url}},
-            upsert=True
-        )
+        upsert_reminder(user_id, task_id, {"calendar_url": calendar_url}, writer)
         
         print(f"Scheduled reminder for {reminder_iso}")
         print(f"Calendar URL: {calendar_url}")
@@ -145,12 +316,13 @@ def schedule_push_notification(notification_time_iso, user_id, title, body):
         run_time = datetime.fromisoformat(notification_time_iso.replace("Z", "+00:00"))
         
         # Add job to scheduler
-        scheduler.add_job(
+        reminder_scheduler.add_job(
             send_push_notification,
             'date',
             run_date=run_time,
             args=[user_id, title, body],
-            id=f"push_{user_id}_{notification_time_iso}"
+            id=f"push_{user_id}_{notification_time_iso}",
+            replace_existing=True
         )
         
         print(f"Scheduled push notification for {notification_time_iso}")
@@ -166,12 +338,13 @@ def schedule_email_notification(notification_time_iso, user_id, title, body):
         run_time = datetime.fromisoformat(notification_time_iso.replace("Z", "+00:00"))
         
         # Add job to scheduler
-        scheduler.add_job(
+        reminder_scheduler.add_job(
             send_email_notification,
             'date',
             run_date=run_time,
             args=[user_id, title, body],
-            id=f"email_{user_id}_{notification_time_iso}"
+            id=f"email_{user_id}_{notification_time_iso}",
+            replace_existing=True
         )
         
         print(f"Scheduled email notification for {notification_time_iso}")
@@ -180,7 +353,7 @@ def schedule_email_notification(notification_time_iso, user_id, title, body):
         print(f"Error scheduling email notification: {e}")
         return False
 
-def schedule_recurring_reminder(start_time_iso, user_id, task_id, title, body, recurrence_pattern):
+def schedule_recurring_reminder(start_time_iso, user_id, task_id, title, body, recurrence_pattern, writer=None):
     """Schedule a recurring reminder based on pattern (daily, weekly, monthly)"""
     try:
         # Parse the start time
@@ -188,31 +361,34 @@ def schedule_recurring_reminder(start_time_iso, user_id, task_id, title, body, r
         
         # Determine the recurrence pattern
         if recurrence_pattern == "daily":
-            scheduler.add_job(
+            reminder_scheduler.add_job(
                 send_reminder,
                 'interval',
                 days=1,
                 start_date=start_time,
                 args=[user_id, task_id, title, body],
-                id=f"recurring_daily_{user_id}_{task_id}_{start_time_iso}"
+                id=f"recurring_daily_{user_id}_{task_id}_{start_time_iso}",
+                replace_existing=True
             )
         elif recurrence_pattern == "weekly":
-            scheduler.add_job(
+            reminder_scheduler.add_job(
                 send_reminder,
                 'interval',
                 weeks=1,
                 start_date=start_time,
                 args=[user_id, task_id, title, body],
-                id=f"recurring_weekly_{user_id}_{task_id}_{start_time_iso}"
+                id=f"recurring_weekly_{user_id}_{task_id}_{start_time_iso}",
+                replace_existing=True
             )
         elif recurrence_pattern == "monthly":
-            scheduler.add_job(
+            reminder_scheduler.add_job(
                 send_reminder,
                 'interval',
                 days=30,
                 start_date=start_time,
                 args=[user_id, task_id, title, body],
-                id=f"recurring_monthly_{user_id}_{task_id}_{start_time_iso}"
+                id=f"recurring_monthly_{user_id}_{task_id}_{start_time_iso}",
+                replace_existing=True
             )
         
         # Generate calendar URL for recurring event
@@ -223,11 +399,7 @@ def schedule_recurring_reminder(start_time_iso, user_id, task_id, title, body, r
         )
         
         # Store calendar URL in reminders collection
-        reminders_collection.update_one(
-            {"user_id": user_id, "task_id": task_id},
-            {"$set": {"calendar_url": calendar_url, "recurrence": recurrence_pattern}},
-            upsert=True
-        )
+        upsert_reminder(user_id, task_id, {"calendar_url": calendar_url, "recurrence": recurrence_pattern}, writer)
         
         print(f"Scheduled recurring reminder ({recurrence_pattern}) starting at {start_time_iso}")
         print(f"Calendar URL: {calendar_url}")
@@ -239,25 +411,58 @@ def schedule_recurring_reminder(start_time_iso, user_id, task_id, title, body, r
 def cancel_reminder(reminder_id):
     """Cancel a scheduled reminder"""
     try:
-        scheduler.remove_job(reminder_id)
+        if reminder_dispatcher is not None and reminder_id.startswith("reminder_"):
+            if not reminder_dispatcher.cancel(reminder_id):
+                print(f"Reminder {reminder_id} is not pending")
+                return False
+        else:
+            reminder_scheduler.remove_job(reminder_id)
         print(f"Cancelled reminder {reminder_id}")
         return True
     except Exception as e:
         print(f"Error cancelling reminder: {e}")
         return False
 
+def cancel_task_reminders(task_id, keep=(), kinds=None):
+    """Cancel a task's reminders (all of them, or the job id prefixes in kinds) except the ids in keep; returns how many"""
+    try:
+        cancelled = 0
+        if reminder_dispatcher is not None and (kinds is None or "reminder_" in kinds):
+            cancelled += reminder_dispatcher.cancel_task(task_id, keep)
+        # Job ids come from the store's task index, not a scan of every job
+        job_ids = [job_id for job_id in reminder_jobstore.get_job_ids(task_id=task_id)
+                   if kinds is None or job_id.startswith(tuple(kinds))]
+        cancelled += remove_jobs(reminder_scheduler, job_ids, set(keep))
+        if cancelled:
+            print(f"Cancelled {cancelled} reminders of task {task_id}")
+        return cancelled
+    except Exception as e:
+        print(f"Error cancelling task reminders: {e}")
+        return 0
+
+def reschedule_task_reminders(reminder_isos, user_id, task_id, title, body, writer=None):
+    """Replace a task's one-off reminders: cancel those no longer listed, (re)schedule the listed ones"""
+    keep = {f"reminder_{user_id}_{task_id}_{reminder_iso}" for reminder_iso in reminder_isos}
+    cancel_task_reminders(task_id, keep, kinds=("reminder_",))
+    return [schedule_reminder(reminder_iso, user_id, task_id, title, body, writer) for reminder_iso in reminder_isos]
+
 def get_scheduled_reminders(user_id):
-    """Get all scheduled reminders for a user"""
+    """Get all scheduled reminders for a user, earliest first"""
     try:
-        jobs = scheduler.get_jobs()
-        user_reminders = []
-        for job in jobs:
-            if f"user_{user_id}" in job.id:
+        # Only this user's jobs, read through the store's user index
+        user_reminders = [{
+            "id": job.id,
+            "next_run_time": job.next_run_time.isoformat() if job.next_run_time else None,
+            "args": job.args
+        } for job in reminder_jobstore.get_jobs_for(user_id=user_id)]
+        if reminder_dispatcher is not None:
+            for reminder in reminder_dispatcher.pending_for_user(user_id):
                 user_reminders.append({
-                    "id": job.id,
-                    "next_run_time": job.next_run_time.isoformat() if job.next_run_time else None,
-                    "args": job.args
+                    "id": reminder["_id"],
+                    "next_run_time": reminder["fire_at"].replace(tzinfo=pytz.UTC).isoformat(),
+                    "args": [reminder["user_id"], reminder["task_id"], reminder["title"], reminder["body"]]
                 })
+            user_reminders.sort(key=lambda reminder: (reminder["next_run_time"] is None, reminder["next_run_time"] or ""))
         return user_reminders
     except Exception as e:
         print(f"Error getting scheduled reminders: {e}")
@@ -265,20 +470,49 @@ def get_scheduled_reminders(user_id):
 
 def cosine_similarity(a, b):
     """Compute cosine similarity between two vectors"""
-    if not a or not b:
+    if a is None or b is None or len(a) == 0 or len(b) == 0:
         return 0
+    if is_sparse_encoded(a) or is_sparse_encoded(b):
+        # Sparse TF-IDF vectors are compared without densifying
+        return sparse_cosine(a, b)
     try:
-        a = np.array(a)
-        b = np.array(b)
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9)
+        # float32 binaries are decoded zero-copy, legacy lists are converted
+        a = read_dense(a)
+        b = read_dense(b)
+        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9))
     except:
         return 0
 
+def index_task_embedding(user_id, task_id, bert_vector):
+    """Fold a task embedding into the user profile and the user's vector index (blocking)"""
+    update_user_embedding(user_id, bert_vector)
+    vector_indexes.upsert(user_id, task_id, bert_vector)
+
 def update_user_embedding(user_id, task_embedding):
     """Update user embedding with new task embedding for personalization"""
+    update_user_embedding_many(user_id, [task_embedding])
+
+def update_user_embedding_many(user_id, task_embeddings, alpha=0.1):
+    """Fold several task embeddings into the user embedding with one read and one write.
+
+    Gives the same result as calling update_user_embedding once per embedding, in order.
+    """
     try:
+        vectors = [read_dense(v) for v in task_embeddings if v is not None and len(v) > 0]
+        if not vectors:
+            return
+        
         # Get current user embedding
         user_doc = users_collection.find_one({"_id": user_id})
+        current_embedding = read_dense(user_doc.get("user_embedding")) if user_doc else None
+        
+        # Running average: each new embedding is weighted by the learning rate
+        for new in vectors:
+            if current_embedding is not None and current_embedding.size == new.size:
+                current_embedding = (1 - alpha) * current_embedding + alpha * new
+            else:
+                current_embedding = new
+        
         if not user_doc:
             # Create new user if doesn't exist
             users_collection.insert_one({
@@ -287,38 +521,34 @@ def update_user_embedding(user_id, task_embedding):
                 "timezone": "UTC",
                 "notification_methods": {"webpush": True, "email": True},
                 "behavior_stats": {},
-                "user_embedding": task_embedding,
+                "user_embedding": encode_dense(current_embedding),
                 "created_at": datetime.utcnow().isoformat()
             })
             return
         
-        # Update existing user embedding as running average
-        current_embedding = user_doc.get("user_embedding", [])
-        if current_embedding:
-            # Compute running average
-            alpha = 0.1  # Learning rate
-            new_embedding = [
-                (1 - alpha) * current + alpha * new 
-                for current, new in zip(current_embedding, task_embedding)
-            ]
-        else:
-            new_embedding = task_embedding
-        
         users_collection.update_one(
             {"_id": user_id},
-            {"$set": {"user_embedding": new_embedding}}
+            {"$set": {"user_embedding": encode_dense(current_embedding)}}
         )
     except Exception as e:
         print(f"Error updating user embedding: {e}")
 
-def compute_task_score(task, user_profile):
+def parse_due_date(value):
+    """Parse an ISO due date into a naive UTC datetime"""
+    due_date = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if due_date.tzinfo is not None:
+        due_date = due_date.astimezone(pytz.UTC).replace(tzinfo=None)
+    return due_date
+
+def compute_task_score(task, user_profile, now=None):
     """Compute personalized score for a task based on user profile"""
     try:
+        now = now or datetime.utcnow()
         # due urgency: 1 if due within 24h, 0.5 if within 3 days, else 0
         due_score = 0
         if task.get("due_date"):
-            due_date = datetime.fromisoformat(task["due_date"].replace("Z", "+00:00"))
-            delta_hours = (due_date - datetime.utcnow()).total_seconds() / 3600
+            due_date = parse_due_date(task["due_date"])
+            delta_hours = (due_date - now).total_seconds() / 3600
             due_score = max(0, 1 - delta_hours/72)  # decays over 72 hours
         
         # similarity to user embedding
@@ -342,15 +572,17 @@ def compute_task_score(task, user_profile):
 def schedule_ai_reminders(ai_reminder_recs, user_id):
     """Schedule all AI-recommended reminders"""
     scheduled_count = 0
-    for reminder in ai_reminder_recs:
-        success = schedule_reminder(
-            reminder["reminder_iso"], 
-            user_id, 
-            reminder.get("task_id", "default"), 
-            reminder.get("task", "Reminder"), 
-            f"Reminder for: {reminder.get('task', 'Task')}"
-        )
-        if success:
-            scheduled_count += 1
+    with BulkWriter(reminders_collection) as writer:
+        for reminder in ai_reminder_recs:
+            success = schedule_reminder(
+                reminder["reminder_iso"], 
+                user_id, 
+                reminder.get("task_id", "default"), 
+                reminder.get("task", "Reminder"), 
+                f"Reminder for: {reminder.get('task', 'Task')}",
+                writer=writer
+            )
+            if success:
+                scheduled_count += 1
     
     return scheduled_count
\ No newline at end of file
@@ -0,0 +1,58 @@
+import asyncio
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one in-flight upstream call.
+
+    The first caller for a key (the leader) starts the call as a task; callers that arrive
+    while it is running (followers) wait on the same task and get its result or exception.
+    Each caller applies its own timeout, and a caller timing out or disconnecting does not
+    cancel the shared call for the others.
+    """
+
+    def __init__(self):
+        self._flights = {}
+
+        # Metrics
+        self.calls = 0
+        self.leaders = 0
+        self.collapsed = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    async def do(self, key, fn, timeout=None):
+        """Run fn() once per key at a time; returns (result, "leader" | "follower")"""
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is None:
+            role = "leader"
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            role = "follower"
+            self.collapsed += 1
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        return result, role
+
+    def _finished(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "collapse_rate": round(self.collapsed / self.calls, 4) if self.calls else 0
+        }
@@ -0,0 +1,166 @@
+"""APScheduler job store in a local SQLite file (stdlib sqlite3, no SQLAlchemy needed).
+
+Mirrors apscheduler's MongoDBJobStore: one row per job with its pickled state and an
+indexed next_run_time, so due jobs are loaded in one range query on the index. With an
+owner_of callable, rows also carry the indexed user_id and task_id of the job.
+"""
+import pickle
+import sqlite3
+import threading
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+from reminder_index import owner_filter, stored_job_owner
+
+class SQLiteJobStore(BaseJobStore):
+    """Stores jobs in a SQLite file (WAL mode); safe to share between threads of one process"""
+
+    def __init__(self, path, table="scheduler_jobs", pickle_protocol=pickle.HIGHEST_PROTOCOL, owner_of=None):
+        super().__init__()
+        self.path = path
+        self.table = table
+        self.pickle_protocol = pickle_protocol
+        self.owner_of = owner_of
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, next_run_time REAL, job_state BLOB NOT NULL, "
+            "user_id TEXT, task_id TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        if "user_id" not in columns:
+            # Files written before the owner columns existed
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN user_id TEXT")
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN task_id TEXT")
+            self._backfill_owners()
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_next_run_time ON {table} (next_run_time)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_user_id ON {table} (user_id, next_run_time)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_task_id ON {table} (task_id)")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def lookup_job(self, job_id):
+        rows = self._query(f"SELECT job_state FROM {self.table} WHERE id = ?", (job_id,))
+        return self._reconstitute_job(rows[0][0]) if rows else None
+
+    def get_due_jobs(self, now):
+        timestamp = datetime_to_utc_timestamp(now)
+        return self._get_jobs("WHERE next_run_time <= ?", (timestamp,))
+
+    def get_next_run_time(self):
+        rows = self._query(
+            f"SELECT next_run_time FROM {self.table} WHERE next_run_time IS NOT NULL ORDER BY next_run_time LIMIT 1"
+        )
+        return utc_timestamp_to_datetime(rows[0][0]) if rows else None
+
+    def get_all_jobs(self):
+        jobs = self._get_jobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def count(self):
+        return self._query(f"SELECT COUNT(*) FROM {self.table}")[0][0]
+
+    def add_job(self, job):
+        user_id, task_id = self.owner_of(job) if self.owner_of else (None, None)
+        try:
+            self._execute(
+                f"INSERT INTO {self.table} (id, next_run_time, job_state, user_id, task_id) VALUES (?, ?, ?, ?, ?)",
+                (job.id, datetime_to_utc_timestamp(job.next_run_time), self._state(job), user_id, task_id)
+            )
+        except sqlite3.IntegrityError:
+            raise ConflictingIdError(job.id)
+
+    def add_states(self, rows):
+        """Bulk insert (id, next_run_time timestamp, pickled state, user_id, task_id) rows in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (id, next_run_time, job_state, user_id, task_id) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.execute("COMMIT")
+
+    def get_job_ids(self, user_id=None, task_id=None):
+        """Ids of the jobs of a user and/or task, read through the owner indexes"""
+        where, params = self._owner_where(user_id, task_id)
+        return [row[0] for row in self._query(f"SELECT id FROM {self.table} WHERE {where}", params)]
+
+    def get_jobs_for(self, user_id=None, task_id=None):
+        where, params = self._owner_where(user_id, task_id)
+        return self._get_jobs(f"WHERE {where}", params)
+
+    def update_job(self, job):
+        updated = self._execute(
+            f"UPDATE {self.table} SET next_run_time = ?, job_state = ? WHERE id = ?",
+            (datetime_to_utc_timestamp(job.next_run_time), self._state(job), job.id)
+        )
+        if updated == 0:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        if self._execute(f"DELETE FROM {self.table} WHERE id = ?", (job_id,)) == 0:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        self._execute(f"DELETE FROM {self.table}")
+
+    def shutdown(self):
+        with self._lock:
+            self._conn.close()
+
+    def _owner_where(self, user_id, task_id):
+        conditions = owner_filter(user_id, task_id)
+        return " AND ".join(f"{column} = ?" for column in conditions), tuple(conditions.values())
+
+    def _backfill_owners(self):
+        if self.owner_of is None:
+            return
+        rows = []
+        for job_id, job_state in self._conn.execute(f"SELECT id, job_state FROM {self.table}").fetchall():
+            try:
+                rows.append((*stored_job_owner(self.owner_of, job_state), job_id))
+            except Exception:
+                pass
+        self._conn.execute("BEGIN")
+        self._conn.executemany(f"UPDATE {self.table} SET user_id = ?, task_id = ? WHERE id = ?", rows)
+        self._conn.execute("COMMIT")
+        if rows:
+            print(f"Indexed the owners of {len(rows)} stored jobs")
+
+    def _state(self, job):
+        return pickle.dumps(job.__getstate__(), self.pickle_protocol)
+
+    def _reconstitute_job(self, job_state):
+        job = Job.__new__(Job)
+        job.__setstate__(pickle.loads(job_state))
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _get_jobs(self, where="", params=()):
+        jobs = []
+        failed_job_ids = []
+        rows = self._query(f"SELECT id, job_state FROM {self.table} {where} ORDER BY next_run_time", params)
+        for job_id, job_state in rows:
+            try:
+                jobs.append(self._reconstitute_job(job_state))
+            except BaseException:
+                self._logger.exception('Unable to restore job "%s" -- removing it', job_id)
+                failed_job_ids.append(job_id)
+
+        # Remove all the jobs we failed to restore
+        for job_id in failed_job_ids:
+            self._execute(f"DELETE FROM {self.table} WHERE id = ?", (job_id,))
+        return jobs
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} (path={self.path})>"
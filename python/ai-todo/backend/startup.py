@@ -0,0 +1,42 @@
+"""Startup and shutdown work shared by both entrypoints (app.py and main.py)"""
+import os
+from contextlib import asynccontextmanager
+import preprocess
+from embedding_service import embedding_executor
+from embedding_cache import purge_stale_embeddings
+from vectorizer_store import schedule_tfidf_refresh
+from migrations import schedule_vector_reencoder
+from indexes import ensure_indexes, enable_profiler
+from scheduler import scheduler, start_reminder_jobs, stop_reminder_jobs
+
+# Load the embedding model, vectorizer and NLTK data in the background right after startup,
+# so the first requests do not pay for it; /ready reports when this has finished
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+def start_services():
+    # Create declared indexes and optionally profile slow queries
+    ensure_indexes()
+    enable_profiler()
+    # Load the persisted TF-IDF vectorizer and keep it refreshed in the background
+    schedule_tfidf_refresh(scheduler)
+    # Migrate vectors still stored in legacy list formats
+    schedule_vector_reencoder(scheduler)
+    # Run persisted reminders, catching up on those missed while the backend was down
+    start_reminder_jobs()
+    # Drop shared embeddings of model versions marked as retired
+    purge_stale_embeddings()
+    if WARMUP_ON_STARTUP:
+        embedding_executor.submit(preprocess.warmup)
+
+def stop_services():
+    # Hand claimed reminders back so another process fires them
+    stop_reminder_jobs()
+
+@asynccontextmanager
+async def lifespan(app):
+    """FastAPI lifespan: start the services before serving, stop them on shutdown"""
+    start_services()
+    try:
+        yield
+    finally:
+        stop_services()
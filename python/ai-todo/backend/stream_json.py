@@ -0,0 +1,111 @@
+import json
+
+class ArrayStreamParser:
+    """Incrementally parse a streamed JSON object and emit elements of its top-level arrays.
+
+    Feed text chunks as they arrive; feed() returns (key, element) for every element of a
+    watched array that completed in that chunk. Anything before the object (code fences,
+    prose) is skipped: the object starts at the first "{" followed by a key or "}", so
+    braces in prose such as "{as requested}" are not mistaken for it.
+    """
+
+    def __init__(self, keys):
+        self.keys = set(keys)
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.started = False
+        self.done = False
+        # Span of the top-level object in text, once it has started / ended
+        self.start = None
+        self.end = None
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.current_key = None
+        self.array_key = None
+        self.element_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        emitted = []
+        text = self.text
+        while self.pos < len(text) and not self.done:
+            ch = text[self.pos]
+            if not self.started:
+                if ch == "{":
+                    following = self._next_significant(self.pos + 1)
+                    if following is None:
+                        # Decide once the next non-space character arrives
+                        break
+                    if following in '"}':
+                        self.started = True
+                        self.depth = 1
+                        self.start = self.pos
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_string = text[self.string_start:self.pos + 1]
+            elif ch == '"':
+                self.in_string = True
+                self.string_start = self.pos
+                self._start_element()
+            elif ch == ":" and self.depth == 1:
+                self.current_key = json.loads(self.last_string)
+            elif ch in "{[":
+                if self.depth == 1 and ch == "[":
+                    self.array_key = self.current_key if self.current_key in self.keys else None
+                else:
+                    self._start_element()
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 2 and self.element_start is not None:
+                    # An object/array element just closed
+                    emitted.append(self._emit(self.pos + 1))
+                elif self.depth == 1 and ch == "]":
+                    if self.element_start is not None:
+                        emitted.append(self._emit(self.pos))
+                    self.array_key = None
+                elif self.depth == 0:
+                    self.done = True
+                    self.end = self.pos + 1
+            elif ch == "," and self.depth == 2 and self.element_start is not None:
+                # End of a scalar element
+                emitted.append(self._emit(self.pos))
+            elif not ch.isspace() and ch != ",":
+                self._start_element()
+            self.pos += 1
+        return [item for item in emitted if item is not None]
+
+    def _next_significant(self, pos):
+        """First non-whitespace character at or after pos (None if not received yet)"""
+        while pos < len(self.text):
+            if not self.text[pos].isspace():
+                return self.text[pos]
+            pos += 1
+        return None
+
+    def _start_element(self):
+        if self.depth == 2 and self.array_key is not None and self.element_start is None:
+            self.element_start = self.pos
+
+    def _emit(self, end):
+        raw = self.text[self.element_start:end].strip()
+        self.element_start = None
+        try:
+            return self.array_key, json.loads(raw)
+        except ValueError:
+            return None
+
+    def result(self):
+        """The whole object once the stream has ended (fences and surrounding prose ignored)"""
+        if not self.done:
+            raise ValueError("No complete JSON object in model output")
+        return json.loads(self.text[self.start:self.end])
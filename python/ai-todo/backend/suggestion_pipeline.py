@@ -0,0 +1,191 @@
+import os
+import json
+import asyncio
+from datetime import datetime
+from fastapi import HTTPException
+from database import async_tasks_collection, async_reminders_collection
+from scheduler import schedule_reminder
+from task_writeback import build_task_lookup, resolve_task, writeback_filter
+from bulk_writer import AsyncBulkWriter
+from blocking_io import run_blocking
+from ai_cache import ai_cache, ai_flights, suggestion_key, suggestion_user, set_cache_headers, AI_SUGGEST_TIMEOUT_SECONDS
+from heuristic_planner import local_plan, mark_engine
+from prompt_builder import build_suggest_prompt, expand_answer
+
+# Shared by /ai/suggest (app.py) and /ai-suggest (main.py)
+
+class UnusableSuggestion(ValueError):
+    """The model answered, but with nothing that can be used as a suggestion"""
+
+def require_api_key(llm):
+    """Reject the request if the configured LLM needs a Google API key and none is set"""
+    # Read per call: main.py loads .env after its imports
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if llm.needs_api_key and (not api_key or api_key == "your_actual_google_api_key_here"):
+        raise HTTPException(
+            status_code=500,
+            detail="Google API key not configured. Please set your API key in the .env file."
+        )
+
+def suggestion_inputs(payload):
+    """Request fields with their defaults: (tasks, user_stats, user_input, now, timezone)"""
+    return (
+        payload.tasks or [],
+        payload.user_stats or {},
+        payload.user_input or "What should I do next?",
+        payload.now or datetime.utcnow().isoformat(),
+        payload.timezone or "UTC"
+    )
+
+def parse_suggestion(text):
+    """Parse the model's JSON answer, tolerating code fences and text around the object"""
+    text = (text or "").strip()
+
+    # Handle completely empty responses
+    if not text:
+        raise UnusableSuggestion("Empty response from AI")
+
+    # Try to parse the JSON even if the model added backticks or codeblock markers
+    try:
+        # strip code fences if present
+        if text.startswith("```"):
+            # remove fences
+            text = "\n".join(text.splitlines()[1:-1])
+        parsed = json.loads(text)
+    except Exception:
+        # fallback: try to be forgiving by finding first '{' and last '}'
+        start = text.find("{")
+        end = text.rfind("}")
+        if start == -1 or end == -1:
+            raise UnusableSuggestion("No JSON in AI response")
+        try:
+            parsed = json.loads(text[start:end+1])
+        except ValueError as e:
+            raise UnusableSuggestion(f"Invalid JSON in AI response: {e}")
+
+    # Check if the parsed response has meaningful content
+    if not isinstance(parsed, dict) or (not parsed.get("categorized") and not parsed.get("schedule_plan") and not parsed.get("reminder_recs")):
+        raise UnusableSuggestion("Empty or incomplete response from AI")
+    return parsed
+
+async def queue_writeback(key, item, lookup, user_id, task_writer, reminder_writer):
+    """Queue the DB write for one element of a suggestion (schedule_plan is only applied on request)"""
+    if key == "categorized":
+        # Category/priority and score, matched by id and owner
+        item_key = item.get("id") or item.get("task")
+        task_filter = writeback_filter(item, lookup, user_id)
+        if task_filter is None:
+            task_writer.skip(item_key, "task not found for user")
+            return
+        task_writer.update_one(
+            task_filter,
+            {"$set": {
+                "category": item.get("category"),
+                "priority": item.get("priority"),
+                "last_ai_score": item.get("score")
+            }},
+            key=item_key
+        )
+    elif key == "reminder_recs":
+        task_id, owner = resolve_task(item, lookup, user_id)
+        # Adding the job reads and writes the job store, so it runs off the event loop
+        await run_blocking(
+            schedule_reminder,
+            item["reminder_iso"],
+            owner or "default",
+            task_id or "default",
+            item.get("task", "Reminder"),
+            f"Reminder for: {item.get('task', 'Task')}",
+            writer=reminder_writer
+        )
+
+async def suggest(llm, payload, response, cache_control=None):
+    """Answer a suggestion request: cache, one shared model call, writebacks, local-plan fallbacks"""
+    require_api_key(llm)
+    tasks, user_stats, user_input, now, timezone = suggestion_inputs(payload)
+
+    # Identical inputs within the same time bucket reuse the previous answer
+    cache_key = suggestion_key(tasks, user_stats, user_input, timezone, now, llm.model_name)
+    cache_user = suggestion_user(payload.user_id, tasks)
+    if cache_control is None or "no-cache" not in cache_control:
+        cached, tier, age = await ai_cache.get(cache_key)
+        if cached is not None:
+            set_cache_headers(response, "HIT", cache_key, tier, age)
+            return mark_engine(response, cached, llm.engine)
+    generation = ai_cache.generation(cache_user)
+
+    # Only the top-ranked tasks that fit the token budget are sent, under short ids
+    prompt, id_map, prompt_stats = build_suggest_prompt(tasks, user_stats, now, timezone, user_input)
+
+    async def compute():
+        # Google Generative AI, or the configured stand-in (LLM_BACKEND)
+        completion = await llm.generate(prompt)
+        try:
+            text = completion.text
+        except Exception as e:
+            raise UnusableSuggestion(f"Error getting AI response: {e}")
+        parsed = parse_suggestion(text)
+
+        expand_answer(parsed, id_map)
+        prompt_stats["prompt_tokens"] = completion.prompt_tokens
+        print(f"AI suggestion prompt: {prompt_stats}")
+
+        # Cache the model's answer itself; writebacks below only happen on a miss
+        await ai_cache.put(cache_key, parsed, cache_user, generation)
+
+        # Update tasks and schedule recommended reminders in unordered bulk batches
+        # instead of one round trip per item
+        lookup = build_task_lookup(tasks)
+        task_writer = AsyncBulkWriter(async_tasks_collection)
+        reminder_writer = AsyncBulkWriter(async_reminders_collection)
+        for key in ("categorized", "reminder_recs"):
+            for item in parsed.get(key, []):
+                await queue_writeback(key, item, lookup, payload.user_id, task_writer, reminder_writer)
+
+        parsed["writeback"] = {
+            "tasks": await task_writer.report(),
+            "reminders": await reminder_writer.report()
+        }
+        parsed["prompt"] = prompt_stats
+
+        return parsed
+
+    # With a deadline, stop waiting for the model after deadline_ms; the call itself keeps
+    # running and caches its answer for the next request
+    timeout = AI_SUGGEST_TIMEOUT_SECONDS
+    if payload.deadline_ms:
+        timeout = min(timeout, payload.deadline_ms / 1000)
+
+    def fallback(reason):
+        set_cache_headers(response, "MISS", cache_key)
+        return mark_engine(response, local_plan(tasks, user_stats, now, timezone), "local", reason)
+
+    try:
+        # Concurrent identical requests share one upstream call (and its writebacks)
+        result, role = await ai_flights.do(cache_key, compute, timeout)
+        set_cache_headers(response, "MISS", cache_key)
+        response.headers["X-Single-Flight"] = role
+        response.headers["X-Prompt-Tokens"] = str(result["prompt"]["prompt_tokens_est"])
+        return mark_engine(response, result, llm.engine)
+    except asyncio.TimeoutError:
+        if payload.deadline_ms:
+            return fallback("deadline")
+        raise HTTPException(status_code=504, detail="AI suggestion timed out")
+    except UnusableSuggestion as e:
+        # Plan from the user's own tasks instead of generic suggestions
+        print(f"{e}, answering with a local plan")
+        return fallback("unusable_response")
+    except Exception as e:
+        # Check if it's a quota error
+        error_message = str(e)
+        quota_exceeded = "insufficient_quota" in error_message or "429" in error_message
+        if payload.deadline_ms:
+            print(f"AI suggestion failed, answering with a local plan: {e}")
+            return fallback("quota" if quota_exceeded else "upstream_error")
+        if quota_exceeded:
+            raise HTTPException(
+                status_code=429,
+                detail="Google API quota exceeded. Please check your plan and billing details"
+            )
+        else:
+            raise HTTPException(status_code=500, detail=f"AI or parsing error: {str(e)}")
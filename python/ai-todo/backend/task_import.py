@@ -0,0 +1,239 @@
+import codecs
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+import preprocess
+from database import tasks_collection, reminders_collection
+from models.schemas import AddTask
+from embedding_cache import get_cached_bert_embeddings, get_cached_tfidf_embeddings, encode_bert_chunk
+from scheduler import schedule_reminder, update_user_embedding_many
+from vector_index import vector_indexes
+from bulk_writer import BulkWriter
+
+# Rows validated, embedded and inserted together
+BULK_ADD_CHUNK_SIZE = int(os.getenv("BULK_ADD_CHUNK_SIZE", "256"))
+
+def new_task_doc(payload, now):
+    """Task document for a validated AddTask, before embeddings are added"""
+    return {
+        "user_id": payload.user_id,
+        "task": payload.task,
+        "due_date": payload.due_date,
+        "reminders": payload.reminders or [],
+        "recurrence": payload.recurrence,
+        "estimated_minutes": payload.estimated_minutes,
+        "created_at": now,
+        "updated_at": now,
+        "completed": False,
+        "category": None,
+        "priority": None,
+        "status": "pending",
+        "snooze_count": 0,
+        "last_ai_score": None
+    }
+
+def _csv_row(header, line):
+    values = next(csv.reader([line]))
+    row = {key: (value if value != "" else None) for key, value in zip(header, values)}
+    if row.get("reminders"):
+        # Several reminder times go in one cell, separated by ";"
+        row["reminders"] = [r.strip() for r in row["reminders"].split(";") if r.strip()]
+    return row
+
+def _as_row(data):
+    """(row, error) for a decoded value; rows must be JSON objects"""
+    return (data, None) if isinstance(data, dict) else (None, "Row must be an object")
+
+async def iter_rows(chunks, content_type=""):
+    """Yield (row_number, row, error) from a streamed JSON array, NDJSON or CSV body.
+
+    Rows are parsed as their bytes arrive, so the whole upload is never held in memory.
+    CSV needs a header row; values may not contain newlines.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    stream = chunks.__aiter__()
+    buffer = ""
+    mode = None
+    header = None
+    row = 0
+    eof = False
+
+    while True:
+        try:
+            buffer += decoder.decode(await stream.__anext__())
+        except StopAsyncIteration:
+            buffer += decoder.decode(b"", final=True)
+            eof = True
+
+        if mode is None:
+            buffer = buffer.lstrip()
+            if not buffer:
+                if eof:
+                    return
+                continue
+            mode = "csv" if "csv" in content_type else ("array" if buffer[0] == "[" else "lines")
+            if mode == "array":
+                buffer = buffer[1:]
+
+        if mode == "array":
+            # Decode one element at a time from the front of the buffer
+            while True:
+                buffer = buffer.lstrip().lstrip(",").lstrip()
+                if buffer.startswith("]"):
+                    return
+                if not buffer:
+                    break
+                try:
+                    data, end = json_decoder.raw_decode(buffer)
+                except ValueError as e:
+                    if not eof:
+                        # The element is probably incomplete; wait for more bytes
+                        break
+                    yield (row, None, f"Invalid JSON: {e}")
+                    return
+                buffer = buffer[end:]
+                yield (row, *_as_row(data))
+                row += 1
+            if eof:
+                yield (row, None, "Unexpected end of JSON array")
+                return
+            continue
+
+        # NDJSON or CSV: one row per complete line
+        lines = buffer.split("\n")
+        buffer = "" if eof else lines.pop()
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if mode == "csv" and header is None:
+                header = [name.strip() for name in next(csv.reader([line]))]
+                continue
+            try:
+                if mode == "csv":
+                    yield (row, _csv_row(header, line), None)
+                else:
+                    yield (row, *_as_row(json.loads(line)))
+            except (ValueError, csv.Error) as e:
+                yield (row, None, f"Invalid row: {e}")
+            row += 1
+        if eof:
+            return
+
+class TaskImporter:
+    """Imports AddTask rows chunk by chunk and folds per-user side effects into the final step"""
+
+    def __init__(self, chunk_size=BULK_ADD_CHUNK_SIZE):
+        self.chunk_size = max(1, chunk_size)
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.inserted = 0
+        self.chunks = 0
+        self.errors = []
+        self.user_vectors = defaultdict(list)
+        self.users = set()
+        self.reminders = 0
+        self.reminder_writer = BulkWriter(reminders_collection)
+        self.timings_ms = defaultdict(float)
+
+    def error(self, row, message):
+        self.rows += 1
+        self.errors.append({"row": row, "error": message})
+
+    def _timed(self, name, started):
+        self.timings_ms[name] += (time.perf_counter() - started) * 1000
+
+    def import_chunk(self, rows):
+        """Validate, embed and insert a chunk of (row_number, data) pairs"""
+        self.chunks += 1
+        started = time.perf_counter()
+        valid = []
+        for row, data in rows:
+            try:
+                valid.append((row, AddTask(**data)))
+            except ValidationError as e:
+                self.error(row, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            except TypeError as e:
+                self.error(row, str(e))
+        self._timed("validate", started)
+        if not valid:
+            return
+
+        now = datetime.utcnow().isoformat()
+        docs = [new_task_doc(payload, now) for _, payload in valid]
+
+        # One encode call for the whole chunk (cache hits are skipped)
+        started = time.perf_counter()
+        try:
+            texts = [payload.task for _, payload in valid]
+            # Taken before encoding, so a vectorizer swapped in meanwhile cannot mislabel the vectors
+            tfidf_state = preprocess.get_tfidf_state()
+            bert_vectors = get_cached_bert_embeddings(texts, encode_bert_chunk)
+            tfidf_vectors = get_cached_tfidf_embeddings(texts, tfidf_state)
+            for doc, bert_vector, tfidf_vector in zip(docs, bert_vectors, tfidf_vectors):
+                doc["bert_vector"] = bert_vector
+                doc["tfidf_vector"] = tfidf_vector
+                doc["tfidf_version"] = tfidf_state[0]
+                doc["embedded_at"] = now
+        except Exception as e:
+            print(f"Error computing embeddings for import chunk: {e}")
+            # Continue without embeddings if there's an error
+        self._timed("embed", started)
+
+        # Embeddings are already on the documents, so each row is written once
+        started = time.perf_counter()
+        failed = {}
+        try:
+            tasks_collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "write error") for err in e.details.get("writeErrors", [])}
+        except Exception as e:
+            print(f"Error inserting import chunk: {e}")
+            failed = {i: str(e) for i in range(len(docs))}
+        self._timed("insert", started)
+
+        started = time.perf_counter()
+        for i, ((row, payload), doc) in enumerate(zip(valid, docs)):
+            self.rows += 1
+            if i in failed:
+                self.errors.append({"row": row, "error": failed[i]})
+                continue
+            self.inserted += 1
+            self.users.add(payload.user_id)
+            task_id = str(doc["_id"])
+            if doc.get("bert_vector") is not None:
+                self.user_vectors[payload.user_id].append(doc["bert_vector"])
+                vector_indexes.upsert(payload.user_id, task_id, doc["bert_vector"])
+            for reminder_time in payload.reminders or []:
+                if schedule_reminder(reminder_time, payload.user_id, task_id, payload.task,
+                                     f"Reminder for: {payload.task}", writer=self.reminder_writer):
+                    self.reminders += 1
+        self._timed("index_and_reminders", started)
+
+    def finish(self):
+        """Apply one embedding update per user, flush reminder records and report"""
+        started = time.perf_counter()
+        for user_id, vectors in self.user_vectors.items():
+            update_user_embedding_many(user_id, vectors)
+        self.reminder_writer.flush()
+        self._timed("finish", started)
+
+        elapsed = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "failed": len(self.errors),
+            "errors": sorted(self.errors, key=lambda e: e["row"]),
+            "reminders_scheduled": self.reminders,
+            "users_updated": len(self.user_vectors),
+            "chunks": self.chunks,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "rows_per_sec": round(self.rows / elapsed, 1) if elapsed > 0 else None,
+            "timings_ms": {name: round(ms, 1) for name, ms in self.timings_ms.items()}
+        }
@@ -0,0 +1,80 @@
+import base64
+import json
+from bson.objectid import ObjectId
+
+# Embedding fields are never needed to render a task list
+VECTOR_FIELDS_PROJECTION = {"bert_vector": 0, "tfidf_vector": 0}
+
+MAX_PAGE_SIZE = 1000
+
+# Documents fetched per round trip when streaming
+STREAM_BATCH_SIZE = 500
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(doc, sort="_id"):
+    """Opaque keyset cursor pointing just past doc"""
+    key = [str(doc["_id"])] if sort == "_id" else [doc.get("due_date"), str(doc["_id"])]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor, sort="_id"):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == "_id":
+            return [ObjectId(key[0])]
+        return [key[0], ObjectId(key[1])]
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+def build_task_query(user_id=None, status=None, due_after=None, due_before=None, sort="_id", cursor=None):
+    """Mongo filter for the task list, including the keyset condition for cursor"""
+    query = {}
+    if user_id:
+        query["user_id"] = user_id
+    if status:
+        query["status"] = status
+
+    due = {}
+    if due_after:
+        due["$gte"] = due_after
+    if due_before:
+        due["$lt"] = due_before
+    if sort == "due_date":
+        # Keyset ordering on due_date only covers tasks that have one
+        due["$type"] = "string"
+    if due:
+        query["due_date"] = due
+
+    if cursor:
+        key = decode_cursor(cursor, sort)
+        if sort == "_id":
+            query["_id"] = {"$gt": key[0]}
+        else:
+            due_date, last_id = key
+            query["$or"] = [
+                {"due_date": {"$gt": due_date}},
+                {"due_date": due_date, "_id": {"$gt": last_id}}
+            ]
+    return query
+
+def find_tasks(collection, user_id=None, status=None, due_after=None, due_before=None,
+               sort="_id", cursor=None, limit=None):
+    """Cursor over matching tasks in keyset order, without embedding fields"""
+    query = build_task_query(user_id, status, due_after, due_before, sort, cursor)
+    order = [("_id", 1)] if sort == "_id" else [("due_date", 1), ("_id", 1)]
+    docs = collection.find(query, VECTOR_FIELDS_PROJECTION).sort(order).batch_size(STREAM_BATCH_SIZE)
+    if limit:
+        docs = docs.limit(limit)
+    return docs
+
+async def stream_ndjson(docs, to_dict, sort="_id", limit=None):
+    """Yield one JSON line per task from an async cursor; ends with a next_cursor line when the page is full"""
+    count = 0
+    last = None
+    async for doc in docs:
+        yield json.dumps(to_dict(doc), default=str) + "\n"
+        count += 1
+        last = doc
+    if limit and count == limit and last is not None:
+        yield json.dumps({"next_cursor": encode_cursor(last, sort)}) + "\n"
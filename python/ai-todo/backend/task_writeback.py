@@ -0,0 +1,39 @@
+from bson.objectid import ObjectId
+
+def build_task_lookup(tasks):
+    """Index the tasks a client sent by id and by text, so AI items can be mapped back to ids"""
+    by_id = {}
+    by_text = {}
+    for task in tasks or []:
+        task_id = task.get("id") or task.get("_id")
+        if not task_id:
+            continue
+        task_id = str(task_id)
+        by_id[task_id] = task
+        if task.get("task"):
+            by_text.setdefault(task["task"], task_id)
+    return by_id, by_text
+
+def resolve_task(item, lookup, user_id=None):
+    """(task_id, user_id) an AI item refers to; either may be None"""
+    by_id, by_text = lookup
+    task_id = item.get("id") or item.get("task_id")
+    if not task_id and item.get("task"):
+        task_id = by_text.get(item["task"])
+    task_id = str(task_id) if task_id else None
+    if user_id is None and task_id in by_id:
+        user_id = by_id[task_id].get("user_id")
+    return task_id, user_id
+
+def writeback_filter(item, lookup, user_id=None):
+    """Filter matching an AI item to exactly one of the user's tasks, or None if it cannot be scoped"""
+    task_id, user_id = resolve_task(item, lookup, user_id)
+    if not user_id:
+        # Never update a task without knowing whose it is
+        return None
+    if task_id and ObjectId.is_valid(task_id):
+        return {"_id": ObjectId(task_id), "user_id": user_id}
+    if item.get("task"):
+        # Fall back to the text, but only within the user's tasks (uses the user_id index)
+        return {"user_id": user_id, "task": item["task"]}
+    return None
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from ranking import score_tasks, rank_tasks, FALLBACK_SCORE
+from scheduler import compute_task_score
+from vector_codec import encode_dense
+
+NOW = datetime(2026, 3, 2, 12, 0, 0)
+DIM = 16
+
+def scalar_scores(tasks, profile):
+    return np.array([compute_task_score(task, profile, now=NOW) for task in tasks])
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+@pytest.fixture
+def profile(rng):
+    return {"user_embedding": encode_dense(rng.normal(size=DIM)), "priority_adjustment": 0.1}
+
+def random_tasks(rng, n=300):
+    tasks = []
+    for i in range(n):
+        task = {"task": f"task {i}"}
+        if rng.random() < 0.8:
+            due = NOW + timedelta(hours=float(rng.uniform(-48, 240)))
+            task["due_date"] = due.isoformat() + ("Z" if i % 2 else "")
+        if rng.random() < 0.7:
+            task["estimated_minutes"] = int(rng.integers(5, 240))
+        if rng.random() < 0.9:
+            vec = rng.normal(size=DIM).astype(np.float32)
+            task["bert_vector"] = vec.tolist() if i % 3 == 0 else encode_dense(vec)
+        tasks.append(task)
+    return tasks
+
+def test_matches_scalar_scores(rng, profile):
+    tasks = random_tasks(rng)
+    np.testing.assert_allclose(score_tasks(tasks, profile, now=NOW), scalar_scores(tasks, profile), atol=1e-5)
+
+@pytest.mark.parametrize("task", [
+    {"task": "no due date", "estimated_minutes": 45},
+    {"task": "no estimate", "due_date": "2026-03-03T12:00:00Z"},
+    {"task": "nothing at all"},
+    {"task": "empty due date", "due_date": ""},
+    {"task": "offset due date", "due_date": "2026-03-02T18:00:00+02:00"},
+    {"task": "unparseable due date", "due_date": "next tuesday-ish"},
+    {"task": "non-numeric estimate", "estimated_minutes": "an hour"},
+    {"task": "empty vector", "bert_vector": []},
+    {"task": "wrong dimension", "bert_vector": [1.0, 2.0, 3.0]},
+])
+def test_matches_scalar_on_edge_cases(rng, profile, task):
+    # Mixed into a normal batch, so the fast paths still run for the other tasks
+    tasks = random_tasks(rng, 20) + [task]
+    np.testing.assert_allclose(score_tasks(tasks, profile, now=NOW), scalar_scores(tasks, profile), atol=1e-5)
+
+def test_unparseable_fields_fall_back(profile):
+    tasks = [{"task": "a", "due_date": "not a date"}, {"task": "b", "estimated_minutes": "soon"}]
+    assert score_tasks(tasks, profile, now=NOW).tolist() == [FALLBACK_SCORE, FALLBACK_SCORE]
+
+@pytest.mark.parametrize("profile", [
+    {},
+    {"user_embedding": None, "priority_adjustment": -0.2},
+    {"user_embedding": [], "priority_adjustment": 0.2},
+    {"priority_adjustment": "high"},
+])
+def test_matches_scalar_for_sparse_profiles(rng, profile):
+    tasks = random_tasks(rng, 50)
+    np.testing.assert_allclose(score_tasks(tasks, profile, now=NOW), scalar_scores(tasks, profile), atol=1e-5)
+
+def test_rank_tasks_orders_by_scalar_score(rng, profile):
+    tasks = random_tasks(rng, 100)
+    ranked = rank_tasks(tasks, profile, k=10, now=NOW)
+    expected = sorted(scalar_scores(tasks, profile), reverse=True)[:10]
+    np.testing.assert_allclose([score for _, score in ranked], expected, atol=1e-5)
+
+def test_local_planner_ranks_like_rank_tasks(rng, profile):
+    from heuristic_planner import rank_open_tasks
+    tasks = random_tasks(rng, 100)
+    tasks[3]["completed"] = True
+    tasks[5]["status"] = "completed"
+    open_tasks = [task for i, task in enumerate(tasks) if i not in (3, 5)]
+    planned = rank_open_tasks(tasks, profile, NOW)
+    ranked = rank_tasks(open_tasks, profile, now=NOW)
+    assert [task for _, _, task in planned] == [task for task, _ in ranked]
+    assert [score for score, _, _ in planned] == [score for _, score in ranked]
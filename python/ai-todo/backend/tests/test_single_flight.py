@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from single_flight import SingleFlight
+
+def run(coro):
+    return asyncio.run(coro)
+
+class Upstream:
+    """Upstream call that blocks until released and counts how often it ran"""
+
+    def __init__(self, result="answer", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def start(self):
+        self.release = asyncio.Event()
+        return self
+
+async def settle():
+    # Let the spawned callers reach their await on the shared task
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_followers_share_the_leaders_call():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream().start()
+        callers = [asyncio.ensure_future(flights.do("k", upstream)) for _ in range(5)]
+        await settle()
+        assert flights.stats()["in_flight"] == 1
+        upstream.release.set()
+        return flights, upstream, await asyncio.gather(*callers)
+
+    flights, upstream, results = run(scenario())
+    assert upstream.calls == 1
+    assert results == [("answer", "leader")] + [("answer", "follower")] * 4
+    stats = flights.stats()
+    assert (stats["in_flight"], stats["leaders"], stats["collapsed"], stats["collapse_rate"]) == (0, 1, 4, 0.8)
+
+def test_distinct_keys_and_later_calls_run_separately():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream().start()
+        upstream.release.set()
+        first = await asyncio.gather(flights.do("a", upstream), flights.do("b", upstream))
+        # Nothing is cached once the flight has landed
+        second = await flights.do("a", upstream)
+        return upstream, first, second
+
+    upstream, first, second = run(scenario())
+    assert upstream.calls == 3
+    assert [role for _, role in first] == ["leader", "leader"]
+    assert second == ("answer", "leader")
+
+def test_follower_timeout_does_not_cancel_the_shared_call():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream().start()
+        leader = asyncio.ensure_future(flights.do("k", upstream))
+        await settle()
+        with pytest.raises(asyncio.TimeoutError):
+            await flights.do("k", upstream, timeout=0.01)
+        upstream.release.set()
+        return flights, upstream, await leader
+
+    flights, upstream, result = run(scenario())
+    assert result == ("answer", "leader")
+    assert upstream.calls == 1
+    assert flights.stats()["timeouts"] == 1
+
+def test_leader_timeout_still_serves_followers():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream().start()
+        leader = asyncio.ensure_future(flights.do("k", upstream, timeout=0.01))
+        await settle()
+        follower = asyncio.ensure_future(flights.do("k", upstream))
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        upstream.release.set()
+        return upstream, await follower
+
+    upstream, result = run(scenario())
+    assert result == ("answer", "follower")
+    assert upstream.calls == 1
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream().start()
+        leader = asyncio.ensure_future(flights.do("k", upstream))
+        follower = asyncio.ensure_future(flights.do("k", upstream))
+        await settle()
+        # A client disconnecting cancels its request task
+        leader.cancel()
+        await settle()
+        upstream.release.set()
+        return leader, await follower
+
+    leader, result = run(scenario())
+    assert leader.cancelled()
+    assert result == ("answer", "follower")
+
+def test_exception_reaches_every_caller_once():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream(error=ValueError("quota")).start()
+        callers = [asyncio.ensure_future(flights.do("k", upstream)) for _ in range(3)]
+        await settle()
+        upstream.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        # The failed flight is not reused: the next call goes upstream again
+        upstream.error = None
+        retry = await flights.do("k", upstream)
+        return flights, upstream, results, retry
+
+    flights, upstream, results, retry = run(scenario())
+    assert all(isinstance(r, ValueError) and str(r) == "quota" for r in results)
+    assert retry == ("answer", "leader")
+    assert upstream.calls == 2
+    stats = flights.stats()
+    assert (stats["errors"], stats["in_flight"]) == (1, 0)
@@ -0,0 +1,85 @@
+import json
+import pytest
+from stream_json import ArrayStreamParser
+
+KEYS = ["categorized", "reminder_recs"]
+
+ANSWER = {
+    "categorized": [
+        {"id": "t1", "task": "Reply to \"urgent\" email", "category": "Work", "score": 0.9},
+        {"id": "t2", "task": "Path C:\\temp\\{x}, [draft]", "tags": ["a", {"b": [1, 2]}]},
+        {"id": "t3", "task": "Caf\u00e9 run\nthen gym \u2014 done", "nested": {"deep": {"deeper": []}}},
+    ],
+    "schedule_plan": [{"id": "t1", "slot": "09:00"}],
+    "reminder_recs": ["plain string", 42, -1.5e3, True, None, {"id": "t2"}, [1, [2, "]"]]],
+    "explanation": "Ordered by {due date} and [priority]."
+}
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def expected_elements(answer):
+    return [(key, element) for key in answer if key in KEYS for element in answer[key]]
+
+def parse(text, size):
+    parser = ArrayStreamParser(KEYS)
+    emitted = []
+    for chunk in chunks(text, size):
+        emitted.extend(parser.feed(chunk))
+    return parser, emitted
+
+@pytest.mark.parametrize("size", [1, 3, 7])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_emits_every_element_across_chunk_boundaries(size, indent):
+    text = json.dumps(ANSWER, indent=indent, ensure_ascii=indent is None)
+    parser, emitted = parse(text, size)
+    assert emitted == expected_elements(ANSWER)
+    assert parser.result() == ANSWER
+
+@pytest.mark.parametrize("size", [1, 3, 7])
+def test_skips_fences_and_prose(size):
+    text = "Here is the plan:\n```json\n" + json.dumps(ANSWER) + "\n```\nLet me know {if} anything changes."
+    parser, emitted = parse(text, size)
+    assert emitted == expected_elements(ANSWER)
+    assert parser.result() == ANSWER
+
+@pytest.mark.parametrize("size", [1, 3, 7])
+def test_ignores_braces_in_prose_before_the_object(size):
+    text = "Sure {as requested}, here it is { in JSON }:\n" + json.dumps(ANSWER)
+    parser, emitted = parse(text, size)
+    assert emitted == expected_elements(ANSWER)
+    assert parser.result() == ANSWER
+
+def test_waits_for_the_character_after_a_brace():
+    parser = ArrayStreamParser(KEYS)
+    assert parser.feed("Note {") == []
+    assert not parser.started
+    parser.feed("ok} then {")
+    assert not parser.started
+    parser.feed(' "categorized": [1]}')
+    assert parser.started and parser.done
+    assert parser.result() == {"categorized": [1]}
+
+def test_escaped_quote_at_chunk_boundary():
+    parser = ArrayStreamParser(KEYS)
+    emitted = []
+    for chunk in ['{"categorized": [{"task": "say \\', '"hi\\', '" now', '"}, "x\\\\', '"]}']:
+        emitted.extend(parser.feed(chunk))
+    assert emitted == [("categorized", {"task": 'say "hi" now'}), ("categorized", "x\\")]
+
+def test_empty_arrays_and_unwatched_keys():
+    parser, emitted = parse('{"schedule_plan": [{"a": 1}], "categorized": [], "reminder_recs": [ ]}', 3)
+    assert emitted == []
+    assert parser.result()["schedule_plan"] == [{"a": 1}]
+
+def test_result_requires_a_complete_object():
+    parser, _ = parse('```json\n{"categorized": [{"id": "t1"}', 5)
+    with pytest.raises(ValueError):
+        parser.result()
+    with pytest.raises(ValueError):
+        parse("no JSON here {at all}", 4)[0].result()
+
+def test_stops_at_the_end_of_the_object():
+    parser, emitted = parse('{"categorized": [1, 2]} {"categorized": [3]}', 4)
+    assert emitted == [("categorized", 1), ("categorized", 2)]
+    assert parser.result() == {"categorized": [1, 2]}
@@ -0,0 +1,32 @@
+import json
+import pytest
+from suggestion_pipeline import parse_suggestion, UnusableSuggestion
+
+ANSWER = {
+    "categorized": [{"id": "t1", "task": "Pay rent", "category": "Finance", "priority": "High", "score": 0.9}],
+    "schedule_plan": [],
+    "reminder_recs": [],
+    "explanation": "Rent is due {today}."
+}
+
+@pytest.mark.parametrize("text", [
+    json.dumps(ANSWER),
+    "```json\n" + json.dumps(ANSWER, indent=2) + "\n```",
+    "Here is the plan: " + json.dumps(ANSWER) + " Good luck!",
+    "  \n" + json.dumps(ANSWER) + "\n",
+])
+def test_parse_accepts_wrapped_json(text):
+    assert parse_suggestion(text) == ANSWER
+
+@pytest.mark.parametrize("text", [
+    None,
+    "",
+    "   ",
+    "I cannot help with that.",
+    "{not json}",
+    "[]",
+    json.dumps({"categorized": [], "schedule_plan": [], "reminder_recs": [], "explanation": "Nothing"}),
+])
+def test_parse_rejects_unusable_answers(text):
+    with pytest.raises(UnusableSuggestion):
+        parse_suggestion(text)
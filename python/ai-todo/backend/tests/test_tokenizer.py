@@ -0,0 +1,24 @@
+import pytest
+import preprocess
+from benchmarks.tokenizer_bench import GOLDEN_PATH, generated
+
+pytest.importorskip("nltk")
+
+with open(GOLDEN_PATH, encoding="utf-8") as f:
+    GOLDEN = f.read().split("\n")
+
+def nltk_tokens(text):
+    return preprocess.get_word_tokenizer().tokenize(preprocess.normalize(text))
+
+@pytest.mark.parametrize("text", GOLDEN)
+def test_golden_matches_nltk(text):
+    assert preprocess.tokenize_normalized(preprocess.normalize(text)) == nltk_tokens(text)
+    assert preprocess.tokenize_and_clean(text) == preprocess.tokenize_nltk(text)
+
+def test_generated_texts_match_nltk():
+    mismatches = [text for text in generated(2000) if preprocess.tokenize_and_clean(text) != preprocess.tokenize_nltk(text)]
+    assert mismatches == []
+
+def test_batch_matches_single_texts():
+    texts = GOLDEN + GOLDEN[:10]
+    assert preprocess.tokenize_batch(texts) == [preprocess.tokenize_and_clean(text) for text in texts]
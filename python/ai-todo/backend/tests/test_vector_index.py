@@ -0,0 +1,30 @@
+import numpy as np
+from vector_index import VectorIndex
+
+def filled_index(n=300, exact_max=100, dim=8):
+    rng = np.random.default_rng(3)
+    index = VectorIndex(dim=dim, exact_max=exact_max, nprobe=2)
+    for i in range(n):
+        index.upsert(str(i), rng.normal(size=dim))
+    return index, rng
+
+def test_large_index_answers_through_ivf():
+    index, rng = filled_index()
+    assert index.centroids is not None
+    hits, engine = index.query(rng.normal(size=8), k=5)
+    assert engine == "ivf" and len(hits) == 5
+
+def test_engine_after_deletes_reports_exact_search():
+    index, rng = filled_index()
+    for i in range(250):
+        index.remove(str(i))
+    # Partitions are left over from before the deletes, but the size decides
+    assert index.centroids is not None and len(index) <= index.exact_max
+    q = rng.normal(size=8)
+    hits, engine = index.query(q, k=5)
+    assert engine == "exact"
+    assert hits == index.search(q, k=5) == index.query(q, k=5, exact=True)[0]
+    assert index.query(q, k=5, exact=False)[1] == "ivf"
+
+def test_empty_index_still_reports_engine():
+    assert VectorIndex(dim=4).query(np.ones(4)) == ([], "exact")
@@ -0,0 +1,106 @@
+import struct
+import numpy as np
+from bson.binary import Binary
+
+# BSON binary subtype for our user-defined vector encodings
+VECTOR_BINARY_SUBTYPE = 0x80
+
+# Format tags (first byte of every encoded vector)
+FORMAT_SPARSE = 1
+FORMAT_DENSE_F32 = 2
+
+# Dense layout: tag (u8) and 3 padding bytes so the float32 payload stays aligned
+DENSE_HEADER = struct.Struct("<B3x")
+
+# Sparse layout: tag (u8), index width in bytes (u8), dimension (u32),
+# followed by nnz little-endian indices and nnz little-endian float32 values
+SPARSE_HEADER = struct.Struct("<BBI")
+
+def encode_sparse(indices, values, dim):
+    """Pack a sparse vector as (indices, values) into a compact BSON binary"""
+    indices = np.asarray(indices)
+    values = np.asarray(values, dtype="<f4")
+    width = 2 if dim <= 0xFFFF else 4
+    index_dtype = "<u2" if width == 2 else "<u4"
+    header = SPARSE_HEADER.pack(FORMAT_SPARSE, width, dim)
+    payload = header + indices.astype(index_dtype).tobytes() + values.tobytes()
+    return Binary(payload, VECTOR_BINARY_SUBTYPE)
+
+def encode_sparse_dense(vector):
+    """Pack a dense vector (list or array) by keeping only its non-zero entries"""
+    arr = np.asarray(vector, dtype=np.float32)
+    indices = np.flatnonzero(arr)
+    return encode_sparse(indices, arr[indices], arr.shape[0])
+
+def is_sparse_encoded(value):
+    """True if value is a sparse vector produced by encode_sparse"""
+    return isinstance(value, (bytes, bytearray)) and len(value) >= SPARSE_HEADER.size and value[0] == FORMAT_SPARSE
+
+def decode_sparse(data):
+    """Decode a sparse binary into (indices, values, dim) without copying"""
+    tag, width, dim = SPARSE_HEADER.unpack_from(data)
+    if tag != FORMAT_SPARSE:
+        raise ValueError(f"Not a sparse vector encoding (format {tag})")
+    body = len(data) - SPARSE_HEADER.size
+    nnz = body // (width + 4)
+    index_dtype = "<u2" if width == 2 else "<u4"
+    indices = np.frombuffer(data, dtype=index_dtype, count=nnz, offset=SPARSE_HEADER.size)
+    values = np.frombuffer(data, dtype="<f4", count=nnz, offset=SPARSE_HEADER.size + nnz * width)
+    return indices, values, dim
+
+def read_sparse(value):
+    """Read a TF-IDF vector stored sparse or as a legacy dense list into (indices, values, dim)"""
+    if value is None:
+        return None
+    if is_sparse_encoded(value):
+        return decode_sparse(value)
+    arr = np.asarray(value, dtype=np.float32)
+    indices = np.flatnonzero(arr)
+    return indices, arr[indices], arr.shape[0]
+
+def sparse_to_dense(value):
+    """Expand any stored TF-IDF representation into a dense float list"""
+    sparse = read_sparse(value)
+    if sparse is None:
+        return None
+    indices, values, dim = sparse
+    dense = np.zeros(dim, dtype=np.float32)
+    dense[indices] = values
+    return dense.tolist()
+
+def sparse_cosine(a, b):
+    """Cosine similarity of two stored TF-IDF vectors without densifying them"""
+    sa, sb = read_sparse(a), read_sparse(b)
+    if sa is None or sb is None:
+        return 0
+    ia, va, _ = sa
+    ib, vb, _ = sb
+    norm = float(np.linalg.norm(va) * np.linalg.norm(vb))
+    if norm == 0:
+        return 0
+    _, pos_a, pos_b = np.intersect1d(ia, ib, assume_unique=True, return_indices=True)
+    return float(np.dot(va[pos_a], vb[pos_b]) / norm)
+
+def encode_dense(vector):
+    """Pack a dense vector as little-endian float32 in a BSON binary"""
+    arr = np.asarray(vector, dtype="<f4")
+    return Binary(DENSE_HEADER.pack(FORMAT_DENSE_F32) + arr.tobytes(), VECTOR_BINARY_SUBTYPE)
+
+def is_dense_encoded(value):
+    """True if value is a dense vector produced by encode_dense"""
+    return isinstance(value, (bytes, bytearray)) and len(value) >= DENSE_HEADER.size and value[0] == FORMAT_DENSE_F32
+
+def read_dense(value):
+    """Read a dense vector stored as float32 binary (zero-copy) or a legacy list into an array"""
+    if value is None:
+        return None
+    if is_dense_encoded(value):
+        return np.frombuffer(value, dtype="<f4", offset=DENSE_HEADER.size)
+    if isinstance(value, np.ndarray):
+        return value
+    return np.asarray(value, dtype=np.float32)
+
+def dense_to_list(value):
+    """Expand a stored dense vector into a float list (for JSON responses)"""
+    arr = read_dense(value)
+    return arr.tolist() if arr is not None else None
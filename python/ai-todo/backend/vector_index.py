@@ -0,0 +1,329 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from database import tasks_collection, MONGO_AVAILABLE
+from vector_codec import read_dense
+
+# Users with more vectors than this are searched through IVF partitions instead of exactly.
+# Exact search of 20000 384-d vectors takes a few ms, and IVF recall drops on embeddings
+# without well separated clusters (see benchmarks/vector_index_bench.py)
+VECTOR_INDEX_EXACT_MAX = int(os.getenv("VECTOR_INDEX_EXACT_MAX", "20000"))
+# Number of IVF partitions scanned per query (higher = better recall, slower)
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "32"))
+# Users whose indexes are kept in memory (least recently used are evicted)
+VECTOR_INDEX_MAX_USERS = int(os.getenv("VECTOR_INDEX_MAX_USERS", "256"))
+# How often a cached index is checked for writes made by other workers
+VECTOR_INDEX_CHECK_SECONDS = float(os.getenv("VECTOR_INDEX_CHECK_SECONDS", "5"))
+# k-means iterations used when (re)building partitions
+VECTOR_INDEX_KMEANS_ITERS = 10
+
+def _normalize(vector):
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(arr)
+    return arr / norm if norm > 0 else arr
+
+def _top_k(scores, k):
+    """Indices of the k highest scores, best first"""
+    if len(scores) <= k:
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part])]
+
+class VectorIndex:
+    """Cosine-similarity index over one user's task embeddings.
+
+    Vectors live in a normalized float32 matrix searched exactly with a single
+    matrix-vector product. Once the index grows past exact_max it also keeps
+    IVF partitions (spherical k-means centroids with per-centroid slot lists)
+    and answers queries by scanning only the nprobe closest partitions.
+    """
+
+    def __init__(self, dim=None, exact_max=VECTOR_INDEX_EXACT_MAX, nprobe=VECTOR_INDEX_NPROBE):
+        # Dimension is taken from the first vector when not given
+        self.dim = dim
+        self.exact_max = exact_max
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+        self.matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.ids = []
+        self.slots = {}
+        self.size = 0
+        self.deleted = 0
+
+        # IVF state
+        self.centroids = None
+        self.lists = []
+        self.slot_list = np.zeros(0, dtype=np.int32)
+        self.built_size = 0
+
+    def __len__(self):
+        return self.size - self.deleted
+
+    def _grow(self):
+        capacity = max(64, self.matrix.shape[0] * 2)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        slot_list = np.full(capacity, -1, dtype=np.int32)
+        slot_list[:self.size] = self.slot_list[:self.size]
+        self.matrix, self.alive, self.slot_list = matrix, alive, slot_list
+
+    def upsert(self, task_id, vector):
+        """Add or replace the vector for a task"""
+        vec = _normalize(read_dense(vector))
+        with self.lock:
+            if self.dim is None:
+                self.dim = vec.shape[0]
+                self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+            if vec.shape[0] != self.dim:
+                return
+            slot = self.slots.get(task_id)
+            if slot is None:
+                if self.size == self.matrix.shape[0]:
+                    self._grow()
+                slot = self.size
+                self.size += 1
+                self.ids.append(task_id)
+                self.slots[task_id] = slot
+            elif self.centroids is not None:
+                self._unassign(slot)
+            self.matrix[slot] = vec
+            self.alive[slot] = True
+
+            if self.centroids is not None:
+                self._assign(slot)
+            if len(self) > self.exact_max and (self.centroids is None or len(self) > 4 * self.built_size):
+                self.build_partitions()
+
+    def remove(self, task_id):
+        """Remove a task's vector; returns True if it was indexed"""
+        with self.lock:
+            slot = self.slots.pop(task_id, None)
+            if slot is None:
+                return False
+            self.alive[slot] = False
+            self.ids[slot] = None
+            self.deleted += 1
+            if self.centroids is not None:
+                self._unassign(slot)
+            if self.deleted > 1024 and self.deleted > self.size // 4:
+                self._compact()
+            return True
+
+    def get(self, task_id):
+        with self.lock:
+            slot = self.slots.get(task_id)
+            return None if slot is None else self.matrix[slot].copy()
+
+    def _compact(self):
+        """Drop tombstoned rows and rebuild partitions over the survivors"""
+        keep = np.flatnonzero(self.alive[:self.size])
+        ids = [self.ids[i] for i in keep]
+        matrix = self.matrix[keep]
+        self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.slot_list = np.zeros(0, dtype=np.int32)
+        self.ids, self.slots, self.size, self.deleted = [], {}, 0, 0
+        had_partitions = self.centroids is not None
+        self.centroids, self.lists = None, []
+        while self.matrix.shape[0] < len(ids):
+            self._grow()
+        self.matrix[:len(ids)] = matrix
+        self.alive[:len(ids)] = True
+        self.ids = ids
+        self.slots = {task_id: i for i, task_id in enumerate(ids)}
+        self.size = len(ids)
+        if had_partitions and self.size > self.exact_max:
+            self.build_partitions()
+
+    # IVF partitions
+
+    def build_partitions(self):
+        """Cluster live vectors with spherical k-means and assign every slot to a partition"""
+        with self.lock:
+            live = np.flatnonzero(self.alive[:self.size])
+            n_lists = max(1, int(np.sqrt(len(live))))
+            rng = np.random.default_rng(0)
+            sample = live if len(live) <= 50 * n_lists else rng.choice(live, 50 * n_lists, replace=False)
+            data = self.matrix[sample]
+            centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+            for _ in range(VECTOR_INDEX_KMEANS_ITERS):
+                assign = np.argmax(data @ centroids.T, axis=1)
+                for c in range(n_lists):
+                    members = data[assign == c]
+                    if len(members):
+                        centroids[c] = _normalize(members.sum(axis=0))
+
+            self.centroids = centroids
+            assign = np.argmax(self.matrix[live] @ centroids.T, axis=1)
+            self.lists = [[] for _ in range(n_lists)]
+            self.slot_list[:] = -1
+            for slot, c in zip(live.tolist(), assign.tolist()):
+                self.lists[c].append(slot)
+                self.slot_list[slot] = c
+            self.built_size = len(live)
+
+    def _assign(self, slot):
+        c = int(np.argmax(self.centroids @ self.matrix[slot]))
+        self.lists[c].append(slot)
+        self.slot_list[slot] = c
+
+    def _unassign(self, slot):
+        c = self.slot_list[slot]
+        if c >= 0:
+            self.lists[c].remove(slot)
+            self.slot_list[slot] = -1
+
+    # Queries
+
+    def search(self, vector, k=10, exclude=None, exact=None):
+        """Top-k (task_id, score) pairs by cosine similarity to vector"""
+        return self.query(vector, k, exclude, exact)[0]
+
+    def query(self, vector, k=10, exclude=None, exact=None):
+        """search() plus the engine that answered it ("exact" or "ivf")"""
+        q = _normalize(read_dense(vector))
+        with self.lock:
+            # Partitions outlive deletes, so the size decides (not whether centroids exist)
+            use_exact = exact if exact is not None else len(self) <= self.exact_max
+            engine = "exact" if use_exact or self.centroids is None else "ivf"
+            if len(self) == 0 or q.shape[0] != self.dim:
+                return [], engine
+            if engine == "exact":
+                candidates = np.flatnonzero(self.alive[:self.size])
+            else:
+                probe = _top_k(self.centroids @ q, self.nprobe)
+                candidates = np.fromiter(
+                    (slot for c in probe for slot in self.lists[c]),
+                    dtype=np.int64
+                )
+            if exclude is not None and exclude in self.slots:
+                candidates = candidates[candidates != self.slots[exclude]]
+            if len(candidates) == 0:
+                return [], engine
+
+            scores = self.matrix[candidates] @ q
+            best = _top_k(scores, k)
+            return [(self.ids[candidates[i]], float(scores[i])) for i in best], engine
+
+class VectorIndexRegistry:
+    """Per-user vector indexes, loaded lazily from tasks_collection and kept in an LRU.
+
+    Writes in this process update a loaded index directly. Writes from other workers are
+    picked up by comparing the user's version (task count, latest embedded_at) at most
+    every check_seconds and reloading the index when it changed.
+    """
+
+    def __init__(self, collection=tasks_collection, max_users=VECTOR_INDEX_MAX_USERS,
+                 check_seconds=VECTOR_INDEX_CHECK_SECONDS):
+        self.collection = collection
+        self.max_users = max(1, max_users)
+        # None disables the version check (single process, e.g. the in-memory fallback)
+        self.check_seconds = check_seconds
+        self.indexes = OrderedDict()
+        self.versions = {}
+        self.checked = {}
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def version(self, user_id):
+        """Changes when any worker adds, deletes or re-embeds one of the user's tasks"""
+        count = self.collection.count_documents({"user_id": user_id})
+        latest = self.collection.find_one(
+            {"user_id": user_id, "embedded_at": {"$exists": True}},
+            {"embedded_at": 1},
+            sort=[("embedded_at", -1)]
+        )
+        return count, latest.get("embedded_at") if latest else None
+
+    def get(self, user_id):
+        """Index for a user, loading it from the database if needed or stale"""
+        with self.lock:
+            index = self.indexes.get(user_id)
+            if index is not None:
+                self.indexes.move_to_end(user_id)
+                if self.check_seconds is None or time.monotonic() - self.checked[user_id] < self.check_seconds:
+                    return index
+        if index is not None:
+            try:
+                version = self.version(user_id)
+            except Exception as e:
+                print(f"Error checking vector index version: {e}")
+                return index
+            with self.lock:
+                self.checked[user_id] = time.monotonic()
+                if version == self.versions.get(user_id):
+                    return index
+        return self._load(user_id, stale=index)
+
+    def _load(self, user_id, stale=None):
+        with self.lock:
+            current = self.indexes.get(user_id)
+            if current is not None and current is not stale:
+                # Another request already (re)loaded it
+                return current
+            # Hold the index lock while loading so concurrent searches wait for it
+            index = VectorIndex()
+            index.lock.acquire()
+            self.indexes[user_id] = index
+            self.indexes.move_to_end(user_id)
+            self.checked[user_id] = time.monotonic()
+            if stale is None:
+                self.loads += 1
+            else:
+                self.reloads += 1
+            while len(self.indexes) > self.max_users:
+                evicted, _ = self.indexes.popitem(last=False)
+                self.versions.pop(evicted, None)
+                self.checked.pop(evicted, None)
+                self.evictions += 1
+        try:
+            # Read the version first: a write that lands during the load changes it again
+            if self.check_seconds is not None:
+                self.versions[user_id] = self.version(user_id)
+            docs = self.collection.find(
+                {"user_id": user_id, "bert_vector": {"$exists": True}},
+                {"bert_vector": 1}
+            )
+            for doc in docs:
+                if doc.get("bert_vector") is not None:
+                    index.upsert(str(doc["_id"]), doc["bert_vector"])
+        except Exception as e:
+            print(f"Error loading vector index: {e}")
+        finally:
+            index.lock.release()
+        return index
+
+    def upsert(self, user_id, task_id, vector):
+        """Keep an already-loaded user index in sync with a task write"""
+        index = self.indexes.get(user_id)
+        if index is not None and vector is not None:
+            index.upsert(task_id, vector)
+
+    def remove(self, task_id, user_id=None):
+        """Drop a task from the index it belongs to"""
+        if user_id is not None:
+            index = self.indexes.get(user_id)
+            return index.remove(task_id) if index is not None else False
+        return any(index.remove(task_id) for index in list(self.indexes.values()))
+
+    def stats(self):
+        indexes = list(self.indexes.values())
+        return {
+            "users": len(indexes),
+            "max_users": self.max_users,
+            "vectors": sum(len(index) for index in indexes),
+            "partitioned_users": sum(1 for index in indexes if index.centroids is not None),
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "evictions": self.evictions
+        }
+
+# Shared registry used by the task routes (the in-memory fallback is per process, so never stale)
+vector_indexes = VectorIndexRegistry(check_seconds=VECTOR_INDEX_CHECK_SECONDS if MONGO_AVAILABLE else None)
@@ -0,0 +1,159 @@
+import os
+import hashlib
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import preprocess
+from preprocess import build_tfidf_vectorizer, set_tfidf_vectorizer, set_tfidf_factory
+from database import tasks_collection, vectorizers_collection, MONGO_AVAILABLE
+from leases import acquire_lease, release_lease
+
+# How often the background job refits the vectorizer on the task corpus
+TFIDF_REFIT_HOURS = float(os.getenv("TFIDF_REFIT_HOURS", "24"))
+
+# How often other replicas check for a vectorizer fitted elsewhere
+TFIDF_PICKUP_MINUTES = float(os.getenv("TFIDF_PICKUP_MINUTES", "5"))
+# Upper bound on a fit; the lease lets another replica fit if this one died mid-fit
+TFIDF_FIT_LEASE_SECONDS = int(os.getenv("TFIDF_FIT_LEASE_SECONDS", "1800"))
+
+# Serializes fits so overlapping job runs do not fit twice; the "tfidf_fit" lease does
+# the same across processes and hosts
+_fit_lock = threading.Lock()
+
+def iter_task_texts():
+    """Stream task texts from the corpus without loading whole documents"""
+    for doc in tasks_collection.find({"task": {"$type": "string"}}, {"task": 1}):
+        text = doc.get("task")
+        if text:
+            yield text
+
+def vectorizer_version(terms, idf):
+    """Version tag derived from the fitted vocabulary and IDF weights"""
+    digest = hashlib.sha256()
+    digest.update("\x00".join(terms).encode("utf-8"))
+    digest.update(np.round(np.asarray(idf, dtype=np.float64), 6).tobytes())
+    return f"tfidf-{digest.hexdigest()[:12]}"
+
+def fit_tfidf_vectorizer(texts=None):
+    """Fit a TF-IDF vectorizer on the task corpus and return it with its version tag"""
+    vectorizer = build_tfidf_vectorizer()
+    vectorizer.fit(texts if texts is not None else iter_task_texts())
+    terms = vectorizer.get_feature_names_out().tolist()
+    return vectorizer, vectorizer_version(terms, vectorizer.idf_)
+
+def save_tfidf_vectorizer(vectorizer, version):
+    """Persist the fitted vocabulary and IDF under their version tag"""
+    if not MONGO_AVAILABLE:
+        return
+    terms = vectorizer.get_feature_names_out().tolist()
+    vectorizers_collection.update_one(
+        {"_id": version},
+        {"$set": {
+            "kind": "tfidf",
+            "terms": terms,
+            "idf": vectorizer.idf_.tolist(),
+            "max_features": preprocess.TFIDF_MAX_FEATURES,
+            "created_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+def load_latest_tfidf_doc():
+    """Fetch the most recently persisted TF-IDF vectorizer document"""
+    if not MONGO_AVAILABLE:
+        return None
+    docs = list(vectorizers_collection.find({"kind": "tfidf"}).sort("created_at", -1).limit(1))
+    return docs[0] if docs else None
+
+def activate_tfidf_doc(doc):
+    """Restore a persisted vectorizer without refitting and make it active.
+
+    The version switches immediately; the scikit-learn vectorizer is only built when the
+    first text is vectorized (or on warmup), which keeps startup fast.
+    """
+    vocabulary = {term: i for i, term in enumerate(doc["terms"])}
+    set_tfidf_factory(lambda: build_tfidf_vectorizer(vocabulary=vocabulary, idf=doc["idf"]), doc["_id"])
+    print(f"Loaded TF-IDF vectorizer {doc['_id']} ({len(vocabulary)} terms)")
+
+def load_tfidf_vectorizer():
+    """Load the persisted vectorizer at startup; returns True if one was activated"""
+    if preprocess.TFIDF_MODE == "hashing":
+        return True
+    try:
+        doc = load_latest_tfidf_doc()
+        if doc:
+            activate_tfidf_doc(doc)
+            return True
+    except Exception as e:
+        print(f"Error loading TF-IDF vectorizer: {e}")
+    return False
+
+def refresh_tfidf_vectorizer(force=False):
+    """Background job: pick up a newer persisted vectorizer, or refit when the latest is stale"""
+    if preprocess.TFIDF_MODE == "hashing":
+        # Hashed vectors are stable across vocabulary changes, nothing to refit
+        return
+    if not _fit_lock.acquire(blocking=False):
+        return
+    try:
+        doc = load_latest_tfidf_doc()
+        stale_before = datetime.utcnow() - timedelta(hours=TFIDF_REFIT_HOURS)
+        if doc and not force and doc["created_at"] > stale_before:
+            # Another replica may have fitted a newer version
+            if doc["_id"] != preprocess.TFIDF_VERSION:
+                activate_tfidf_doc(doc)
+            return
+
+        if MONGO_AVAILABLE and not acquire_lease("tfidf_fit", TFIDF_FIT_LEASE_SECONDS):
+            # Another replica is fitting; pickup_tfidf_vectorizer activates its result
+            return
+        try:
+            vectorizer, version = fit_tfidf_vectorizer()
+            if version != preprocess.TFIDF_VERSION:
+                save_tfidf_vectorizer(vectorizer, version)
+                set_tfidf_vectorizer(vectorizer, version)
+                print(f"Fitted TF-IDF vectorizer {version} ({len(vectorizer.vocabulary_)} terms)")
+        finally:
+            if MONGO_AVAILABLE:
+                release_lease("tfidf_fit")
+    except ValueError as e:
+        # Raised by scikit-learn when the corpus has no usable terms yet
+        print(f"Skipping TF-IDF fit: {e}")
+    except Exception as e:
+        print(f"Error refreshing TF-IDF vectorizer: {e}")
+    finally:
+        _fit_lock.release()
+
+def pickup_tfidf_vectorizer():
+    """Background job: activate a vectorizer persisted by another replica"""
+    if preprocess.TFIDF_MODE == "hashing":
+        return
+    try:
+        doc = load_latest_tfidf_doc()
+        if doc and doc["_id"] != preprocess.TFIDF_VERSION:
+            activate_tfidf_doc(doc)
+    except Exception as e:
+        print(f"Error checking for a newer TF-IDF vectorizer: {e}")
+
+def schedule_tfidf_refresh(scheduler):
+    """Load the persisted vectorizer and register the periodic refit and pickup jobs"""
+    job_options = {}
+    if not load_tfidf_vectorizer():
+        # Fit right away in the background when nothing has been persisted yet
+        job_options["next_run_time"] = datetime.utcnow()
+    scheduler.add_job(
+        refresh_tfidf_vectorizer,
+        'interval',
+        hours=TFIDF_REFIT_HOURS,
+        id="tfidf_refresh",
+        replace_existing=True,
+        **job_options
+    )
+    if MONGO_AVAILABLE:
+        scheduler.add_job(
+            pickup_tfidf_vectorizer,
+            'interval',
+            minutes=TFIDF_PICKUP_MINUTES,
+            id="tfidf_pickup",
+            replace_existing=True
+        )